@@ -15,6 +15,7 @@ from omegaconf import OmegaConf
 from . import __version__
 from .cli.eval import _add_eval_model_parser, eval_model
 from .cli.export import _add_export_model_parser, export_model
+from .cli.preprocess import _add_preprocess_parser, preprocess
 from .cli.train import _add_train_model_parser, train_model
 from .utils.architectures import check_architecture_name
 from .utils.logging import setup_logging
@@ -66,6 +67,7 @@ def main():
     subparser = ap.add_subparsers(help="sub-command help")
     _add_eval_model_parser(subparser)
     _add_export_model_parser(subparser)
+    _add_preprocess_parser(subparser)
     _add_train_model_parser(subparser)
 
     args = ap.parse_args()
@@ -106,7 +108,7 @@ def main():
             override_options = {}
 
         args.options = OmegaConf.merge(args.options, override_options)
-    else:
+    elif callable != "preprocess":
         raise ValueError("internal error when selecting a sub-command.")
 
     with setup_logging(logger, logfile=logfile, level=level):
@@ -115,6 +117,8 @@ def main():
                 eval_model(**args.__dict__)
             elif callable == "export_model":
                 export_model(**args.__dict__)
+            elif callable == "preprocess":
+                preprocess(**args.__dict__)
             elif callable == "train_model":
                 train_model(**args.__dict__)
             else:
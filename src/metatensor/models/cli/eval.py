@@ -2,28 +2,36 @@ import argparse
 import itertools
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
-import metatensor.torch
+import numpy as np
 import torch
 from metatensor.torch import Labels, TensorBlock, TensorMap
 from metatensor.torch.atomistic import MetatensorAtomisticModel
 from omegaconf import DictConfig, OmegaConf
 
 from ..utils.data import (
+    AtomCountBatchSampler,
     Dataset,
     TargetInfo,
     TargetInfoDict,
     collate_fn,
+    get_predictions_writer,
     read_systems,
     read_targets,
-    write_predictions,
 )
+from ..utils.data.disk_dataset import DISK_DATASET_SUFFIX, DiskDataset
+from ..utils.data.readers.cache import clear_cache
 from ..utils.errors import ArchitectureError
 from ..utils.evaluate_model import _get_outputs, evaluate_model
 from ..utils.logging import MetricLogger
 from ..utils.metrics import RMSEAccumulator
-from ..utils.neighbor_lists import get_system_with_neighbor_lists
+from ..utils.neighbor_lists import (
+    VerletNeighborLists,
+    get_datasets_with_neighbor_lists,
+    get_systems_with_neighbor_lists,
+    set_neighbor_list_cache,
+)
 from ..utils.omegaconf import expand_dataset_config
 from ..utils.per_atom import average_by_num_atoms
 from .formatter import CustomHelpFormatter
@@ -77,63 +85,183 @@ def _add_eval_model_parser(subparser: argparse._SubParsersAction) -> None:
         type=str,
         required=False,
         default="output.xyz",
-        help="filename of the predictions (default: %(default)s)",
+        help=(
+            "filename of the predictions, written as extended xyz (.xyz) or as numpy "
+            "arrays (.npz) (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--neighbor-list-cache",
+        dest="neighbor_list_cache",
+        type=str,
+        required=False,
+        default=None,
+        help="directory to cache neighbor lists in and to reuse them from",
+    )
+    parser.add_argument(
+        "-j",
+        "--num-workers",
+        dest="num_workers",
+        type=int,
+        required=False,
+        default=1,
+        help=(
+            "number of processes used to compute the neighbor lists of all systems "
+            "before the evaluation. For preprocessed datasets, this is only used "
+            "together with a neighbor list cache (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        dest="batch_size",
+        type=int,
+        required=False,
+        default=1,
+        help="number of systems evaluated together (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-atoms-per-batch",
+        dest="max_atoms_per_batch",
+        type=int,
+        required=False,
+        default=None,
+        help=(
+            "evaluate batches of systems with up to this total number of atoms, "
+            "instead of a fixed batch size"
+        ),
+    )
+    parser.add_argument(
+        "--trajectory-skin",
+        dest="trajectory_skin",
+        type=float,
+        required=False,
+        default=None,
+        help=(
+            "evaluate the systems as consecutive frames of a trajectory, updating the "
+            "neighbor lists with a Verlet skin of this size instead of computing them "
+            "for every frame"
+        ),
     )
 
 
-def _concatenate_tensormaps(
-    tensormap_dict_list: List[Dict[str, TensorMap]]
-) -> Dict[str, TensorMap]:
-    # Concatenating TensorMaps is tricky, because the model does not know the
-    # "number" of the system it is predicting. For example, if a model predicts
-    # 3 batches of 4 atoms each, the system labels will be [0, 1, 2, 3],
-    # [0, 1, 2, 3], [0, 1, 2, 3] for the three batches, respectively. Due
-    # to this, the join operation would not achieve the desired result
-    # ([0, 1, 2, ..., 11, 12]). Here, we fix this by renaming the system labels.
-
-    system_counter = 0
-    n_systems = 0
-    tensormaps_shifted_systems = []
-    for tensormap_dict in tensormap_dict_list:
-        tensormap_dict_shifted = {}
-        for name, tensormap in tensormap_dict.items():
-            new_keys = []
-            new_blocks = []
-            for key, block in tensormap.items():
-                new_key = key
-                where_system = block.samples.names.index("system")
-                n_systems = torch.max(block.samples.column("system")) + 1
-                new_samples_values = block.samples.values
-                new_samples_values[:, where_system] += system_counter
-                new_block = TensorBlock(
-                    values=block.values,
-                    samples=Labels(block.samples.names, values=new_samples_values),
-                    components=block.components,
-                    properties=block.properties,
+class _PredictionsAccumulator:
+    """Concatenates the predictions of many batches into a single TensorMap per target.
+
+    The model does not know the "number" of the systems it is predicting. For example,
+    if a model predicts 3 batches of 4 systems each, the system labels will be
+    ``[0, 1, 2, 3]`` for all three batches. Here, the system labels are shifted by the
+    number of systems in the previous batches, giving ``[0, 1, 2, ..., 10, 11]``.
+
+    The values, gradients and samples of every block are only stored when a batch is
+    added, and concatenated once in :py:meth:`finalize`. The result is the same as
+    joining the shifted TensorMaps of all batches along the samples with
+    :py:func:`metatensor.torch.join`, including the additional ``"tensor"`` dimension
+    of the samples containing the index of the batch.
+    """
+
+    def __init__(self):
+        self.n_batches = 0
+        self.n_systems = 0
+        # the first TensorMap of each target, used for all the metadata which is the
+        # same for all batches
+        self.first: Dict[str, TensorMap] = {}
+        # list of arrays for each target, block and array name
+        self.arrays: Dict[str, List[Dict[str, List[torch.Tensor]]]] = {}
+        # number of samples of each batch, for each target and block
+        self.n_samples: Dict[str, List[List[int]]] = {}
+
+    def update(self, predictions: Dict[str, TensorMap], n_systems: int):
+        """Add the predictions of a batch.
+
+        :param predictions: predictions of the model for the batch
+        :param n_systems: number of systems in the batch
+        """
+        for name, tensormap in predictions.items():
+            if name not in self.first:
+                self.first[name] = tensormap
+                self.arrays[name] = [
+                    {"values": [], "samples": []} for _ in range(len(tensormap))
+                ]
+                self.n_samples[name] = [[] for _ in range(len(tensormap))]
+
+            for block, arrays, n_samples in zip(
+                tensormap.blocks(), self.arrays[name], self.n_samples[name]
+            ):
+                samples = block.samples.values.clone()
+                samples[:, block.samples.names.index("system")] += self.n_systems
+                batch_index = torch.full(
+                    (len(samples), 1),
+                    self.n_batches,
+                    dtype=samples.dtype,
+                    device=samples.device,
                 )
-                for gradient_name, gradient_block in block.gradients():
-                    new_block.add_gradient(
+
+                arrays["values"].append(block.values)
+                arrays["samples"].append(torch.hstack([samples, batch_index]))
+                n_samples.append(len(samples))
+                for gradient_name, gradient in block.gradients():
+                    arrays.setdefault(f"{gradient_name}/values", []).append(
+                        gradient.values
+                    )
+                    arrays.setdefault(f"{gradient_name}/samples", []).append(
+                        gradient.samples.values
+                    )
+
+        self.n_batches += 1
+        self.n_systems += n_systems
+
+    def finalize(self) -> Dict[str, TensorMap]:
+        """Concatenate the predictions of all batches.
+
+        :returns: A dictionary with one TensorMap for each target.
+        """
+        predictions = {}
+        for name, first in self.first.items():
+            blocks = []
+            for first_block, arrays, n_samples in zip(
+                first.blocks(), self.arrays[name], self.n_samples[name]
+            ):
+                block = TensorBlock(
+                    values=torch.cat(arrays["values"]),
+                    samples=Labels(
+                        first_block.samples.names + ["tensor"],
+                        torch.cat(arrays["samples"]),
+                    ),
+                    components=first_block.components,
+                    properties=first_block.properties,
+                )
+
+                # the "sample" dimension of the gradients refers to the rows of the
+                # values, which are shifted by the number of samples of the previous
+                # batches
+                offsets = torch.cumsum(torch.tensor([0] + n_samples), dim=0)
+                for gradient_name, first_gradient in first_block.gradients():
+                    gradient_samples = [
+                        samples.clone()
+                        for samples in arrays[f"{gradient_name}/samples"]
+                    ]
+                    for samples, offset in zip(gradient_samples, offsets):
+                        samples[:, 0] += offset.to(samples.dtype)
+
+                    block.add_gradient(
                         gradient_name,
-                        gradient_block,
+                        TensorBlock(
+                            values=torch.cat(arrays[f"{gradient_name}/values"]),
+                            samples=Labels(
+                                first_gradient.samples.names,
+                                torch.cat(gradient_samples),
+                            ),
+                            components=first_gradient.components,
+                            properties=first_gradient.properties,
+                        ),
                     )
-                new_keys.append(new_key)
-                new_blocks.append(new_block)
-            tensormap_dict_shifted[name] = TensorMap(
-                keys=Labels(
-                    names=tensormap.keys.names,
-                    values=torch.stack([new_key.values for new_key in new_keys]),
-                ),
-                blocks=new_blocks,
-            )
-        tensormaps_shifted_systems.append(tensormap_dict_shifted)
-        system_counter += n_systems
 
-    return {
-        target: metatensor.torch.join(
-            [pred[target] for pred in tensormaps_shifted_systems], axis="samples"
-        )
-        for target in tensormaps_shifted_systems[0].keys()
-    }
+                blocks.append(block)
+
+            predictions[name] = TensorMap(keys=first.keys, blocks=blocks)
+
+        return predictions
 
 
 def _eval_targets(
@@ -141,44 +269,76 @@ def _eval_targets(
     dataset: Union[Dataset, torch.utils.data.Subset],
     options: TargetInfoDict,
     return_predictions: bool,
+    batch_size: int = 1,
+    max_atoms_per_batch: Optional[int] = None,
+    writer: Optional[Any] = None,
+    trajectory_skin: Optional[float] = None,
 ) -> Optional[Dict[str, TensorMap]]:
     """Evaluates an exported model on a dataset and prints the RMSEs for each target.
     Optionally, it also returns the predictions of the model.
 
+    Systems are evaluated in batches of ``batch_size`` systems or, if
+    ``max_atoms_per_batch`` is given, in batches of up to ``max_atoms_per_batch`` atoms.
+    In both cases, the predictions are returned in the order of the dataset.
+
+    If a ``writer`` (see :py:func:`metatensor.models.utils.data.get_predictions_writer`)
+    is given, the predictions of every batch are written with it as soon as they are
+    computed.
+
+    If ``trajectory_skin`` is given, the systems are considered to be consecutive frames
+    of a trajectory, and their neighbor lists are obtained from a
+    :py:class:`metatensor.models.utils.neighbor_lists.VerletNeighborLists` with this
+    skin.
+
     Wraps around metatensor.models.cli.evaluate_model.
     """
 
     if len(dataset) == 0:
         logger.info("This dataset is empty. No evaluation will be performed.")
 
-    # Attach neighbor lists to the systems:
-    # TODO: these might already be present... find a way to avoid recomputing
-    # if already present (e.g. if this function is called after training)
-    for sample in dataset:
-        system = sample["system"]
-        get_system_with_neighbor_lists(system, model.requested_neighbor_lists())
-
     # Infer the device from the model
     device = next(itertools.chain(model.parameters(), model.buffers())).device
 
     # Create a dataloader
-    dataloader = torch.utils.data.DataLoader(
-        dataset,
-        batch_size=1,  # TODO: allow to set from outside!!
-        collate_fn=collate_fn,
-        shuffle=False,
-    )
+    batching: Dict[str, Any]
+    if max_atoms_per_batch is None:
+        batching = {"batch_size": batch_size, "shuffle": False}
+    else:
+        # buckets of a single system keep the systems in the order of the dataset
+        batching = {
+            "batch_sampler": AtomCountBatchSampler(
+                dataset, max_atoms_per_batch, shuffle=False, bucket_size=1
+            )
+        }
+    dataloader = torch.utils.data.DataLoader(dataset, collate_fn=collate_fn, **batching)
+
+    if trajectory_skin is not None:
+        verlet_neighbor_lists = VerletNeighborLists(
+            model.requested_neighbor_lists(), skin=trajectory_skin
+        )
 
     # Initialize RMSE accumulator:
     rmse_accumulator = RMSEAccumulator()
 
     # If we're returning the predictions, we need to store them:
     if return_predictions:
-        all_predictions = []
+        predictions_accumulator = _PredictionsAccumulator()
 
     # Evaluate the model
     for batch in dataloader:
         systems, batch_targets = batch
+        # Attach neighbor lists to the systems. This is done per batch, because some
+        # datasets create new systems every time they are accessed. Neighbor lists
+        # which are already present (e.g. after training) are not recomputed.
+        if trajectory_skin is None:
+            systems = get_systems_with_neighbor_lists(
+                systems, model.requested_neighbor_lists()
+            )
+        else:
+            systems = [
+                verlet_neighbor_lists.get_system_with_neighbor_lists(system)
+                for system in systems
+            ]
         systems = [system.to(device=device) for system in systems]
         batch_targets = {
             key: value.to(device=device) for key, value in batch_targets.items()
@@ -192,7 +352,9 @@ def _eval_targets(
         )
         rmse_accumulator.update(batch_predictions, batch_targets)
         if return_predictions:
-            all_predictions.append(batch_predictions)
+            predictions_accumulator.update(batch_predictions, len(systems))
+        if writer is not None:
+            writer.write(systems, batch_predictions)
 
     # Finalize the RMSEs
     rmse_values = rmse_accumulator.finalize(not_per_atom=["positions_gradients"])
@@ -206,8 +368,7 @@ def _eval_targets(
 
     if return_predictions:
         # concatenate the TensorMaps
-        all_predictions_joined = _concatenate_tensormaps(all_predictions)
-        return all_predictions_joined
+        return predictions_accumulator.finalize()
     else:
         return None
 
@@ -216,6 +377,11 @@ def eval_model(
     model: Union[MetatensorAtomisticModel, torch.jit._script.RecursiveScriptModule],
     options: DictConfig,
     output: Union[Path, str] = "output.xyz",
+    neighbor_list_cache: Optional[Union[Path, str]] = None,
+    num_workers: int = 1,
+    batch_size: int = 1,
+    max_atoms_per_batch: Optional[int] = None,
+    trajectory_skin: Optional[float] = None,
 ) -> None:
     """Evaluate an exported model on a given data set.
 
@@ -226,7 +392,24 @@ def eval_model(
     :param model: Saved model to be evaluated.
     :param options: DictConfig to define a test dataset taken for the evaluation.
     :param output: Path to save the predicted values
+    :param neighbor_list_cache: Directory to cache neighbor lists in. Neighbor lists
+        computed during an earlier training or evaluation of the same systems are
+        reused. If :py:obj:`None` neighbor lists are always computed.
+    :param num_workers: Number of processes used to compute the neighbor lists of all
+        systems before the evaluation. If ``1``, neighbor lists are computed for each
+        batch during the evaluation. For preprocessed datasets, neighbor lists are only
+        computed in advance if ``neighbor_list_cache`` is given, since they are not
+        kept by the dataset.
+    :param batch_size: Number of systems evaluated together.
+    :param max_atoms_per_batch: If given, systems are evaluated in batches with up to
+        this total number of atoms, instead of using a fixed ``batch_size``.
+    :param trajectory_skin: If given, the systems of each dataset are evaluated as
+        consecutive frames of a trajectory. Neighbor lists are searched with a cutoff
+        increased by this skin, and only searched again once an atom moved by more than
+        half of the skin.
     """
+    set_neighbor_list_cache(neighbor_list_cache)
+
     logger.info("Setting up evaluation set.")
 
     # TODO: once https://github.com/lab-cosmo/metatensor/pull/551 is merged and released
@@ -246,24 +429,42 @@ def eval_model(
             file_index_suffix = f"_{i}"
         logger.info(f"Evaluating dataset{extra_log_message}")
 
-        eval_systems = read_systems(
-            filename=options["systems"]["read_from"],
-            fileformat=options["systems"]["file_format"],
-            dtype=dtype,
-        )
-
-        if hasattr(options, "targets"):
-            # in this case, we only evaluate the targets specified in the options
-            # and we calculate RMSEs
-            eval_targets, eval_info_dict = read_targets(options["targets"], dtype=dtype)
+        eval_dataset: Dataset
+        if options["systems"]["file_format"] == DISK_DATASET_SUFFIX:
+            # preprocessed datasets contain the targets
+            eval_dataset = DiskDataset(options["systems"]["read_from"], dtype=dtype)
+            # read the cells from the file, without creating the systems
+            eval_cells = list(torch.tensor(np.asarray(eval_dataset.arrays["cells"])))
+            eval_info_dict = eval_dataset.target_info
         else:
+            eval_systems = read_systems(
+                filename=options["systems"]["read_from"],
+                fileformat=options["systems"]["file_format"],
+                dtype=dtype,
+            )
+
+            if hasattr(options, "targets"):
+                # in this case, we only evaluate the targets specified in the options
+                # and we calculate RMSEs
+                eval_targets, eval_info_dict = read_targets(
+                    options["targets"], dtype=dtype
+                )
+            else:
+                eval_targets = {}
+                eval_info_dict = TargetInfoDict()
+
+            # release the frames cached by the readers
+            clear_cache()
+
+            eval_dataset = Dataset({"system": eval_systems, **eval_targets})
+            eval_cells = [system.cell for system in eval_systems]
+
+        if len(eval_info_dict) == 0:
             # in this case, we have no targets: we evaluate everything
             # (but we don't/can't calculate RMSEs)
             # TODO: allow the user to specify which outputs to evaluate
-            eval_targets = {}
-            eval_info_dict = TargetInfoDict()
             gradients = {"positions"}
-            if all(not torch.all(system.cell == 0) for system in eval_systems):
+            if all(not torch.all(cell == 0) for cell in eval_cells):
                 # only add strain if all structures have cells
                 gradients.add("strain")
             for key in model.capabilities().outputs.keys():
@@ -274,22 +475,37 @@ def eval_model(
                     gradients=gradients,
                 )
 
-        eval_dataset = Dataset({"system": eval_systems, **eval_targets})
+        # preprocessed datasets create new systems for every batch, so neighbor lists
+        # computed in advance can only be reused through the on-disk cache
+        precompute_neighbor_lists = num_workers > 1 and trajectory_skin is None
+        if isinstance(eval_dataset, DiskDataset) and neighbor_list_cache is None:
+            precompute_neighbor_lists = False
+
+        if precompute_neighbor_lists:
+            get_datasets_with_neighbor_lists(
+                [eval_dataset],
+                model.requested_neighbor_lists(),
+                num_workers=num_workers,
+            )
 
-        # Evaluate the model
+        # Evaluate the model, writing the predictions of each batch as soon as they
+        # are available
+        writer = get_predictions_writer(
+            filename=f"{output.stem}{file_index_suffix}{output.suffix}",
+            capabilities=model.capabilities(),
+        )
         try:
-            predictions = _eval_targets(
+            _eval_targets(
                 model=model,
                 dataset=eval_dataset,
                 options=eval_info_dict,
-                return_predictions=True,
+                return_predictions=False,
+                batch_size=batch_size,
+                max_atoms_per_batch=max_atoms_per_batch,
+                writer=writer,
+                trajectory_skin=trajectory_skin,
             )
         except Exception as e:
             raise ArchitectureError(e)
-
-        write_predictions(
-            filename=f"{output.stem}{file_index_suffix}{output.suffix}",
-            systems=eval_systems,
-            capabilities=model.capabilities(),
-            predictions=predictions,
-        )
+        finally:
+            writer.finish()
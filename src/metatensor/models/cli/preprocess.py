@@ -0,0 +1,97 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Union
+
+import torch
+from omegaconf import DictConfig, OmegaConf
+
+from ..utils.data import TargetInfoDict, read_systems, read_targets
+from ..utils.data.disk_dataset import DISK_DATASET_SUFFIX, write_disk_dataset
+from ..utils.data.readers.cache import clear_cache
+from ..utils.io import check_suffix
+from ..utils.omegaconf import expand_dataset_config
+from .formatter import CustomHelpFormatter
+
+
+logger = logging.getLogger(__name__)
+
+
+def _add_preprocess_parser(subparser: argparse._SubParsersAction) -> None:
+    """Add the `preprocess` paramaters to an argparse (sub)-parser"""
+
+    if preprocess.__doc__ is not None:
+        description = preprocess.__doc__.split(r":param")[0]
+    else:
+        description = None
+
+    # If you change the synopsis of these commands or add new ones adjust the completion
+    # script at `src/metatensor/models/share/metatensor-models-completion.bash`.
+    parser = subparser.add_parser(
+        "preprocess",
+        description=description,
+        formatter_class=CustomHelpFormatter,
+    )
+    parser.set_defaults(callable="preprocess")
+    parser.add_argument(
+        "options",
+        type=OmegaConf.load,
+        help="Options file to define the dataset to preprocess.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        type=str,
+        required=False,
+        default=f"dataset{DISK_DATASET_SUFFIX}",
+        help="filename of the preprocessed dataset (default: %(default)s)",
+    )
+
+
+def preprocess(
+    options: DictConfig,
+    output: Union[Path, str] = f"dataset{DISK_DATASET_SUFFIX}",
+) -> None:
+    """Preprocess a dataset into a binary file for fast loading.
+
+    The dataset is defined in the same way as a dataset in the training options. The
+    preprocessed file can be given instead of a structure file in the training or
+    evaluation options. It is read lazily, which avoids parsing the original files for
+    every training and allows to train on datasets larger than the available memory.
+
+    :param options: DictConfig to define the dataset to preprocess.
+    :param output: Path to save the preprocessed dataset
+    """
+    output = Path(check_suffix(filename=output, suffix=DISK_DATASET_SUFFIX))
+
+    options_list = expand_dataset_config(options)
+    for i, options in enumerate(options_list):
+        if len(options_list) == 1:
+            extra_log_message = ""
+            file_index_suffix = ""
+        else:
+            extra_log_message = f" with index {i}"
+            file_index_suffix = f"_{i}"
+        logger.info(f"Preprocessing dataset{extra_log_message}")
+
+        # values are stored in double precision and converted when they are loaded
+        systems = read_systems(
+            filename=options["systems"]["read_from"],
+            fileformat=options["systems"]["file_format"],
+            dtype=torch.float64,
+        )
+        if hasattr(options, "targets"):
+            targets, target_info = read_targets(options["targets"], dtype=torch.float64)
+        else:
+            targets, target_info = {}, TargetInfoDict()
+        clear_cache()
+
+        filename = output.parent / f"{output.stem}{file_index_suffix}{output.suffix}"
+        logger.info(f"Writing {len(systems)} systems to {str(filename)}")
+        write_disk_dataset(
+            filename=filename,
+            systems=systems,
+            targets=targets,
+            target_info=target_info,
+        )
@@ -3,13 +3,15 @@ import importlib
 import logging
 import os
 import random
+from functools import partial
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import numpy as np
 import torch
 from omegaconf import DictConfig, OmegaConf
 from omegaconf.errors import ConfigKeyError
+from torch.utils.data import Subset
 
 from ..utils.architectures import check_architecture_name, get_default_hypers
 from ..utils.data import (
@@ -21,9 +23,13 @@ from ..utils.data import (
     read_targets,
 )
 from ..utils.data.dataset import _train_test_random_split
+from ..utils.data.disk_dataset import DISK_DATASET_SUFFIX, DiskDataset
+from ..utils.data.readers.cache import clear_cache
 from ..utils.devices import pick_devices
+from ..utils.distributed import broadcast_parameters, run_distributed
 from ..utils.errors import ArchitectureError
 from ..utils.io import check_suffix
+from ..utils.neighbor_lists import set_neighbor_list_cache
 from ..utils.omegaconf import (
     BASE_OPTIONS,
     check_options_list,
@@ -141,6 +147,22 @@ def train_model(
         desired_device=options["device"],
     )
 
+    # process distributed training
+    num_processes = options["num_processes"]
+    if num_processes < 1:
+        raise ValueError("`num_processes` should be a positive number")
+    if num_processes > 1:
+        if not getattr(Trainer, "__supports_distributed__", False):
+            raise ValueError(
+                f"{architecture_name} does not support distributed training with "
+                "several processes."
+            )
+        if any(device.type != "cpu" for device in devices):
+            raise ValueError(
+                "Distributed training with several processes is only supported on "
+                "CPU."
+            )
+
     # process base_precision/dtypes
     if options["base_precision"] == 64:
         dtype = torch.float64
@@ -157,6 +179,15 @@ def train_model(
             f"supports {Model.__supported_dtypes__}."
         )
 
+    # mixed precision only lowers the precision of float32 computations
+    mixed_precision = options["architecture"]["training"].get("mixed_precision")
+    if mixed_precision is not None and dtype != torch.float32:
+        raise ValueError(
+            f"Mixed precision training ({mixed_precision}) requires a model in "
+            f"float32, but `base_precision` is {options['base_precision']}. Set "
+            "`base_precision: 32` to use mixed precision."
+        )
+
     # process random seeds
     if options["seed"] < 0:
         raise ValueError("`seed` should be a positive number")
@@ -170,6 +201,9 @@ def train_model(
             torch.cuda.manual_seed(options["seed"])
             torch.cuda.manual_seed_all(options["seed"])
 
+    # process neighbor list cache
+    set_neighbor_list_cache(options["neighbor_list_cache"])
+
     ###########################
     # SETUP TRAINING SET ######
     ###########################
@@ -181,17 +215,26 @@ def train_model(
     train_datasets = []
     target_infos = TargetInfoDict()
     for train_options in train_options_list:
-        train_systems = read_systems(
-            filename=train_options["systems"]["read_from"],
-            fileformat=train_options["systems"]["file_format"],
-            dtype=dtype,
-        )
-        train_targets, target_info_dictionary = read_targets(
-            conf=train_options["targets"], dtype=dtype
-        )
+        train_dataset: Dataset
+        if train_options["systems"]["file_format"] == DISK_DATASET_SUFFIX:
+            # preprocessed datasets contain the targets
+            train_dataset = DiskDataset(
+                train_options["systems"]["read_from"], dtype=dtype
+            )
+            target_info_dictionary = train_dataset.target_info
+        else:
+            train_systems = read_systems(
+                filename=train_options["systems"]["read_from"],
+                fileformat=train_options["systems"]["file_format"],
+                dtype=dtype,
+            )
+            train_targets, target_info_dictionary = read_targets(
+                conf=train_options["targets"], dtype=dtype
+            )
+            train_dataset = Dataset({"system": train_systems, **train_targets})
 
         target_infos.update(target_info_dictionary)
-        train_datasets.append(Dataset({"system": train_systems, **train_targets}))
+        train_datasets.append(train_dataset)
 
     train_size = 1.0
 
@@ -201,7 +244,8 @@ def train_model(
 
     logger.info("Setting up test set")
     test_options = options["test_set"]
-    test_datasets = []
+    test_datasets: List[Union[Dataset, Subset]] = []
+    test_dataset: Union[Dataset, Subset]
     if isinstance(test_options, float):
         test_size = test_options
         train_size -= test_size
@@ -240,13 +284,20 @@ def train_model(
         )
 
         for test_options in test_options_list:
-            test_systems = read_systems(
-                filename=test_options["systems"]["read_from"],
-                fileformat=test_options["systems"]["file_format"],
-                dtype=dtype,
-            )
-            test_targets, _ = read_targets(conf=test_options["targets"], dtype=dtype)
-            test_dataset = Dataset({"system": test_systems, **test_targets})
+            if test_options["systems"]["file_format"] == DISK_DATASET_SUFFIX:
+                test_dataset = DiskDataset(
+                    test_options["systems"]["read_from"], dtype=dtype
+                )
+            else:
+                test_systems = read_systems(
+                    filename=test_options["systems"]["read_from"],
+                    fileformat=test_options["systems"]["file_format"],
+                    dtype=dtype,
+                )
+                test_targets, _ = read_targets(
+                    conf=test_options["targets"], dtype=dtype
+                )
+                test_dataset = Dataset({"system": test_systems, **test_targets})
             test_datasets.append(test_dataset)
 
     ###########################
@@ -255,7 +306,8 @@ def train_model(
 
     logger.info("Setting up validation set")
     validation_options = options["validation_set"]
-    validation_datasets = []
+    validation_datasets: List[Union[Dataset, Subset]] = []
+    validation_dataset: Union[Dataset, Subset]
     if isinstance(validation_options, float):
         validation_size = validation_options
         train_size -= validation_size
@@ -295,19 +347,37 @@ def train_model(
         )
 
         for validation_options in validation_options_list:
-            validation_systems = read_systems(
-                filename=validation_options["systems"]["read_from"],
-                fileformat=validation_options["systems"]["file_format"],
-                dtype=dtype,
-            )
-            validation_targets, _ = read_targets(
-                conf=validation_options["targets"], dtype=dtype
-            )
-            validation_dataset = Dataset(
-                {"system": validation_systems, **validation_targets}
-            )
+            if validation_options["systems"]["file_format"] == DISK_DATASET_SUFFIX:
+                validation_dataset = DiskDataset(
+                    validation_options["systems"]["read_from"], dtype=dtype
+                )
+            else:
+                validation_systems = read_systems(
+                    filename=validation_options["systems"]["read_from"],
+                    fileformat=validation_options["systems"]["file_format"],
+                    dtype=dtype,
+                )
+                validation_targets, _ = read_targets(
+                    conf=validation_options["targets"], dtype=dtype
+                )
+                validation_dataset = Dataset(
+                    {"system": validation_systems, **validation_targets}
+                )
             validation_datasets.append(validation_dataset)
 
+    # all systems and targets are read, release the frames cached by the readers
+    clear_cache()
+
+    # every process of a distributed training needs at least one sample of each dataset
+    smallest_dataset = min(
+        len(dataset) for dataset in train_datasets + validation_datasets
+    )
+    if num_processes > smallest_dataset:
+        raise ValueError(
+            f"`num_processes` ({num_processes}) is larger than the number of samples "
+            f"in the smallest training or validation dataset ({smallest_dataset})."
+        )
+
     ###########################
     # SAVE EXPANDED OPTIONS ###
     ###########################
@@ -335,13 +405,13 @@ def train_model(
     ###########################
 
     logger.info("Setting up model")
+    if continue_from is not None:
+        logger.info(f"Loading checkpoint from `{continue_from}`")
+    create_model = partial(
+        _create_model, Model, hypers["model"], dataset_info, continue_from
+    )
     try:
-        if continue_from is not None:
-            logger.info(f"Loading checkpoint from `{continue_from}`")
-            model = Model.load_checkpoint(continue_from)
-            model = model.restart(dataset_info)
-        else:
-            model = Model(hypers["model"], dataset_info)
+        model = create_model()
     except Exception as e:
         raise ArchitectureError(e)
 
@@ -352,13 +422,19 @@ def train_model(
     logger.info("Start training")
     try:
         trainer = Trainer(hypers["training"])
-        trainer.train(
-            model=model,
+        train_function = partial(
+            trainer.train,
             devices=devices,
             train_datasets=train_datasets,
             validation_datasets=validation_datasets,
             checkpoint_dir=str(checkpoint_dir),
         )
+        # the other processes of a distributed training create their own model
+        run_distributed(
+            partial(_train, train_function, model),
+            num_processes=num_processes,
+            worker_function=partial(_train_in_worker, train_function, create_model),
+        )
     except Exception as e:
         raise ArchitectureError(e)
 
@@ -400,6 +476,8 @@ def train_model(
             train_dataset,
             dataset_info.targets,
             return_predictions=False,
+            batch_size=options["eval_batch_size"],
+            max_atoms_per_batch=options["eval_max_atoms_per_batch"],
         )
 
     for i, validation_dataset in enumerate(validation_datasets):
@@ -414,6 +492,8 @@ def train_model(
             validation_dataset,
             dataset_info.targets,
             return_predictions=False,
+            batch_size=options["eval_batch_size"],
+            max_atoms_per_batch=options["eval_max_atoms_per_batch"],
         )
 
     for i, test_dataset in enumerate(test_datasets):
@@ -428,4 +508,29 @@ def train_model(
             test_dataset,
             dataset_info.targets,
             return_predictions=False,
+            batch_size=options["eval_batch_size"],
+            max_atoms_per_batch=options["eval_max_atoms_per_batch"],
         )
+
+
+def _create_model(
+    Model: Any,
+    model_hypers: Any,
+    dataset_info: DatasetInfo,
+    continue_from: Optional[str],
+) -> torch.nn.Module:
+    if continue_from is not None:
+        model = Model.load_checkpoint(continue_from)
+        return model.restart(dataset_info)
+    else:
+        return Model(model_hypers, dataset_info)
+
+
+def _train(train_function: Callable, model: torch.nn.Module) -> None:
+    # all processes start from the parameters of the process with rank 0
+    broadcast_parameters(model)
+    train_function(model=model)
+
+
+def _train_in_worker(train_function: Callable, create_model: Callable) -> None:
+    _train(train_function, create_model())
@@ -8,6 +8,7 @@ from omegaconf import OmegaConf
 
 from metatensor.models.experimental.alchemical_model import AlchemicalModel, Trainer
 from metatensor.models.utils.data import Dataset, DatasetInfo, TargetInfo
+from metatensor.models.utils.data.disk_dataset import DiskDataset, write_disk_dataset
 from metatensor.models.utils.data.readers import read_systems, read_targets
 from metatensor.models.utils.neighbor_lists import get_system_with_neighbor_lists
 
@@ -137,3 +138,56 @@ def test_regression_train():
         output["mtm::U0"].block().values,
         expected_output,
     )
+
+
+def test_train_disk_dataset(monkeypatch, tmp_path):
+    """Training on a preprocessed dataset gives the same model as training on the
+    dataset in memory"""
+    monkeypatch.chdir(tmp_path)
+
+    systems = read_systems(DATASET_PATH)
+    conf = {
+        "mtm::U0": {
+            "quantity": "energy",
+            "read_from": DATASET_PATH,
+            "file_format": ".xyz",
+            "key": "U0",
+            "unit": "eV",
+            "forces": False,
+            "stress": False,
+            "virial": False,
+        }
+    }
+    targets, target_info_dict = read_targets(OmegaConf.create(conf))
+    write_disk_dataset("qm9.mtmd", systems, targets, target_info_dict)
+
+    dataset_info = DatasetInfo(
+        length_unit="Angstrom", atomic_types={1, 6, 7, 8}, targets=target_info_dict
+    )
+    hypers = DEFAULT_HYPERS.copy()
+    hypers["training"]["num_epochs"] = 1
+
+    outputs = []
+    for dataset in [
+        Dataset({"system": systems, "mtm::U0": targets["mtm::U0"]}),
+        DiskDataset("qm9.mtmd", dtype=systems[0].positions.dtype),
+    ]:
+        torch.manual_seed(0)
+        model = AlchemicalModel(MODEL_HYPERS, dataset_info)
+        trainer = Trainer(hypers["training"])
+        trainer.train(model, [torch.device("cpu")], [dataset], [dataset], ".")
+
+        evaluation_options = ModelEvaluationOptions(
+            length_unit=dataset_info.length_unit,
+            outputs=model.outputs,
+        )
+        evaluated_systems = [
+            get_system_with_neighbor_lists(system, model.requested_neighbor_lists())
+            for system in read_systems(DATASET_PATH)[:5]
+        ]
+        output = model.export()(
+            evaluated_systems, evaluation_options, check_consistency=True
+        )
+        outputs.append(output["mtm::U0"].block().values)
+
+    torch.testing.assert_close(outputs[0], outputs[1])
@@ -7,6 +7,8 @@ from metatensor.learn.data import DataLoader
 
 from ...utils.composition import calculate_composition_weights
 from ...utils.data import (
+    AtomCountBatchSampler,
+    CachedDataLoader,
     CombinedDataLoader,
     Dataset,
     TargetInfoDict,
@@ -14,12 +16,22 @@ from ...utils.data import (
     collate_fn,
     get_all_targets,
 )
+from ...utils.data.disk_dataset import DiskDataset
+from ...utils.distributed import (
+    average_gradients,
+    get_rank,
+    is_distributed,
+    iterate_in_lockstep,
+    shard_dataset,
+    sum_over_processes,
+)
 from ...utils.evaluate_model import evaluate_model
 from ...utils.external_naming import to_external_name
 from ...utils.logging import MetricLogger
 from ...utils.loss import TensorMapDictLoss
 from ...utils.metrics import RMSEAccumulator
-from ...utils.neighbor_lists import get_system_with_neighbor_lists
+from ...utils.mixed_precision import autocast_linear_layers, get_mixed_precision_dtype
+from ...utils.neighbor_lists import get_datasets_with_neighbor_lists
 from ...utils.per_atom import average_by_num_atoms
 from . import AlchemicalModel
 from .utils.normalize import (
@@ -33,6 +45,9 @@ logger = logging.getLogger(__name__)
 
 
 class Trainer:
+    # the training can be distributed over several processes
+    __supports_distributed__ = True
+
     def __init__(self, train_hypers):
         self.hypers = train_hypers
 
@@ -59,15 +74,23 @@ class Trainer:
         logger.info("Checking datasets for consistency")
         check_datasets(train_datasets, validation_datasets)
 
+        # Systems of preprocessed datasets are created again on every access and would
+        # not keep their neighbor lists. The systems are loaded in memory once, as it
+        # is done anyway when removing the composition contribution below:
+        train_datasets = [_load_in_memory(dataset) for dataset in train_datasets]
+        validation_datasets = [
+            _load_in_memory(dataset) for dataset in validation_datasets
+        ]
+
         # Calculating the neighbor lists for the training and validation datasets:
         logger.info("Calculating neighbor lists for the datasets")
-        requested_neighbor_lists = model.requested_neighbor_lists()
-        for dataset in train_datasets + validation_datasets:
-            for i in range(len(dataset)):
-                system = dataset[i]["system"]
-                # The following line attaches the neighbors lists to the system,
-                # and doesn't require to reassign the system to the dataset:
-                _ = get_system_with_neighbor_lists(system, requested_neighbor_lists)
+        # The following line attaches the neighbors lists to the systems,
+        # and doesn't require to reassign the systems to the datasets:
+        get_datasets_with_neighbor_lists(
+            train_datasets + validation_datasets,
+            model.requested_neighbor_lists(),
+            num_workers=self.hypers["num_neighbor_list_workers"],
+        )
 
         # Calculate the average number of atoms and neighbor in the training datasets:
         average_number_of_atoms = get_average_number_of_atoms(train_datasets)
@@ -122,30 +145,54 @@ class Trainer:
 
         logger.info("Setting up data loaders")
 
+        # In distributed training, every process uses a part of the datasets:
+        distributed = is_distributed()
+        if distributed:
+            train_datasets = [shard_dataset(dataset) for dataset in train_datasets]
+            # validation shards are not padded, to compute the metrics on every
+            # sample exactly once
+            validation_datasets = [
+                shard_dataset(dataset, pad=False) for dataset in validation_datasets
+            ]
+
         # Create dataloader for the training datasets:
         train_dataloaders = []
         for dataset in train_datasets:
+            if self.hypers["max_atoms_per_batch"] is None:
+                batching = {"batch_size": self.hypers["batch_size"], "shuffle": True}
+            else:
+                batching = {
+                    "batch_sampler": AtomCountBatchSampler(
+                        dataset, self.hypers["max_atoms_per_batch"], shuffle=True
+                    )
+                }
             train_dataloaders.append(
-                DataLoader(
-                    dataset=dataset,
-                    batch_size=self.hypers["batch_size"],
-                    shuffle=True,
-                    collate_fn=collate_fn,
-                )
+                DataLoader(dataset=dataset, collate_fn=collate_fn, **batching)
             )
-        train_dataloader = CombinedDataLoader(train_dataloaders, shuffle=True)
+        train_dataloader = CombinedDataLoader(
+            train_dataloaders,
+            shuffle=True,
+            weights=self.hypers["dataset_weights"],
+            temperature=self.hypers["dataset_temperature"],
+            steps_per_epoch=self.hypers["steps_per_epoch"],
+        )
 
         # Create dataloader for the validation datasets:
         validation_dataloaders = []
         for dataset in validation_datasets:
-            validation_dataloaders.append(
-                DataLoader(
-                    dataset=dataset,
-                    batch_size=self.hypers["batch_size"],
-                    shuffle=False,
-                    collate_fn=collate_fn,
-                )
-            )
+            if self.hypers["max_atoms_per_batch"] is None:
+                batching = {"batch_size": self.hypers["batch_size"], "shuffle": False}
+            else:
+                batching = {
+                    "batch_sampler": AtomCountBatchSampler(
+                        dataset, self.hypers["max_atoms_per_batch"], shuffle=False
+                    )
+                }
+            dataloader = DataLoader(dataset=dataset, collate_fn=collate_fn, **batching)
+            if self.hypers["cache_validation_batches"]:
+                # validation batches never change, collate them only once
+                dataloader = CachedDataLoader(dataloader, device=device)
+            validation_dataloaders.append(dataloader)
         validation_dataloader = CombinedDataLoader(
             validation_dataloaders, shuffle=False
         )
@@ -196,6 +243,18 @@ class Trainer:
         # per-atom targets:
         per_structure_targets = self.hypers["per_structure_targets"]
 
+        # With mixed precision, the linear layers are evaluated in lower precision while
+        # the weights stay in full precision. float16 losses are scaled to avoid the
+        # underflow of small gradients.
+        mixed_precision_dtype = get_mixed_precision_dtype(
+            self.hypers["mixed_precision"], device
+        )
+        if mixed_precision_dtype is not None:
+            logger.info(f"Using mixed precision with {mixed_precision_dtype}")
+        grad_scaler = torch.cuda.amp.GradScaler(
+            enabled=mixed_precision_dtype == torch.float16
+        )
+
         # Train the model:
         logger.info("Starting training")
         for epoch in range(self.hypers["num_epochs"]):
@@ -203,7 +262,7 @@ class Trainer:
             validation_rmse_calculator = RMSEAccumulator()
 
             train_loss = 0.0
-            for batch in train_dataloader:
+            for batch in iterate_in_lockstep(train_dataloader):
                 optimizer.zero_grad()
 
                 systems, targets = batch
@@ -212,17 +271,18 @@ class Trainer:
                 targets = {
                     key: value.to(device=device) for key, value in targets.items()
                 }
-                predictions = evaluate_model(
-                    model,
-                    systems,
-                    TargetInfoDict(
-                        **{
-                            key: model.dataset_info.targets[key]
-                            for key in targets.keys()
-                        }
-                    ),
-                    is_training=True,
-                )
+                with autocast_linear_layers(model, mixed_precision_dtype):
+                    predictions = evaluate_model(
+                        model,
+                        systems,
+                        TargetInfoDict(
+                            **{
+                                key: model.dataset_info.targets[key]
+                                for key in targets.keys()
+                            }
+                        ),
+                        is_training=True,
+                    )
 
                 # average by the number of atoms
                 predictions = average_by_num_atoms(
@@ -232,11 +292,15 @@ class Trainer:
 
                 train_loss_batch = loss_fn(predictions, targets)
                 train_loss += train_loss_batch.item()
-                train_loss_batch.backward()
-                optimizer.step()
+                grad_scaler.scale(train_loss_batch).backward()
+                average_gradients(model)
+                grad_scaler.step(optimizer)
+                grad_scaler.update()
                 train_rmse_calculator.update(predictions, targets)
+            train_loss = sum_over_processes(train_loss)
             finalized_train_info = train_rmse_calculator.finalize(
-                not_per_atom=["positions_gradients"] + per_structure_targets
+                not_per_atom=["positions_gradients"] + per_structure_targets,
+                is_distributed=distributed,
             )
 
             validation_loss = 0.0
@@ -247,17 +311,18 @@ class Trainer:
                 targets = {
                     key: value.to(device=device) for key, value in targets.items()
                 }
-                predictions = evaluate_model(
-                    model,
-                    systems,
-                    TargetInfoDict(
-                        **{
-                            key: model.dataset_info.targets[key]
-                            for key in targets.keys()
-                        }
-                    ),
-                    is_training=False,
-                )
+                with autocast_linear_layers(model, mixed_precision_dtype):
+                    predictions = evaluate_model(
+                        model,
+                        systems,
+                        TargetInfoDict(
+                            **{
+                                key: model.dataset_info.targets[key]
+                                for key in targets.keys()
+                            }
+                        ),
+                        is_training=False,
+                    )
 
                 # average by the number of atoms
                 predictions = average_by_num_atoms(
@@ -268,8 +333,10 @@ class Trainer:
                 validation_loss_batch = loss_fn(predictions, targets)
                 validation_loss += validation_loss_batch.item()
                 validation_rmse_calculator.update(predictions, targets)
+            validation_loss = sum_over_processes(validation_loss)
             finalized_validation_info = validation_rmse_calculator.finalize(
-                not_per_atom=["positions_gradients"] + per_structure_targets
+                not_per_atom=["positions_gradients"] + per_structure_targets,
+                is_distributed=distributed,
             )
 
             lr_scheduler.step(validation_loss)
@@ -294,7 +361,7 @@ class Trainer:
                     epoch=epoch,
                 )
 
-            if epoch % self.hypers["checkpoint_interval"] == 0:
+            if epoch % self.hypers["checkpoint_interval"] == 0 and get_rank() == 0:
                 model.save_checkpoint(Path(checkpoint_dir) / f"model_{epoch}.ckpt")
 
             # early stopping criterion:
@@ -310,3 +377,20 @@ class Trainer:
                         "without improvement."
                     )
                     break
+
+
+def _load_in_memory(
+    dataset: Union[Dataset, torch.utils.data.Subset]
+) -> Union[Dataset, torch.utils.data.Subset]:
+    if not _is_disk_dataset(dataset):
+        return dataset
+
+    samples = [dataset[i] for i in range(len(dataset))]
+    names = samples[0].keys() if len(samples) > 0 else ["system"]
+    return Dataset({name: [sample[name] for sample in samples] for name in names})
+
+
+def _is_disk_dataset(dataset) -> bool:
+    if isinstance(dataset, torch.utils.data.Subset):
+        return _is_disk_dataset(dataset.dataset)
+    return isinstance(dataset, DiskDataset)
@@ -0,0 +1,185 @@
+import ase.io
+import pytest
+import torch
+from metatensor.torch.atomistic import NeighborListOptions, System, systems_to_torch
+
+from metatensor.models.experimental.pet.utils import systems_to_batch_dict
+from metatensor.models.experimental.pet.utils.systems_to_batch_dict import (
+    collate_graph_dicts,
+    get_central_species,
+    get_max_num_neighbors,
+    get_system_batch_dict,
+    remap_to_contiguous_indexing,
+)
+from metatensor.models.utils.neighbor_lists import get_systems_with_neighbor_lists
+
+from . import DATASET_PATH
+
+
+def reference_system_batch_dict(
+    system: System,
+    options: NeighborListOptions,
+    all_species: torch.Tensor,
+    max_num_neighbors: int,
+    selected_atoms_index: torch.Tensor,
+    device: torch.device,
+):
+    """Previous implementation of `get_system_batch_dict`, looping over the atoms."""
+    nl = system.get_neighbor_list(options)
+    i_list = nl.samples.column("first_atom")
+    j_list = nl.samples.column("second_atom")
+
+    unique_neighbors_index, counts = torch.unique(i_list, return_counts=True)
+    unique_index = torch.unique(
+        torch.cat((selected_atoms_index, unique_neighbors_index))
+    )
+    actual_system_size = len(unique_index)
+    i_list, j_list, unique_neighbors_index = remap_to_contiguous_indexing(
+        i_list, j_list, unique_neighbors_index, unique_index, device
+    )
+    central_species = get_central_species(system, all_species, unique_index)
+
+    index = torch.argsort(i_list, stable=True)
+    j_list = j_list[index]
+    i_list = i_list[index]
+    S_list = torch.cat(
+        (
+            nl.samples.column("cell_shift_a")[None],
+            nl.samples.column("cell_shift_b")[None],
+            nl.samples.column("cell_shift_c")[None],
+        )
+    ).transpose(0, 1)[index]
+    D_list = nl.values[:, :, 0][index]
+
+    number_of_neighbors = torch.zeros(
+        actual_system_size, device=device, dtype=torch.int64
+    )
+    number_of_neighbors[unique_neighbors_index] = counts
+
+    cum_sum = counts.cumsum(0)
+    cum_sum = torch.cat((torch.tensor([0], device=counts.device), cum_sum))
+
+    neighbors_index = torch.zeros(
+        (actual_system_size, max_num_neighbors), device=device, dtype=torch.int64
+    )
+    neighbors_shifts = torch.zeros(
+        (actual_system_size, max_num_neighbors, 3), device=device, dtype=torch.int64
+    )
+    displacement_vectors = torch.zeros(
+        (actual_system_size, max_num_neighbors, 3), device=device, dtype=torch.float32
+    )
+    padding_mask = torch.zeros(
+        (actual_system_size, max_num_neighbors), device=device, dtype=torch.bool
+    )
+    for j, count in enumerate(counts):
+        neighbors_index[j, :count] = j_list[cum_sum[j] : cum_sum[j + 1]]
+        neighbors_shifts[j, :count] = S_list[cum_sum[j] : cum_sum[j + 1]]
+        displacement_vectors[j, :count] = D_list[cum_sum[j] : cum_sum[j + 1]]
+        padding_mask[j, count:] = True
+
+    neighbor_species = central_species[neighbors_index]
+
+    reversed_neighbors_index = torch.zeros_like(neighbors_index)
+    tmp_reversed_index = neighbors_index[neighbors_index]
+    tmp_reversed_shifts = neighbors_shifts[neighbors_index]
+    for j in range(actual_system_size):
+        condition_1 = tmp_reversed_index[j] == j
+        condition_2 = torch.all(
+            tmp_reversed_shifts[j] == -neighbors_shifts[j].unsqueeze(1), dim=2
+        )
+        condition = condition_1 & condition_2
+        tmp_index_1, tmp_index_2 = torch.where(condition)
+        if len(tmp_index_1) > 0:
+            _, counts = torch.unique(tmp_index_1, return_counts=True)
+            cum_sum = counts.cumsum(0)
+            cum_sum = torch.cat(
+                (torch.tensor([0], device=cum_sum.device), cum_sum[:-1])
+            )
+            reversed_neighbors_index[j, : number_of_neighbors[j]] = tmp_index_2[
+                cum_sum
+            ][: number_of_neighbors[j]]
+
+    return {
+        "central_species": central_species,
+        "x": displacement_vectors,
+        "neighbor_species": neighbor_species,
+        "neighbors_pos": reversed_neighbors_index,
+        "neighbors_index": neighbors_index,
+        "nums": number_of_neighbors,
+        "mask": padding_mask,
+    }
+
+
+def _systems(cutoff):
+    structures = ase.io.read(DATASET_PATH, ":")
+    systems = systems_to_torch(structures)
+    options = NeighborListOptions(cutoff=cutoff, full_list=True)
+    systems = get_systems_with_neighbor_lists(systems, [options])
+    atomic_types = sorted({int(t) for s in structures for t in s.numbers})
+    return systems, options, atomic_types
+
+
+@pytest.mark.parametrize("cutoff", [0.25, 2.0, 5.0])
+def test_system_batch_dict_regression(cutoff):
+    """The batched construction gives the same batch dicts as the previous loops."""
+    systems, options, atomic_types = _systems(cutoff)
+    all_species = torch.tensor(atomic_types)
+    max_num_neighbors = get_max_num_neighbors(systems, options)
+
+    for system in systems:
+        args = (
+            system,
+            options,
+            all_species,
+            max_num_neighbors,
+            torch.arange(len(system)),
+            torch.device("cpu"),
+        )
+        actual = get_system_batch_dict(*args)
+        expected = reference_system_batch_dict(*args)
+
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert actual[key].dtype == expected[key].dtype
+            torch.testing.assert_close(actual[key], expected[key], rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("cutoff", [0.25, 2.0, 5.0])
+def test_systems_to_batch_dict_regression(cutoff):
+    """Building the whole batch at once gives the same batch as collating the batch
+    dicts of the individual systems."""
+    systems, options, atomic_types = _systems(cutoff)
+    all_species = torch.tensor(atomic_types)
+    max_num_neighbors = get_max_num_neighbors(systems, options)
+
+    expected = collate_graph_dicts(
+        [
+            reference_system_batch_dict(
+                system,
+                options,
+                all_species,
+                max_num_neighbors,
+                torch.arange(len(system)),
+                torch.device("cpu"),
+            )
+            for system in systems
+        ]
+    )
+    actual = systems_to_batch_dict(systems, options, atomic_types, None)
+
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert actual[key].dtype == expected[key].dtype
+        torch.testing.assert_close(actual[key], expected[key], rtol=0, atol=0)
+
+
+def test_systems_to_batch_dict_torchscript():
+    """The batch dict construction can still be compiled with TorchScript."""
+    systems, options, atomic_types = _systems(5.0)
+
+    scripted = torch.jit.script(systems_to_batch_dict)
+    actual = scripted(systems, options, atomic_types, None)
+    expected = systems_to_batch_dict(systems, options, atomic_types, None)
+
+    for key in expected:
+        torch.testing.assert_close(actual[key], expected[key], rtol=0, atol=0)
@@ -192,19 +192,90 @@ def get_system_batch_dict(
 ) -> Dict[str, torch.Tensor]:
     if debug:
         write_system_data(system, options, selected_atoms_index)
-    nl = system.get_neighbor_list(options)
-    i_list = nl.samples.column("first_atom")
-    j_list = nl.samples.column("second_atom")
 
-    # First we need to get the unique indices of the atoms in the system.
-    # This includes all the atoms in the system and their neighbors.
-    unique_neighbors_index, counts = torch.unique(i_list, return_counts=True)
-    unique_index = torch.unique(
-        torch.cat((selected_atoms_index, unique_neighbors_index))
+    system_dict = get_batch_dict(
+        [system],
+        options,
+        all_species,
+        [selected_atoms_index],
+        device,
+        max_num_neighbors,
     )
+    system_dict.pop("batch")
+
+    if debug:
+        write_batch_dict(system_dict)
+    return system_dict
+
+
+def get_batch_dict(
+    systems: List[System],
+    options: NeighborListOptions,
+    all_species: torch.Tensor,
+    selected_atoms_index: List[torch.Tensor],
+    device: torch.device,
+    max_num_neighbors: Optional[int] = None,
+) -> Dict[str, torch.Tensor]:
+    """
+    Builds the PET batch of several systems at once.
+
+    The neighbor lists of all systems are concatenated, with the indices of the atoms
+    shifted by the number of atoms in the previous systems, and the padded tensors of
+    the whole batch are created in one pass. The result is the same as collating the
+    batch dicts of the individual systems with :py:func:`collate_graph_dicts`.
+
+    :param systems: The systems to put in the batch.
+    :param options: The options of the neighbor lists to use.
+    :param all_species: All the species the model knows about.
+    :param selected_atoms_index: For each system, the indices of the selected atoms.
+    :param device: The device to create the batch on.
+    :param max_num_neighbors: The number of neighbors of the padded tensors. If
+        :py:obj:`None`, the largest number of neighbors of an atom in the batch is used.
+
+    :return: The batch dict, including the index of the system of each atom.
+    """
+    i_lists: List[torch.Tensor] = []
+    j_lists: List[torch.Tensor] = []
+    S_lists: List[torch.Tensor] = []
+    D_lists: List[torch.Tensor] = []
+    selected_lists: List[torch.Tensor] = []
+    types_list: List[torch.Tensor] = []
+    system_index_list: List[torch.Tensor] = []
+    atoms_offset = 0
+    for i_system, system in enumerate(systems):
+        nl = system.get_neighbor_list(options)
+        i_lists.append(nl.samples.column("first_atom").to(torch.int64) + atoms_offset)
+        j_lists.append(nl.samples.column("second_atom").to(torch.int64) + atoms_offset)
+        S_lists.append(
+            torch.stack(
+                (
+                    nl.samples.column("cell_shift_a"),
+                    nl.samples.column("cell_shift_b"),
+                    nl.samples.column("cell_shift_c"),
+                ),
+                dim=1,
+            )
+        )
+        D_lists.append(nl.values[:, :, 0])
+        selected_lists.append(
+            selected_atoms_index[i_system].to(torch.int64) + atoms_offset
+        )
+        types_list.append(system.types)
+        system_index_list.append(
+            torch.full((len(system),), i_system, device=device, dtype=torch.int64)
+        )
+        atoms_offset += len(system)
+
+    i_list = torch.cat(i_lists)
+    j_list = torch.cat(j_lists)
+
+    # First we need to get the unique indices of the atoms in the systems.
+    # This includes all the atoms in the systems and their neighbors.
+    unique_neighbors_index, counts = torch.unique(i_list, return_counts=True)
+    unique_index = torch.unique(torch.cat(selected_lists + [unique_neighbors_index]))
 
-    # We calculate the actual size of the system, which is the number of
-    # unique atoms in the system.
+    # We calculate the actual size of the batch, which is the number of
+    # unique atoms in the systems.
     # This is required for LAMMPS interface, because by default
     # it produces the system with both local and ghost atoms.
     actual_system_size = len(unique_index)
@@ -215,11 +286,26 @@ def get_system_batch_dict(
         i_list, j_list, unique_neighbors_index, unique_index, device
     )
 
-    # We get the indices of species of the central atoms in the system
+    # The index of the system of each atom, and the index of the first atom of each
+    # system in the batch.
+    batch = torch.cat(system_index_list)[unique_index]
+    n_nodes = torch.bincount(batch, minlength=len(systems))
+    node_offsets = torch.cumsum(n_nodes, dim=0) - n_nodes
+
+    # We get the indices of species of the central atoms in the systems
     # in the all_species tensor.
-    central_species = get_central_species(system, all_species, unique_index)
+    species = torch.cat(types_list)[unique_index]
+    tmp_index_1, tmp_index_2 = torch.where(all_species.unsqueeze(1) == species)
+    central_species = tmp_index_1[torch.argsort(tmp_index_2)]
 
-    # We sort the indices of the atoms in the system, to join the
+    if max_num_neighbors is not None:
+        n_max_neighbors = max_num_neighbors
+    elif len(counts) == 0:
+        n_max_neighbors = 0
+    else:
+        n_max_neighbors = int(counts.max().item())
+
+    # We sort the indices of the atoms in the systems, to join the
     # periodic images of the same atom together. Otherwise, the
     # neighbor list may have a discontinuous indexing, like:
     # >>> i_list
@@ -232,15 +318,8 @@ def get_system_batch_dict(
     index = torch.argsort(i_list, stable=True)
     j_list = j_list[index]
     i_list = i_list[index]
-    S_list: torch.Tensor = torch.cat(
-        (
-            nl.samples.column("cell_shift_a")[None],
-            nl.samples.column("cell_shift_b")[None],
-            nl.samples.column("cell_shift_c")[None],
-        )
-    ).transpose(0, 1)[index]
-
-    D_list: torch.Tensor = nl.values[:, :, 0][index]
+    S_list = torch.cat(S_lists)[index]
+    D_list = torch.cat(D_lists)[index]
 
     # This calculates the number of neighbors for each atom.
     # By default, the number of neighbors is zero, and we update this tensor
@@ -250,37 +329,48 @@ def get_system_batch_dict(
     )
     number_of_neighbors[unique_neighbors_index] = counts
 
-    # This calculates the cumulative sum of the counts to get the
-    # starting and ending indices of each atoms' neighbors in the
-    # j_list.
-    cum_sum = counts.cumsum(0)
-    cum_sum = torch.cat((torch.tensor([0], device=counts.device), cum_sum))
-
     # We initialize the tensors for the neighbors indices, shifts and
-    # displacement vectors with zeros, and then for each atom we
-    # fill them with the corresponding values from the j_list, S_list
-    # and D_list. The padding_mask is used to mask the padding values
-    # in the tensors.
+    # displacement vectors with zeros, and then fill them with the corresponding values
+    # from the j_list, S_list and D_list. The padding_mask is used to mask the padding
+    # values in the tensors.
     neighbors_index = torch.zeros(
-        (actual_system_size, max_num_neighbors), device=device, dtype=torch.int64
+        (actual_system_size, n_max_neighbors), device=device, dtype=torch.int64
     )
+    # the padding of the neighbors indices refers to the first atom of each system
+    neighbors_index[:] = node_offsets[batch].unsqueeze(1)
     neighbors_shifts = torch.zeros(
-        (actual_system_size, max_num_neighbors, 3), device=device, dtype=torch.int64
+        (actual_system_size, n_max_neighbors, 3), device=device, dtype=torch.int64
     )
     displacement_vectors = torch.zeros(
-        (actual_system_size, max_num_neighbors, 3), device=device, dtype=torch.float32
+        (actual_system_size, n_max_neighbors, 3), device=device, dtype=torch.float32
     )
     padding_mask = torch.zeros(
-        (actual_system_size, max_num_neighbors), device=device, dtype=torch.bool
+        (actual_system_size, n_max_neighbors), device=device, dtype=torch.bool
     )
-    for j, count in enumerate(counts):
-        # For each atom, we put the neighbors species indices up
-        # to the number of neighbors, while the rest of the indices
-        # are just padded with zeros.
-        neighbors_index[j, :count] = j_list[cum_sum[j] : cum_sum[j + 1]]
-        neighbors_shifts[j, :count] = S_list[cum_sum[j] : cum_sum[j + 1]]
-        displacement_vectors[j, :count] = D_list[cum_sum[j] : cum_sum[j + 1]]
-        padding_mask[j, count:] = True  # padding mask is True for the padded values
+
+    # Inside of each system, the neighbors of the j-th atom with neighbors go to the
+    # j-th row, up to the number of neighbors, while the rest of the row is padded.
+    # Since the i_list is sorted, the column of each pair is its position in the i_list
+    # relative to the first pair of the same atom.
+    neighbors_system = batch[unique_neighbors_index]
+    n_with_neighbors = torch.bincount(neighbors_system, minlength=len(systems))
+    first_with_neighbors = torch.cumsum(n_with_neighbors, dim=0) - n_with_neighbors
+    unique_rows = (
+        node_offsets[neighbors_system]
+        + torch.arange(len(counts), device=device, dtype=torch.int64)
+        - first_with_neighbors[neighbors_system]
+    )
+    rows = torch.repeat_interleave(unique_rows, counts)
+    first_pairs = torch.cumsum(counts, dim=0) - counts
+    columns = torch.arange(len(i_list), device=device, dtype=torch.int64)
+    columns = columns - torch.repeat_interleave(first_pairs, counts)
+
+    neighbors_index[rows, columns] = j_list.to(torch.int64)
+    neighbors_shifts[rows, columns] = S_list.to(torch.int64)
+    displacement_vectors[rows, columns] = D_list.to(torch.float32)
+    # padding mask is True for the padded values
+    neighbor_slots = torch.arange(n_max_neighbors, device=device).unsqueeze(0)
+    padding_mask[unique_rows] = neighbor_slots >= counts.unsqueeze(1)
 
     # We get the indices of the species of the neighbors in the all_species tensor.
     # The reason why this function works, is because all the neighborlists are full.
@@ -323,26 +413,36 @@ def get_system_batch_dict(
     # central atom may have two neighbors, which are the same atom, but
     # different periodic images.
 
+    #
+    # For all pairs at once, we look for the first position in the neighbor list of the
+    # neighbor atom which contains the central atom with the opposite shift. The pair
+    # (i, j, S) and its reversed pair (j, i, -S) get the same id from `torch.unique`,
+    # which sorts the pairs, such that the memory only grows with the number of pairs.
     reversed_neighbors_index = torch.zeros_like(neighbors_index)
-    tmp_reversed_index = neighbors_index[neighbors_index]
-    tmp_reversed_shifts = neighbors_shifts[neighbors_index]
-    for j in range(actual_system_size):
-        condition_1 = tmp_reversed_index[j] == j
-        condition_2 = torch.all(
-            tmp_reversed_shifts[j] == -neighbors_shifts[j].unsqueeze(1), dim=2
+    n_pairs = len(i_list)
+    if n_pairs > 0:
+        second_atom = j_list.to(torch.int64).unsqueeze(1)
+        shifts = S_list.to(torch.int64)
+        keys = torch.cat(
+            [
+                torch.cat([rows.unsqueeze(1), second_atom, shifts], dim=1),
+                torch.cat([second_atom, rows.unsqueeze(1), -shifts], dim=1),
+            ]
         )
-        condition = condition_1 & condition_2
-        tmp_index_1, tmp_index_2 = torch.where(condition)
-        if len(tmp_index_1) > 0:
-            _, counts = torch.unique(tmp_index_1, return_counts=True)
-            cum_sum = counts.cumsum(0)
-            cum_sum = torch.cat(
-                (torch.tensor([0], device=cum_sum.device), cum_sum[:-1])
-            )
-            reversed_neighbors_index[j, : number_of_neighbors[j]] = tmp_index_2[
-                cum_sum
-            ][: number_of_neighbors[j]]
-    system_dict = {
+        _, keys_id = torch.unique(keys, dim=0, return_inverse=True)
+
+        # first column of the pairs with a given id, `n_pairs` if there is none
+        first_column = torch.full(
+            (2 * n_pairs,), n_pairs, device=device, dtype=torch.int64
+        )
+        first_column = first_column.scatter_reduce(
+            0, keys_id[:n_pairs], columns, reduce="amin"
+        )
+        reversed_columns = first_column[keys_id[n_pairs:]]
+        reversed_columns[reversed_columns == n_pairs] = 0
+        reversed_neighbors_index[rows, columns] = reversed_columns
+
+    return {
         "central_species": central_species,
         "x": displacement_vectors,
         "neighbor_species": neighbor_species,
@@ -350,10 +450,8 @@ def get_system_batch_dict(
         "neighbors_index": neighbors_index,
         "nums": number_of_neighbors,
         "mask": padding_mask,
+        "batch": batch,
     }
-    if debug:
-        write_batch_dict(system_dict)
-    return system_dict
 
 
 def systems_to_batch_dict(
@@ -377,22 +475,12 @@ def systems_to_batch_dict(
     """
     device = systems[0].positions.device
     all_species = torch.tensor(all_species_list, device=device)
-    batch: List[Dict[str, torch.Tensor]] = []
-    max_num_neighbors = get_max_num_neighbors(systems, options)
+    selected_atoms_index: List[torch.Tensor] = []
     for i, system in enumerate(systems):
         if selected_atoms is not None:
-            selected_atoms_index = selected_atoms.values[:, 1][
-                selected_atoms.values[:, 0] == i
-            ]
+            selected_atoms_index.append(
+                selected_atoms.values[:, 1][selected_atoms.values[:, 0] == i]
+            )
         else:
-            selected_atoms_index = torch.arange(len(system), device=device)
-        system_dict = get_system_batch_dict(
-            system,
-            options,
-            all_species,
-            max_num_neighbors,
-            selected_atoms_index,
-            device,
-        )
-        batch.append(system_dict)
-    return collate_graph_dicts(batch)
+            selected_atoms_index.append(torch.arange(len(system), device=device))
+    return get_batch_dict(systems, options, all_species, selected_atoms_index, device)
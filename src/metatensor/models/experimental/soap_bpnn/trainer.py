@@ -8,6 +8,8 @@ from metatensor.learn.data import DataLoader
 
 from ...utils.composition import calculate_composition_weights
 from ...utils.data import (
+    AtomCountBatchSampler,
+    CachedDataLoader,
     CombinedDataLoader,
     Dataset,
     TargetInfoDict,
@@ -15,11 +17,20 @@ from ...utils.data import (
     get_all_targets,
 )
 from ...utils.data.extract_targets import get_targets_dict
+from ...utils.distributed import (
+    average_gradients,
+    get_rank,
+    is_distributed,
+    iterate_in_lockstep,
+    shard_dataset,
+    sum_over_processes,
+)
 from ...utils.evaluate_model import evaluate_model
 from ...utils.external_naming import to_external_name
 from ...utils.logging import MetricLogger
 from ...utils.loss import TensorMapDictLoss
 from ...utils.metrics import RMSEAccumulator
+from ...utils.mixed_precision import autocast_linear_layers, get_mixed_precision_dtype
 from ...utils.per_atom import average_by_num_atoms
 from .model import SoapBpnn
 
@@ -35,6 +46,9 @@ warnings.filterwarnings(
 
 
 class Trainer:
+    # the training can be distributed over several processes
+    __supports_distributed__ = True
+
     def __init__(self, train_hypers):
         self.hypers = train_hypers
 
@@ -103,30 +117,54 @@ class Trainer:
 
         logger.info("Setting up data loaders")
 
+        # In distributed training, every process uses a part of the datasets:
+        distributed = is_distributed()
+        if distributed:
+            train_datasets = [shard_dataset(dataset) for dataset in train_datasets]
+            # validation shards are not padded, to compute the metrics on every
+            # sample exactly once
+            validation_datasets = [
+                shard_dataset(dataset, pad=False) for dataset in validation_datasets
+            ]
+
         # Create dataloader for the training datasets:
         train_dataloaders = []
         for dataset in train_datasets:
+            if self.hypers["max_atoms_per_batch"] is None:
+                batching = {"batch_size": self.hypers["batch_size"], "shuffle": True}
+            else:
+                batching = {
+                    "batch_sampler": AtomCountBatchSampler(
+                        dataset, self.hypers["max_atoms_per_batch"], shuffle=True
+                    )
+                }
             train_dataloaders.append(
-                DataLoader(
-                    dataset=dataset,
-                    batch_size=self.hypers["batch_size"],
-                    shuffle=True,
-                    collate_fn=collate_fn,
-                )
+                DataLoader(dataset=dataset, collate_fn=collate_fn, **batching)
             )
-        train_dataloader = CombinedDataLoader(train_dataloaders, shuffle=True)
+        train_dataloader = CombinedDataLoader(
+            train_dataloaders,
+            shuffle=True,
+            weights=self.hypers["dataset_weights"],
+            temperature=self.hypers["dataset_temperature"],
+            steps_per_epoch=self.hypers["steps_per_epoch"],
+        )
 
         # Create dataloader for the validation datasets:
         validation_dataloaders = []
         for dataset in validation_datasets:
-            validation_dataloaders.append(
-                DataLoader(
-                    dataset=dataset,
-                    batch_size=self.hypers["batch_size"],
-                    shuffle=False,
-                    collate_fn=collate_fn,
-                )
-            )
+            if self.hypers["max_atoms_per_batch"] is None:
+                batching = {"batch_size": self.hypers["batch_size"], "shuffle": False}
+            else:
+                batching = {
+                    "batch_sampler": AtomCountBatchSampler(
+                        dataset, self.hypers["max_atoms_per_batch"], shuffle=False
+                    )
+                }
+            dataloader = DataLoader(dataset=dataset, collate_fn=collate_fn, **batching)
+            if self.hypers["cache_validation_batches"]:
+                # validation batches never change, collate them only once
+                dataloader = CachedDataLoader(dataloader, device=device)
+            validation_dataloaders.append(dataloader)
         validation_dataloader = CombinedDataLoader(
             validation_dataloaders, shuffle=False
         )
@@ -178,6 +216,18 @@ class Trainer:
         # per-atom targets:
         per_structure_targets = self.hypers["per_structure_targets"]
 
+        # With mixed precision, the linear layers are evaluated in lower precision while
+        # the weights stay in full precision. float16 losses are scaled to avoid the
+        # underflow of small gradients.
+        mixed_precision_dtype = get_mixed_precision_dtype(
+            self.hypers["mixed_precision"], device
+        )
+        if mixed_precision_dtype is not None:
+            logger.info(f"Using mixed precision with {mixed_precision_dtype}")
+        grad_scaler = torch.cuda.amp.GradScaler(
+            enabled=mixed_precision_dtype == torch.float16
+        )
+
         # Train the model:
         logger.info("Starting training")
         for epoch in range(self.hypers["num_epochs"]):
@@ -185,7 +235,7 @@ class Trainer:
             validation_rmse_calculator = RMSEAccumulator()
 
             train_loss = 0.0
-            for batch in train_dataloader:
+            for batch in iterate_in_lockstep(train_dataloader):
                 optimizer.zero_grad()
 
                 systems, targets = batch
@@ -193,14 +243,15 @@ class Trainer:
                 targets = {
                     key: value.to(device=device) for key, value in targets.items()
                 }
-                predictions = evaluate_model(
-                    model,
-                    systems,
-                    TargetInfoDict(
-                        **{key: training_targets[key] for key in targets.keys()}
-                    ),
-                    is_training=True,
-                )
+                with autocast_linear_layers(model, mixed_precision_dtype):
+                    predictions = evaluate_model(
+                        model,
+                        systems,
+                        TargetInfoDict(
+                            **{key: training_targets[key] for key in targets.keys()}
+                        ),
+                        is_training=True,
+                    )
 
                 # average by the number of atoms
                 predictions = average_by_num_atoms(
@@ -210,11 +261,15 @@ class Trainer:
 
                 train_loss_batch = loss_fn(predictions, targets)
                 train_loss += train_loss_batch.item()
-                train_loss_batch.backward()
-                optimizer.step()
+                grad_scaler.scale(train_loss_batch).backward()
+                average_gradients(model)
+                grad_scaler.step(optimizer)
+                grad_scaler.update()
                 train_rmse_calculator.update(predictions, targets)
+            train_loss = sum_over_processes(train_loss)
             finalized_train_info = train_rmse_calculator.finalize(
-                not_per_atom=["positions_gradients"] + per_structure_targets
+                not_per_atom=["positions_gradients"] + per_structure_targets,
+                is_distributed=distributed,
             )
 
             validation_loss = 0.0
@@ -224,14 +279,15 @@ class Trainer:
                 targets = {
                     key: value.to(device=device) for key, value in targets.items()
                 }
-                predictions = evaluate_model(
-                    model,
-                    systems,
-                    TargetInfoDict(
-                        **{key: training_targets[key] for key in targets.keys()}
-                    ),
-                    is_training=False,
-                )
+                with autocast_linear_layers(model, mixed_precision_dtype):
+                    predictions = evaluate_model(
+                        model,
+                        systems,
+                        TargetInfoDict(
+                            **{key: training_targets[key] for key in targets.keys()}
+                        ),
+                        is_training=False,
+                    )
 
                 # average by the number of atoms
                 predictions = average_by_num_atoms(
@@ -242,8 +298,10 @@ class Trainer:
                 validation_loss_batch = loss_fn(predictions, targets)
                 validation_loss += validation_loss_batch.item()
                 validation_rmse_calculator.update(predictions, targets)
+            validation_loss = sum_over_processes(validation_loss)
             finalized_validation_info = validation_rmse_calculator.finalize(
-                not_per_atom=["positions_gradients"] + per_structure_targets
+                not_per_atom=["positions_gradients"] + per_structure_targets,
+                is_distributed=distributed,
             )
 
             lr_scheduler.step(validation_loss)
@@ -268,7 +326,7 @@ class Trainer:
                     epoch=epoch,
                 )
 
-            if epoch % self.hypers["checkpoint_interval"] == 0:
+            if epoch % self.hypers["checkpoint_interval"] == 0 and get_rank() == 0:
                 model.save_checkpoint(Path(checkpoint_dir) / f"model_{epoch}.ckpt")
 
             # early stopping criterion:
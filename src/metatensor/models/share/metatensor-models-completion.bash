@@ -61,12 +61,45 @@ _metatensor-models()
       COMPREPLY=( $(compgen -W "${opts}" -- "${cur_word}") )
       return 0
       ;;
+    preprocess)
+      case "${prev_word}" in
+        -o|--output)
+          COMPREPLY=( )
+          return 0
+          ;;
+        -h|--help)
+          COMPREPLY=( )
+          return 0
+          ;;
+        *)
+          if [[ $COMP_CWORD -eq 2 ]]; then
+            COMPREPLY=( $(compgen -f -X "$yaml" -- "${cur_word}") )
+            return 0
+          fi
+          ;;
+      esac
+      local opts="-h --help -o --output"
+      COMPREPLY=( $(compgen -W "${opts}" -- "${cur_word}") )
+      return 0
+      ;;
     eval)
       case "${prev_word}" in
         -o|--output)
           COMPREPLY=( )
           return 0
           ;;
+        --neighbor-list-cache)
+          COMPREPLY=( $(compgen -d -- "${cur_word}") )
+          return 0
+          ;;
+        -j|--num-workers)
+          COMPREPLY=( )
+          return 0
+          ;;
+        -b|--batch-size|--max-atoms-per-batch|--trajectory-skin)
+          COMPREPLY=( )
+          return 0
+          ;;
         -h|--help)
           COMPREPLY=( )
           return 0
@@ -81,14 +114,14 @@ _metatensor-models()
           fi
           ;;
       esac
-      local opts="-h --help -o --output"
+      local opts="-h --help -o --output --neighbor-list-cache -j --num-workers -b --batch-size --max-atoms-per-batch --trajectory-skin"
       COMPREPLY=( $(compgen -W "${opts}" -- "${cur_word}") )
       return 0
       ;;
   esac
 
   # Complete the basic metatensor-models commands.
-  local opts="eval export train -h --help --debug --version"
+  local opts="eval export preprocess train -h --help --debug --version"
   COMPREPLY=( $(compgen -W "${opts}" -- "${cur_word}") )
   return 0
 }
@@ -1,14 +1,18 @@
+from .batch_sampler import AtomCountBatchSampler, get_num_atoms  # noqa: F401
+from .cached_dataloader import CachedDataLoader  # noqa: F401
+from .combine_dataloaders import CombinedDataLoader  # noqa: F401
 from .dataset import (  # noqa: F401
     Dataset,
+    DatasetInfo,
     TargetInfo,
     TargetInfoDict,
-    DatasetInfo,
-    get_atomic_types,
-    get_all_targets,
-    collate_fn,
     check_datasets,
+    collate_fn,
+    get_all_targets,
+    get_atomic_types,
     group_and_join,
 )
+from .extract_targets import get_targets_dict  # noqa: F401
 from .readers import (  # noqa: F401
     read_energy,
     read_forces,
@@ -17,8 +21,5 @@ from .readers import (  # noqa: F401
     read_targets,
     read_virial,
 )
-
-from .writers import write_predictions  # noqa: F401
-from .combine_dataloaders import CombinedDataLoader  # noqa: F401
 from .system_to_ase import system_to_ase  # noqa: F401
-from .extract_targets import get_targets_dict  # noqa: F401
+from .writers import get_predictions_writer, write_predictions  # noqa: F401
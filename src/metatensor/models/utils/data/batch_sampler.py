@@ -0,0 +1,136 @@
+import logging
+from typing import Iterator, List, Optional, Union, cast
+
+import numpy as np
+import torch
+
+from .dataset import Dataset
+from .disk_dataset import DiskDataset
+
+
+logger = logging.getLogger(__name__)
+
+
+class AtomCountBatchSampler(torch.utils.data.Sampler):
+    """A batch sampler packing systems into batches with a maximal number of atoms.
+
+    Instead of using a fixed number of systems, batches are filled with systems until
+    adding the next system would exceed ``max_atoms``. This keeps the memory and time
+    needed for each batch similar on datasets containing systems of very different
+    sizes. Systems with more than ``max_atoms`` atoms are put in a batch of their own.
+
+    To pack the batches tightly, the systems are split into buckets of ``bucket_size``
+    systems, which are sorted by size before being packed into batches.
+
+    The sampler can be given to a :py:class:`torch.utils.data.DataLoader` as
+    ``batch_sampler``:
+
+    .. code-block:: python
+
+        sampler = AtomCountBatchSampler(dataset, max_atoms=1000, shuffle=True)
+        dataloader = DataLoader(dataset, batch_sampler=sampler, collate_fn=collate_fn)
+
+    The number of batches of an epoch depends on the order of the systems. The batches
+    of the next epoch are prepared when an epoch starts, such that ``len()`` always
+    returns the number of batches of the upcoming epoch.
+
+    :param dataset: dataset to sample from
+    :param max_atoms: maximal total number of atoms in a batch
+    :param shuffle: whether to shuffle the systems and batches in every epoch
+    :param bucket_size: number of systems which are sorted together by their size
+    :param seed: seed of the random generator used for shuffling. If :py:obj:`None`,
+        the seed is drawn from :py:mod:`numpy.random`.
+    """
+
+    def __init__(
+        self,
+        dataset: Union[Dataset, DiskDataset, torch.utils.data.Subset],
+        max_atoms: int,
+        shuffle: bool = False,
+        bucket_size: int = 1000,
+        seed: Optional[int] = None,
+    ):
+        if max_atoms <= 0:
+            raise ValueError("`max_atoms` must be positive.")
+        if bucket_size <= 0:
+            raise ValueError("`bucket_size` must be positive.")
+
+        self.num_atoms = get_num_atoms(dataset)
+        self.max_atoms = max_atoms
+        self.shuffle = shuffle
+        self.bucket_size = bucket_size
+
+        if seed is None:
+            seed = np.random.randint(2**32, dtype=np.int64)
+        self.generator = np.random.default_rng(seed)
+
+        n_too_large = int(np.sum(self.num_atoms > max_atoms))
+        if n_too_large > 0:
+            logger.warning(
+                f"{n_too_large} systems contain more than {max_atoms} atoms, they will "
+                "be put in batches of their own."
+            )
+
+        self._batches = self._create_batches()
+
+    def _create_batches(self) -> List[List[int]]:
+        if self.shuffle:
+            indices = self.generator.permutation(len(self.num_atoms))
+        else:
+            indices = np.arange(len(self.num_atoms))
+
+        batches = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = indices[start : start + self.bucket_size]
+            bucket = bucket[np.argsort(self.num_atoms[bucket], kind="stable")]
+
+            batch: List[int] = []
+            batch_atoms = 0
+            for index in bucket.tolist():
+                n_atoms = int(self.num_atoms[index])
+                if len(batch) > 0 and batch_atoms + n_atoms > self.max_atoms:
+                    batches.append(batch)
+                    batch = []
+                    batch_atoms = 0
+                batch.append(index)
+                batch_atoms += n_atoms
+
+            if len(batch) > 0:
+                batches.append(batch)
+
+        if self.shuffle:
+            order = self.generator.permutation(len(batches))
+            batches = [batches[i] for i in order]
+
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._batches
+        self._batches = self._create_batches()
+        return iter(batches)
+
+    def __len__(self) -> int:
+        return len(self._batches)
+
+
+def get_num_atoms(
+    dataset: Union[Dataset, DiskDataset, torch.utils.data.Subset]
+) -> np.ndarray:
+    """Get the number of atoms of all systems in a dataset.
+
+    :param dataset: dataset to get the number of atoms from
+    :return: array with the number of atoms of each system
+    """
+    if isinstance(dataset, torch.utils.data.Subset):
+        # subsets are only created from the datasets of this package
+        base_dataset = cast(
+            Union[Dataset, DiskDataset, torch.utils.data.Subset], dataset.dataset
+        )
+        return get_num_atoms(base_dataset)[np.asarray(dataset.indices, dtype=int)]
+    elif isinstance(dataset, DiskDataset):
+        # read from the index of the file, without creating the systems
+        return np.diff(dataset.arrays["atoms_offsets"])
+    else:
+        return np.array(
+            [len(dataset[i]["system"]) for i in range(len(dataset))], dtype=np.int64
+        )
@@ -0,0 +1,48 @@
+from typing import Any, Iterator, List, Optional, Tuple
+
+import torch
+
+
+class CachedDataLoader:
+    """
+    A dataloader returning the same, collated batches in every epoch.
+
+    All batches of ``dataloader`` are loaded and collated once, when the cached
+    dataloader is created, and are then reused for every pass over it. This avoids the
+    repeated collation of datasets which are not shuffled, like validation sets. It
+    should not be used for dataloaders which shuffle their samples, since the order of
+    the batches would then be fixed to the one of the first epoch.
+
+    Batches are expected to be in the format returned by
+    :py:func:`metatensor.models.utils.data.collate_fn`, i.e. a tuple of the systems and
+    a dictionary of targets.
+
+    :param dataloader: dataloader to cache the batches of
+    :param device: if given, the systems and targets of all batches are moved to this
+        device once, when they are cached. The batches then stay in the memory of this
+        device.
+    """
+
+    def __init__(
+        self,
+        dataloader: torch.utils.data.DataLoader,
+        device: Optional[torch.device] = None,
+    ):
+        self.batches: List[Tuple[Any, ...]] = []
+        for systems, targets in dataloader:
+            if device is not None:
+                systems = tuple(system.to(device=device) for system in systems)
+                targets = {
+                    key: value.to(device=device) for key, value in targets.items()
+                }
+            self.batches.append((systems, targets))
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        return iter(self.batches)
+
+    def __len__(self) -> int:
+        """Number of cached batches.
+
+        :return: the number of batches
+        """
+        return len(self.batches)
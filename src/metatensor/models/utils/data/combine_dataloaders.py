@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterator, List, Optional
 
 import numpy as np
 import torch
@@ -11,30 +11,108 @@ class CombinedDataLoader:
     This is useful for learning from multiple datasets at the same time,
     each of which may have different batch sizes, properties, etc.
 
+    By default, one epoch is a full pass over every dataloader. The amount of batches
+    drawn from each dataloader can instead be controlled with ``weights`` or
+    ``temperature``. In this case, every batch of an epoch is drawn from a dataloader
+    chosen at random with the corresponding probability. Dataloaders are cycled when
+    they run out of batches and continue where they stopped in the next epoch, such that
+    small datasets are repeated and large datasets are not fully seen every epoch.
+
     :param dataloaders: list of dataloaders to combine
     :param shuffle: whether to shuffle the combined dataloader (this does not
         act on the individual batches, but it shuffles the order in which
-        they are returned)
+        they are returned). The order changes in every epoch.
+    :param weights: relative probability to draw a batch from each of the dataloaders.
+        Can not be given together with ``temperature``.
+    :param temperature: draw batches from the dataloaders with a probability
+        proportional to ``n_batches ** (1 / temperature)``, where ``n_batches`` is the
+        number of batches of a dataloader. ``1`` samples all batches with the same
+        probability, larger temperatures sample the datasets more uniformly. Can not be
+        given together with ``weights``.
+    :param steps_per_epoch: number of batches in one epoch. By default this is the
+        total number of batches in all dataloaders.
+    :param seed: seed of the random generator used to shuffle and draw the
+        dataloaders. If :py:obj:`None`, the seed is drawn from :py:mod:`numpy.random`.
 
     :return: the combined dataloader
     """
 
-    def __init__(self, dataloaders: List[torch.utils.data.DataLoader], shuffle: bool):
+    def __init__(
+        self,
+        dataloaders: List[torch.utils.data.DataLoader],
+        shuffle: bool,
+        weights: Optional[List[float]] = None,
+        temperature: Optional[float] = None,
+        steps_per_epoch: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
         self.dataloaders = dataloaders
         self.shuffle = shuffle
-
-        # Create the indices:
-        self.indices = list(range(len(self)))
-
-        # Shuffle the indices if requested
-        if self.shuffle:
-            np.random.shuffle(self.indices)
+        self.steps_per_epoch = steps_per_epoch
+
+        if seed is None:
+            seed = np.random.randint(2**32, dtype=np.int64)
+        self.generator = np.random.default_rng(seed)
+
+        if weights is not None and temperature is not None:
+            raise ValueError("Only one of `weights` and `temperature` can be given.")
+
+        n_batches = np.array([len(dl) for dl in self.dataloaders], dtype=np.float64)
+        if weights is not None:
+            if len(weights) != len(self.dataloaders):
+                raise ValueError(
+                    f"Got {len(weights)} weights for {len(self.dataloaders)} "
+                    "dataloaders."
+                )
+            probabilities = np.array(weights, dtype=np.float64)
+            if np.any(probabilities < 0) or probabilities.sum() <= 0:
+                raise ValueError("Weights must be positive and not all zero.")
+        elif temperature is not None:
+            if temperature <= 0:
+                raise ValueError("`temperature` must be positive.")
+            probabilities = n_batches ** (1 / temperature)
+        elif steps_per_epoch is not None:
+            probabilities = n_batches
+        else:
+            probabilities = None
+
+        if probabilities is None:
+            self.probabilities = None
+        else:
+            # never draw from empty dataloaders
+            probabilities[n_batches == 0] = 0
+            if probabilities.sum() == 0:
+                raise ValueError("All dataloaders with a non-zero weight are empty.")
+            self.probabilities = probabilities / probabilities.sum()
+
+        # The iterators are only created once a batch is requested from them. Batches
+        # are then loaded one by one from the dataloaders, instead of loading all of
+        # them at the start of an epoch.
+        self.iterators: List[Optional[Iterator]] = [None] * len(self.dataloaders)
 
         self.reset()
 
     def reset(self):
         self.current_index = 0
-        self.full_list = [batch for dl in self.dataloaders for batch in dl]
+
+        if self.probabilities is None:
+            # Create the indices of the dataloader each batch is drawn from:
+            self.indices = np.repeat(
+                np.arange(len(self.dataloaders)), [len(dl) for dl in self.dataloaders]
+            )
+
+            # Shuffle the indices if requested
+            if self.shuffle:
+                self.generator.shuffle(self.indices)
+
+            # every epoch is a new pass over all dataloaders
+            self.iterators = [None] * len(self.dataloaders)
+        else:
+            self.indices = self.generator.choice(
+                len(self.dataloaders), size=len(self), p=self.probabilities
+            )
+            if not self.shuffle:
+                self.indices = np.sort(self.indices)
 
     def __iter__(self):
         return self
@@ -46,15 +124,26 @@ class CombinedDataLoader:
 
         idx = self.indices[self.current_index]
         self.current_index += 1
-        return self.full_list[idx]
+
+        if self.iterators[idx] is None:
+            self.iterators[idx] = iter(self.dataloaders[idx])
+
+        try:
+            return next(self.iterators[idx])
+        except StopIteration:
+            # the dataloader ran out of batches, start a new pass over it
+            self.iterators[idx] = iter(self.dataloaders[idx])
+            return next(self.iterators[idx])
 
     def __len__(self):
-        """Total number of batches in all dataloaders.
+        """Total number of batches in one epoch.
 
-        This returns the total number of batches in all dataloaders
-        (as opposed to the total number of samples or the number of
+        Unless ``steps_per_epoch`` is given, this returns the total number of batches in
+        all dataloaders (as opposed to the total number of samples or the number of
         individual dataloaders).
 
-        :return: the total number of batches in all dataloaders
+        :return: the number of batches in one epoch
         """
+        if self.steps_per_epoch is not None:
+            return self.steps_per_epoch
         return sum(len(dl) for dl in self.dataloaders)
@@ -4,7 +4,7 @@ from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 import metatensor.learn
 import torch
-from metatensor.torch import TensorMap
+from metatensor.torch import Labels, TensorBlock, TensorMap
 from torch import Generator, default_generator
 from torch.utils.data import Subset, random_split
 
@@ -376,10 +376,115 @@ def group_and_join(
         if isinstance(f[0], torch.ScriptObject) and f[0]._has_method(
             "keys_to_properties"
         ):  # inferred metatensor.torch.TensorMap type
-            data.append(metatensor.torch.join(f, axis="samples"))
+            data.append(_join_tensor_maps(list(f)))
         elif isinstance(f[0], torch.Tensor):  # torch.Tensor type
             data.append(torch.vstack(f))
         else:  # otherwise just keep as a list
             data.append(f)
 
     return {name: value for name, value in zip(names, data)}
+
+
+def _join_tensor_maps(tensor_maps: List[TensorMap]) -> TensorMap:
+    # Joins a list of TensorMaps along the samples, giving the same result as
+    # `metatensor.torch.join(tensor_maps, axis="samples")`. For the common case of
+    # TensorMaps with a single block containing a single sample (like energies), the
+    # values and gradients are concatenated directly, which avoids the more general
+    # (and slower) metadata handling of `join`.
+    joined_block = _join_single_sample_blocks(tensor_maps)
+    if joined_block is None:
+        return metatensor.torch.join(tensor_maps, axis="samples")
+
+    return TensorMap(keys=tensor_maps[0].keys, blocks=[joined_block])
+
+
+def _join_single_sample_blocks(tensor_maps: List[TensorMap]) -> Optional[TensorBlock]:
+    # Returns `None` if the fast path can not be used. Comparing `Labels` is slow
+    # compared to the join itself, so only the names of the metadata of the first
+    # TensorMap are checked and the others are compared by the values of the keys and
+    # properties and the shapes of all arrays.
+    if len(tensor_maps) < 2:
+        return None
+
+    first_tensor_map = tensor_maps[0]
+    if len(first_tensor_map) != 1:
+        return None
+
+    keys = first_tensor_map.keys.values
+    first_block = first_tensor_map.block()
+    if "tensor" in first_block.samples.names:
+        return None
+
+    properties = first_block.properties.values
+    gradient_names = first_block.gradients_list()
+    if any(
+        len(first_block.gradient(name).gradients_list()) != 0 for name in gradient_names
+    ):
+        return None
+
+    values = []
+    samples = []
+    gradients: Dict[str, List[TensorBlock]] = {name: [] for name in gradient_names}
+    for tensor_map in tensor_maps:
+        if len(tensor_map) != 1 or not torch.equal(tensor_map.keys.values, keys):
+            return None
+
+        block = tensor_map.block()
+        block_values = block.values
+        block_samples = block.samples.values
+        if (
+            block_values.shape[0] != 1
+            or block_values.shape[1:] != first_block.values.shape[1:]
+            or block_samples.shape[1] != len(first_block.samples.names)
+            or not torch.equal(block.properties.values, properties)
+            or block.gradients_list() != gradient_names
+        ):
+            return None
+
+        values.append(block_values)
+        samples.append(block_samples)
+        for name in gradient_names:
+            gradients[name].append(block.gradient(name))
+
+    # the samples of the joined block get an additional "tensor" dimension, containing
+    # the index of the TensorMap each sample comes from
+    tensor_index = torch.arange(len(samples), dtype=torch.int32, device=keys.device)
+    joined_block = TensorBlock(
+        values=torch.vstack(values),
+        samples=Labels(
+            first_block.samples.names + ["tensor"],
+            torch.hstack([torch.vstack(samples), tensor_index.unsqueeze(1)]),
+        ),
+        components=first_block.components,
+        properties=first_block.properties,
+    )
+
+    for name in gradient_names:
+        gradient_values = [gradient.values for gradient in gradients[name]]
+        gradient_samples = [gradient.samples.values for gradient in gradients[name]]
+        first_gradient = first_block.gradient(name)
+        if any(
+            v.shape[1:] != gradient_values[0].shape[1:]
+            or s.shape[1] != gradient_samples[0].shape[1]
+            for v, s in zip(gradient_values, gradient_samples)
+        ):
+            return None
+
+        # the first column of the gradient samples ("sample") refers to the row of the
+        # values, which is the index of the TensorMap after joining
+        joined_gradient_samples = torch.vstack(gradient_samples)
+        joined_gradient_samples[:, 0] = torch.repeat_interleave(
+            tensor_index,
+            torch.tensor([len(v) for v in gradient_values], device=keys.device),
+        )
+        joined_block.add_gradient(
+            parameter=name,
+            gradient=TensorBlock(
+                values=torch.vstack(gradient_values),
+                samples=Labels(first_gradient.samples.names, joined_gradient_samples),
+                components=first_gradient.components,
+                properties=first_block.properties,
+            ),
+        )
+
+    return joined_block
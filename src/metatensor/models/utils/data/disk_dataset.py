@@ -0,0 +1,357 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from metatensor.torch import Labels, TensorBlock, TensorMap
+from metatensor.torch.atomistic import System
+
+from .dataset import Dataset, TargetInfo, TargetInfoDict
+
+
+DISK_DATASET_SUFFIX = ".mtmd"
+""":py:class:`str`: file suffix of preprocessed datasets"""
+
+_MAGIC = b"MTMDATA\x00"
+_VERSION = 2
+# offsets of all arrays are aligned to this number of bytes
+_ALIGNMENT = 64
+
+
+def write_disk_dataset(
+    filename: Union[str, Path],
+    systems: List[System],
+    targets: Dict[str, List[TensorMap]],
+    target_info: TargetInfoDict,
+) -> None:
+    """Write systems and targets into a single binary file.
+
+    Positions, types, cells as well as the values and gradients of all targets are
+    stored as flat arrays concatenated over all systems. The atoms of each system are
+    found using an offset index. The resulting file can be memory-mapped and read
+    lazily with :py:class:`DiskDataset`.
+
+    Per-structure and per-atom targets without components are supported, with any
+    number of properties. The names and values of the properties as well as the kind of
+    each target are stored in the header of the file. Gradients with respect to
+    ``positions`` and ``strain`` are only supported for per-structure targets.
+
+    :param filename: name of the file to write
+    :param systems: list of systems
+    :param targets: dictionary containing one list of single-block
+        :py:class:`metatensor.torch.TensorMap` per target, with one entry per system.
+        This is the format returned by
+        :py:func:`metatensor.models.utils.data.read_targets`.
+    :param target_info: information about the targets
+    :raises ValueError: if the number of systems and target values is inconsistent or
+        if the blocks of a target can not be stored.
+    """
+    n_atoms = np.array([len(system) for system in systems], dtype=np.int64)
+    atoms_offsets = np.concatenate([[0], np.cumsum(n_atoms)]).astype(np.int64)
+
+    arrays: Dict[str, np.ndarray] = {
+        "atoms_offsets": atoms_offsets,
+        "positions": _concatenate([s.positions for s in systems], (0, 3)),
+        "types": _concatenate([s.types for s in systems], (0,)).astype(np.int32),
+        "cells": _concatenate([s.cell.unsqueeze(0) for s in systems], (0, 3, 3)),
+    }
+    properties: Dict[str, Dict[str, Any]] = {}
+
+    for target_name, tensor_maps in targets.items():
+        if len(tensor_maps) != len(systems):
+            raise ValueError(
+                f"Found {len(tensor_maps)} values for target {target_name!r} but "
+                f"{len(systems)} systems."
+            )
+
+        info = target_info[target_name]
+        blocks = [tensor_map.block() for tensor_map in tensor_maps]
+        _check_target_blocks(target_name, blocks, info, n_atoms)
+
+        if len(blocks) > 0:
+            target_properties = blocks[0].properties
+            properties[target_name] = {
+                "names": target_properties.names,
+                "values": target_properties.values.tolist(),
+            }
+        else:
+            properties[target_name] = {"names": ["property"], "values": []}
+        n_properties = len(properties[target_name]["values"])
+
+        arrays[f"{target_name}/values"] = _concatenate(
+            [block.values for block in blocks], (0, n_properties)
+        )
+        for gradient_name in info.gradients:
+            arrays[f"{target_name}/{gradient_name}"] = _concatenate(
+                [block.gradient(gradient_name).values for block in blocks],
+                (
+                    (0, 3, n_properties)
+                    if gradient_name == "positions"
+                    else (0, 3, 3, n_properties)
+                ),
+            )
+
+    header: Dict[str, Any] = {
+        "version": _VERSION,
+        "n_systems": len(systems),
+        "targets": {
+            name: {
+                "quantity": info.quantity,
+                "unit": info.unit,
+                "per_atom": info.per_atom,
+                "gradients": sorted(info.gradients),
+            }
+            for name, info in target_info.items()
+            if name in targets
+        },
+        "properties": properties,
+        "arrays": {},
+    }
+
+    # the header is written first, followed by the data of all arrays. The header
+    # stores the offset of each array relative to the start of the file.
+    header_size = _ALIGNMENT
+    while True:
+        offset = header_size
+        for name, array in arrays.items():
+            header["arrays"][name] = {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+            offset = _align(offset + array.nbytes)
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        required_size = _align(len(_MAGIC) + 8 + len(header_bytes))
+        if required_size <= header_size:
+            break
+        header_size = required_size
+
+    with open(filename, "wb") as file:
+        file.write(_MAGIC)
+        file.write(np.uint64(len(header_bytes)).tobytes())
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(header["arrays"][name]["offset"])
+            file.write(np.ascontiguousarray(array).tobytes())
+
+
+class DiskDataset(Dataset):
+    """A dataset reading systems and targets lazily from a preprocessed file.
+
+    The file, written by :py:func:`write_disk_dataset` (or the ``preprocess``
+    sub-command), is memory-mapped. Systems and targets are only created when an entry
+    is accessed. This gives a close to zero startup time, lets several processes share
+    the same pages and allows to train on datasets larger than the available memory.
+
+    Entries are returned as dictionaries in the same format as for
+    :py:class:`metatensor.models.utils.data.Dataset`, and a :py:class:`DiskDataset` can
+    be used everywhere such a dataset is expected.
+
+    .. note::
+
+        A new :py:class:`metatensor.torch.atomistic.System` is created on every access
+        of an entry. Data attached to a returned system, for example neighbor lists, is
+        not stored in the dataset.
+
+    :param filename: name of the file to read
+    :param dtype: desired data type of the positions, cells and targets
+    """
+
+    def __init__(self, filename: Union[str, Path], dtype: torch.dtype = torch.float32):
+        # the data is read from the file, there is no in-memory dataset to initialize
+        self.filename = str(filename)
+        self.dtype = dtype
+
+        with open(self.filename, "rb") as file:
+            if file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{self.filename!r} is not a preprocessed dataset")
+            header_length = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+            self._header = json.loads(file.read(header_length).decode("utf-8"))
+
+        if self._header["version"] != _VERSION:
+            raise ValueError(
+                f"Unsupported version {self._header['version']} of the preprocessed "
+                f"dataset {self.filename!r}. Please preprocess the dataset again."
+            )
+
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+
+    def __getstate__(self):
+        # do not pickle the memory maps, every process opens the file on its own
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    @property
+    def target_info(self) -> TargetInfoDict:
+        """Information about the targets stored inside the file."""
+        target_info = TargetInfoDict()
+        for name, info in self._header["targets"].items():
+            target_info[name] = TargetInfo(**info)
+        return target_info
+
+    @property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Memory-mapped arrays stored inside the file."""
+        if self._arrays is None:
+            self._arrays = {
+                name: (
+                    np.memmap(
+                        self.filename,
+                        dtype=np.dtype(array["dtype"]),
+                        mode="r",
+                        offset=array["offset"],
+                        shape=tuple(array["shape"]),
+                    )
+                    if np.prod(array["shape"]) > 0
+                    else np.empty(array["shape"], dtype=np.dtype(array["dtype"]))
+                )
+                for name, array in self._header["arrays"].items()
+            }
+        return self._arrays
+
+    def __len__(self) -> int:
+        return self._header["n_systems"]
+
+    def __getitem__(self, idx: int) -> Dict:
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(f"index {idx} is out of range for {len(self)} systems")
+
+        arrays = self.arrays
+        start, stop = (int(i) for i in arrays["atoms_offsets"][idx : idx + 2])
+
+        sample = {
+            "system": System(
+                types=self._tensor(arrays["types"][start:stop], dtype=torch.int32),
+                positions=self._tensor(arrays["positions"][start:stop]),
+                cell=self._tensor(arrays["cells"][idx]),
+            )
+        }
+
+        for name, info in self._header["targets"].items():
+            properties = Labels(
+                self._header["properties"][name]["names"],
+                torch.tensor(self._header["properties"][name]["values"]).reshape(
+                    -1, len(self._header["properties"][name]["names"])
+                ),
+            )
+
+            if info["per_atom"]:
+                samples = Labels(
+                    ["system", "atom"],
+                    torch.stack(
+                        [
+                            torch.full((stop - start,), idx, dtype=torch.int64),
+                            torch.arange(stop - start),
+                        ],
+                        dim=1,
+                    ),
+                )
+                values = arrays[f"{name}/values"][start:stop]
+            else:
+                samples = Labels(["system"], torch.tensor([[idx]]))
+                values = arrays[f"{name}/values"][idx : idx + 1]
+
+            block = TensorBlock(
+                values=self._tensor(values),
+                samples=samples,
+                components=[],
+                properties=properties,
+            )
+
+            if "positions" in info["gradients"]:
+                values = arrays[f"{name}/positions"][start:stop]
+                gradient_samples = torch.stack(
+                    [
+                        torch.zeros(stop - start, dtype=torch.int64),
+                        torch.full((stop - start,), idx, dtype=torch.int64),
+                        torch.arange(stop - start),
+                    ],
+                    dim=1,
+                )
+                block.add_gradient(
+                    parameter="positions",
+                    gradient=TensorBlock(
+                        values=self._tensor(values),
+                        samples=Labels(["sample", "system", "atom"], gradient_samples),
+                        components=[Labels.range("xyz", 3)],
+                        properties=properties,
+                    ),
+                )
+
+            if "strain" in info["gradients"]:
+                values = arrays[f"{name}/strain"][idx : idx + 1]
+                block.add_gradient(
+                    parameter="strain",
+                    gradient=TensorBlock(
+                        values=self._tensor(values),
+                        samples=Labels(["sample"], torch.tensor([[0]])),
+                        components=[
+                            Labels.range("xyz_1", 3),
+                            Labels.range("xyz_2", 3),
+                        ],
+                        properties=properties,
+                    ),
+                )
+
+            sample[name] = TensorMap(
+                keys=Labels(["_"], torch.tensor([[0]])), blocks=[block]
+            )
+
+        return sample
+
+    def _tensor(
+        self, array: np.ndarray, dtype: Optional[torch.dtype] = None
+    ) -> torch.Tensor:
+        # copy the data out of the (read-only) memory map
+        return torch.tensor(
+            np.asarray(array), dtype=self.dtype if dtype is None else dtype
+        )
+
+
+def _check_target_blocks(
+    name: str, blocks: List[TensorBlock], info: TargetInfo, n_atoms: np.ndarray
+) -> None:
+    # every system is stored with the same properties, and no components
+    for i_system, block in enumerate(blocks):
+        if len(block.components) != 0:
+            raise ValueError(
+                f"Target {name!r} has components. Only targets without components can "
+                "be written."
+            )
+
+        if block.properties != blocks[0].properties:
+            raise ValueError(
+                f"Target {name!r} has different properties for different systems. "
+                "Only targets with the same properties for all systems can be written."
+            )
+
+        expected_samples = n_atoms[i_system] if info.per_atom else 1
+        if len(block.samples) != expected_samples:
+            raise ValueError(
+                f"Target {name!r} of system {i_system} has {len(block.samples)} "
+                f"samples, but {expected_samples} were expected for a "
+                f"{'per-atom' if info.per_atom else 'per-structure'} target."
+            )
+
+    if info.per_atom and len(info.gradients) > 0:
+        raise ValueError(
+            f"Target {name!r} is a per-atom target with gradients. Only gradients of "
+            "per-structure targets can be written."
+        )
+
+
+def _concatenate(
+    tensors: List[torch.Tensor], empty_shape: Tuple[int, ...]
+) -> np.ndarray:
+    if len(tensors) == 0:
+        return np.empty(empty_shape, dtype=np.float64)
+    return torch.cat([t.detach().cpu() for t in tensors]).numpy()
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
@@ -0,0 +1,40 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import ase
+import ase.io
+
+
+def read_frames_ase(filename: Union[str, Path]) -> List[ase.Atoms]:
+    """Read all frames of a file using ase, parsing each file only once.
+
+    Systems and every target (energy, forces, stress, virial) of a dataset are usually
+    stored in the same file. To avoid parsing it once per quantity the parsed frames are
+    cached. The cache is keyed by the absolute path, the modification time and the size
+    of the file, so that changes to the file on disk invalidate the cache.
+
+    The returned frames are shared between all callers and **must not** be modified.
+
+    :param filename: name of the file to read
+    :returns: list of all frames inside the file
+    """
+    path = Path(filename).resolve()
+    stat = path.stat()
+    return list(_read_frames_ase(str(path), stat.st_mtime_ns, stat.st_size))
+
+
+def clear_cache() -> None:
+    """Release all frames kept by :py:func:`read_frames_ase`.
+
+    Call this once all systems and targets are read to free the memory used by the
+    parsed frames.
+    """
+    _read_frames_ase.cache_clear()
+
+
+# only keep the last file: readers for systems and targets of a dataset are called
+# right after each other and we don't want to keep many large datasets alive.
+@lru_cache(maxsize=1)
+def _read_frames_ase(path: str, mtime: int, size: int) -> Tuple[ase.Atoms, ...]:
+    return tuple(ase.io.read(path, ":"))
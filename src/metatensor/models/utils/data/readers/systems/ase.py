@@ -1,9 +1,10 @@
 from typing import List
 
-import ase.io
 import torch
 from metatensor.torch.atomistic import System, systems_to_torch
 
+from ..cache import read_frames_ase
+
 
 def read_systems_ase(filename: str, dtype: torch.dtype = torch.float32) -> List[System]:
     """Store system informations using ase.
@@ -14,6 +15,6 @@ def read_systems_ase(filename: str, dtype: torch.dtype = torch.float32) -> List[
     :returns:
         A list of systems
     """
-    systems = [atoms for atoms in ase.io.read(filename, ":")]
+    systems = read_frames_ase(filename)
 
     return [s.to(dtype=dtype) for s in systems_to_torch(systems)]
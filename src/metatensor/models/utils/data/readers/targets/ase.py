@@ -1,10 +1,12 @@
 import warnings
 from typing import List
 
-import ase.io
+import numpy as np
 import torch
 from metatensor.torch import Labels, TensorBlock
 
+from ..cache import read_frames_ase
+
 
 def read_energy_ase(
     filename: str,
@@ -20,18 +22,20 @@ def read_energy_ase(
     :returns:
         TensorMap containing the given information
     """
-    frames = ase.io.read(filename, ":")
+    frames = read_frames_ase(filename)
 
     properties = Labels("energy", torch.tensor([[0]]))
 
-    blocks = []
-    for i_system, atoms in enumerate(frames):
-        values = torch.tensor([[atoms.info[key]]], dtype=dtype)
-        samples = Labels(["system"], torch.tensor([[i_system]]))
+    # Build the values and samples of all systems at once and only slice per system
+    # views for the blocks.
+    values = torch.tensor([atoms.info[key] for atoms in frames], dtype=dtype)
+    samples_values = torch.arange(len(frames)).reshape(-1, 1)
 
+    blocks = []
+    for i_system in range(len(frames)):
         block = TensorBlock(
-            values=values,
-            samples=samples,
+            values=values[i_system : i_system + 1].reshape(1, 1),
+            samples=Labels(["system"], samples_values[i_system : i_system + 1]),
             components=[],
             properties=properties,
         )
@@ -55,25 +59,40 @@ def read_forces_ase(
     :returns:
         TensorMap containing the given information
     """
-    frames = ase.io.read(filename, ":")
+    frames = read_frames_ase(filename)
 
     components = [Labels(["xyz"], torch.arange(3).reshape(-1, 1))]
     properties = Labels("energy", torch.tensor([[0]]))
 
-    blocks = []
-    for i_system, atoms in enumerate(frames):
-        # We store forces as positions gradients which means we invert the sign
-        values = -torch.tensor(atoms.arrays[key], dtype=dtype)
-        values = values.reshape(-1, 3, 1)
+    if len(frames) == 0:
+        return []
 
-        samples = Labels(
-            ["sample", "system", "atom"],
-            torch.tensor([[0, i_system, a] for a in range(len(values))]),
-        )
+    # Stack the forces of all systems into one contiguous tensor and build the samples
+    # of all systems at once. Only per system views are sliced for the blocks.
+    forces = [atoms.arrays[key] for atoms in frames]
+    n_atoms = torch.tensor([len(f) for f in forces])
+
+    # We store forces as positions gradients which means we invert the sign
+    values = -torch.tensor(np.concatenate(forces), dtype=dtype)
+    values = values.reshape(-1, 3, 1)
+
+    system_index = torch.repeat_interleave(torch.arange(len(frames)), n_atoms)
+    first_atom = torch.repeat_interleave(
+        torch.cumsum(n_atoms, dim=0) - n_atoms, n_atoms
+    )
+    atom_index = torch.arange(len(values)) - first_atom
+    samples_values = torch.stack(
+        [torch.zeros_like(system_index), system_index, atom_index], dim=1
+    )
 
+    split_sizes = n_atoms.tolist()
+    blocks = []
+    for system_values, system_samples_values in zip(
+        torch.split(values, split_sizes), torch.split(samples_values, split_sizes)
+    ):
         block = TensorBlock(
-            values=values,
-            samples=samples,
+            values=system_values,
+            samples=Labels(["sample", "system", "atom"], system_samples_values),
             components=components,
             properties=properties,
         )
@@ -140,7 +159,7 @@ def _read_virial_stress_ase(
     :returns:
         TensorMap containing the given information
     """
-    frames = ase.io.read(filename, ":")
+    frames = read_frames_ase(filename)
 
     samples = Labels(["sample"], torch.tensor([[0]]))
     components = [
@@ -149,10 +168,12 @@ def _read_virial_stress_ase(
     ]
     properties = Labels("energy", torch.tensor([[0]]))
 
-    blocks = []
-    for i_system, atoms in enumerate(frames):
+    if len(frames) == 0:
+        return []
 
-        values = torch.tensor(atoms.info[key].tolist(), dtype=dtype)
+    all_values = []
+    for i_system, atoms in enumerate(frames):
+        values = np.asarray(atoms.info[key], dtype=np.float64)
 
         if values.shape == (9,):
             warnings.warn(
@@ -167,20 +188,30 @@ def _read_virial_stress_ase(
                 "Stress/virial must be a 3 x 3 matrix or a 9-long numerical vector."
             )
 
-        values = values.reshape(-1, 3, 3, 1)
+        if not is_virial and atoms.cell.volume == 0:
+            raise ValueError(
+                f"system {i_system} has zero cell vectors. Stress can only "
+                "be used if cell is non zero."
+            )
+
+        all_values.append(values.reshape(3, 3))
 
-        if is_virial:
-            values *= -1
-        else:  # is stress
-            if atoms.cell.volume == 0:
-                raise ValueError(
-                    f"system {i_system} has zero cell vectors. Stress can only "
-                    "be used if cell is non zero."
-                )
-            values *= atoms.cell.volume
+    # Convert the values of all systems at once and only slice per system views for
+    # the blocks.
+    strain_values = torch.tensor(np.stack(all_values), dtype=dtype).reshape(
+        -1, 1, 3, 3, 1
+    )
 
+    if is_virial:
+        strain_values *= -1
+    else:  # is stress
+        volumes = torch.tensor([atoms.cell.volume for atoms in frames], dtype=dtype)
+        strain_values *= volumes.reshape(-1, 1, 1, 1, 1)
+
+    blocks = []
+    for system_values in strain_values:
         block = TensorBlock(
-            values=values,
+            values=system_values,
             samples=samples,
             components=components,
             properties=properties,
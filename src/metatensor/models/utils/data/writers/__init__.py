@@ -1,15 +1,22 @@
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Union
 
 from pathlib import Path
 from metatensor.torch import TensorMap
 from metatensor.torch.atomistic import System, ModelCapabilities
 
-from .xyz import write_xyz
+from .npz import NPZWriter, write_npz
+from .xyz import XYZWriter, write_xyz
 
 
-PREDICTIONS_WRITERS = {".xyz": write_xyz}
+PREDICTIONS_WRITERS = {".xyz": write_xyz, ".npz": write_npz}
 """:py:class:`dict`: dictionary mapping file suffixes to a prediction writers"""
 
+STREAMING_PREDICTIONS_WRITERS: Dict[
+    str, Callable[[str, ModelCapabilities], Union[XYZWriter, NPZWriter]]
+] = {".xyz": XYZWriter, ".npz": NPZWriter}
+""":py:class:`dict`: dictionary mapping file suffixes to prediction writers writing
+the predictions batch by batch"""
+
 
 def write_predictions(
     filename: str,
@@ -46,3 +53,32 @@ def write_predictions(
         raise ValueError(f"fileformat '{fileformat}' is not supported")
 
     return writer(filename, systems, capabilities, predictions)
+
+
+def get_predictions_writer(
+    filename: str,
+    capabilities: ModelCapabilities,
+    fileformat: Optional[str] = None,
+) -> Union[XYZWriter, NPZWriter]:
+    """Creates a writer, writing predictions to a file batch by batch.
+
+    The predictions of every batch are written with the ``write(systems,
+    predictions)`` method of the returned writer, and the file is closed with its
+    ``finish()`` method. The files are the same as the ones written by
+    :py:func:`write_predictions`.
+
+    :param filename: name of the file to write
+    :param capabilities: capabilities of the model
+    :param fileformat: format of the target value file. If :py:obj:`None` the format is
+        determined from the suffix.
+    :returns: the writer
+    """
+    if fileformat is None:
+        fileformat = Path(filename).suffix
+
+    try:
+        writer = STREAMING_PREDICTIONS_WRITERS[fileformat]
+    except KeyError:
+        raise ValueError(f"fileformat '{fileformat}' is not supported")
+
+    return writer(filename, capabilities)
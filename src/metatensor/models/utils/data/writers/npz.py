@@ -0,0 +1,254 @@
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from metatensor.torch import Labels, TensorMap
+from metatensor.torch.atomistic import ModelCapabilities, System
+
+from ...external_naming import to_external_name
+
+
+# size in bytes of the header of the ``.npy`` files written by :py:class:`NPZWriter`.
+# The header is padded to this size, such that it can be rewritten in place when the
+# number of rows of the array grows.
+_NPY_HEADER_SIZE = 128
+
+
+def write_npz(
+    filename: str,
+    systems: List[System],
+    capabilities: ModelCapabilities,
+    predictions: Dict[str, TensorMap],
+) -> None:
+    """A numpy-based writer. Writes the systems and predictions as flat arrays to a
+    ``.npz`` file.
+
+    The systems are stored in the ``positions``, ``types`` and ``cells`` arrays. The
+    atoms of system ``i`` are the entries ``atoms_offsets[i]:atoms_offsets[i + 1]`` of
+    ``positions``, ``types`` and of all per-atom arrays. Per-system predictions (like
+    energies) are stored with one entry per system, per-atom predictions (like forces)
+    with one entry per atom.
+
+    Gradients are named and converted in the same way as in
+    :py:func:`metatensor.models.utils.data.writers.write_xyz`, i.e. position gradients
+    of energies are saved as forces and strain gradients as virials and stresses.
+
+    The arrays can be read with :py:func:`numpy.load`.
+
+    :param filename: name of the file to write.
+    :param systems: structures to be written to the file.
+    :param: capabilities: capabilities of the model.
+    :param predictions: prediction values to be written to the file.
+    """
+    writer = NPZWriter(filename, capabilities)
+    writer.write(systems, predictions)
+    writer.finish()
+
+
+class NPZWriter:
+    """A numpy-based writer, writing the predictions batch by batch.
+
+    The file is written in the same format as by :py:func:`write_npz`. Every array is
+    written to its own ``.npy`` file in a temporary directory next to ``filename``, and
+    the predictions of every batch are appended to these files when :py:meth:`write` is
+    called. Only the predictions of a single batch are kept in memory. The ``.npy``
+    files can be read with :py:func:`numpy.load` while the predictions are written, and
+    are packed into ``filename`` by :py:meth:`finish`.
+
+    :param filename: name of the file to write.
+    :param capabilities: capabilities of the model.
+    """
+
+    def __init__(self, filename: str, capabilities: ModelCapabilities):
+        self.filename = filename
+        self.capabilities = capabilities
+        self.directory = tempfile.mkdtemp(
+            prefix=f".{Path(filename).name}.", dir=Path(filename).parent
+        )
+        self.n_atoms = 0
+        self.files: Dict[str, BinaryIO] = {}
+        # dtype and shape of each array written so far
+        self.shapes: Dict[str, Tuple[np.dtype, Tuple[int, ...]]] = {}
+
+        self._append("atoms_offsets", np.zeros(1, dtype=np.int64))
+
+    def write(self, systems: List[System], predictions: Dict[str, TensorMap]):
+        """Append the systems and their predictions to the file.
+
+        :param systems: structures to be written to the file.
+        :param predictions: prediction values of the ``systems``, with system labels
+            corresponding to the index of the system in ``systems``.
+        """
+        systems = [system.to(device="cpu") for system in systems]
+        n_atoms = [len(system) for system in systems]
+        # offset of the first atom of each system in this batch
+        batch_offsets = np.concatenate([[0], np.cumsum(n_atoms)]).astype(np.int64)
+
+        self._append("atoms_offsets", self.n_atoms + batch_offsets[1:])
+        self.n_atoms += int(batch_offsets[-1])
+        self._append(
+            "positions", torch.cat([system.positions for system in systems], dim=0)
+        )
+        self._append("types", torch.cat([system.types for system in systems]))
+        self._append("cells", torch.stack([system.cell for system in systems]))
+
+        for target_name, target_map in predictions.items():
+            if len(target_map.keys.names) != 1:
+                raise ValueError(
+                    "Only single-block `TensorMap`s can be "
+                    "written to npz files for the moment."
+                )
+            block = target_map.block().to(device="cpu")
+            systems_index = block.samples.column("system").numpy()
+
+            self._append(
+                target_name,
+                _to_rows(
+                    _squeeze_properties(block.values),
+                    systems_index,
+                    _atoms_index(block.samples),
+                    batch_offsets,
+                ),
+            )
+
+            for gradient_name, gradient_block in block.gradients():
+                internal_name = f"{target_name}_{gradient_name}_gradients"
+                external_name = to_external_name(
+                    internal_name, self.capabilities.outputs
+                )
+
+                # the "sample" dimension refers to the rows of the values
+                gradient_systems_index = systems_index[
+                    gradient_block.samples.column("sample").numpy()
+                ]
+                gradients = _to_rows(
+                    _squeeze_properties(gradient_block.values),
+                    gradient_systems_index,
+                    _atoms_index(gradient_block.samples),
+                    batch_offsets,
+                )
+
+                if "forces" in external_name:
+                    self._append(external_name, -gradients)
+                elif "virial" in external_name:
+                    # in this case, we write both the virial and the stress
+                    external_name_virial = external_name
+                    external_name_stress = external_name.replace("virial", "stress")
+                    cells = np.stack([system.cell.numpy() for system in systems])
+                    if np.any(np.all(cells == 0, axis=(1, 2))):
+                        raise ValueError(
+                            "stresses cannot be written for non-periodic systems."
+                        )
+                    cell_volumes = np.linalg.det(cells)
+                    if np.any(cell_volumes == 0):
+                        raise ValueError(
+                            "stresses cannot be written for "
+                            "systems with zero volume."
+                        )
+                    self._append(external_name_virial, -gradients)
+                    self._append(
+                        external_name_stress,
+                        gradients / cell_volumes.reshape(-1, 1, 1),
+                    )
+                else:
+                    self._append(external_name, gradients)
+
+    def finish(self):
+        """Pack the arrays written so far into the ``.npz`` file."""
+        for file in self.files.values():
+            file.close()
+
+        # the arrays are copied chunk by chunk, without loading them in memory
+        with zipfile.ZipFile(self.filename, "w", allowZip64=True) as archive:
+            for name in self.files.keys():
+                path = os.path.join(self.directory, f"{name}.npy")
+                with (
+                    open(path, "rb") as source,
+                    archive.open(f"{name}.npy", "w", force_zip64=True) as destination,
+                ):
+                    shutil.copyfileobj(source, destination)
+
+        shutil.rmtree(self.directory)
+
+    def _append(self, name: str, array):
+        if isinstance(array, torch.Tensor):
+            array = array.detach().cpu().numpy()
+
+        if name not in self.files:
+            path = os.path.join(self.directory, f"{name}.npy")
+            self.files[name] = open(path, "w+b")
+            self.shapes[name] = (array.dtype, (0,) + array.shape[1:])
+
+        dtype, shape = self.shapes[name]
+        if array.shape[1:] != shape[1:]:
+            raise ValueError(
+                f"Predictions of {name!r} have a shape {array.shape[1:]} per entry, "
+                f"but previous predictions had a shape {shape[1:]}."
+            )
+        shape = (shape[0] + array.shape[0],) + shape[1:]
+        self.shapes[name] = (dtype, shape)
+
+        # write the data at the end of the file, and update the header for the new
+        # number of rows
+        file = self.files[name]
+        file.seek(0, os.SEEK_END)
+        file.seek(max(file.tell(), _NPY_HEADER_SIZE))
+        file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+        file.seek(0)
+        file.write(_npy_header(dtype, shape))
+        file.flush()
+
+
+def _npy_header(dtype: np.dtype, shape: Tuple[int, ...]) -> bytes:
+    # header of a version 1.0 ``.npy`` file, padded to `_NPY_HEADER_SIZE` bytes. See
+    # https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": shape,
+        }
+    )
+    # 6 bytes of magic string, 2 bytes of version and 2 bytes of header length
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode()
+
+
+def _squeeze_properties(values: torch.Tensor) -> np.ndarray:
+    array = values.detach().numpy()
+    if array.shape[-1] == 1:
+        array = array.reshape(array.shape[:-1])
+    return array
+
+
+def _atoms_index(samples: Labels) -> Optional[np.ndarray]:
+    if "atom" in samples.names:
+        return samples.column("atom").numpy()
+    else:
+        return None
+
+
+def _to_rows(
+    values: np.ndarray,
+    systems_index: np.ndarray,
+    atoms_index: Optional[np.ndarray],
+    batch_offsets: np.ndarray,
+) -> np.ndarray:
+    # Orders the values of a batch by system (for per-system quantities) or by atom (for
+    # per-atom quantities), following the order of the systems in the batch.
+    if atoms_index is None:
+        rows = systems_index
+        n_rows = len(batch_offsets) - 1
+    else:
+        rows = batch_offsets[systems_index] + atoms_index
+        n_rows = batch_offsets[-1]
+
+    array = np.zeros((n_rows,) + values.shape[1:], dtype=values.dtype)
+    array[rows] = values
+    return array
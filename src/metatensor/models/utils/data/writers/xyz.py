@@ -27,7 +27,50 @@ def write_xyz(
     :param: capabilities: capabilities of the model.
     :param predictions: prediction values to be written to the file.
     """
+    ase.io.write(filename, _to_frames(systems, capabilities, predictions))
 
+
+class XYZWriter:
+    """An ase-based xyz file writer, writing the predictions batch by batch.
+
+    The file is written in the same format as by :py:func:`write_xyz`. Frames are
+    appended to the file each time :py:meth:`write` is called, such that the
+    predictions of all systems never need to be kept in memory, and the file can be
+    read while it is being written.
+
+    :param filename: name of the file to write.
+    :param capabilities: capabilities of the model.
+    """
+
+    def __init__(self, filename: str, capabilities: ModelCapabilities):
+        self.capabilities = capabilities
+        self.file = open(filename, "w")
+
+    def write(self, systems: List[System], predictions: Dict[str, TensorMap]):
+        """Append the systems and their predictions to the file.
+
+        :param systems: structures to be written to the file.
+        :param predictions: prediction values of the ``systems``, with system labels
+            corresponding to the index of the system in ``systems``.
+        """
+        systems = [system.to(device="cpu") for system in systems]
+        predictions = {
+            key: value.to(device="cpu") for key, value in predictions.items()
+        }
+        frames = _to_frames(systems, self.capabilities, predictions)
+        ase.io.write(self.file, frames, format="extxyz")
+        self.file.flush()
+
+    def finish(self):
+        """Close the file."""
+        self.file.close()
+
+
+def _to_frames(
+    systems: List[System],
+    capabilities: ModelCapabilities,
+    predictions: Dict[str, TensorMap],
+) -> List[ase.Atoms]:
     # we first split the predictions by structure
     predictions_by_structure: List[Dict[str, TensorMap]] = [{} for _ in systems]
     split_labels = [
@@ -110,7 +153,9 @@ def write_xyz(
                     )
 
         atoms = ase.Atoms(
-            symbols=system.types, positions=system.positions.detach(), info=info
+            symbols=system.types.cpu(),
+            positions=system.positions.detach().cpu(),
+            info=info,
         )
 
         # assign cell and pbcs
@@ -124,4 +169,4 @@ def write_xyz(
 
         frames.append(atoms)
 
-    ase.io.write(filename, frames)
+    return frames
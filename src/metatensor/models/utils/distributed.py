@@ -0,0 +1,431 @@
+import copyreg
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple, Union, cast
+
+import torch
+import torch.distributed
+import torch.multiprocessing
+from metatensor.torch import Labels, TensorBlock, TensorMap
+from metatensor.torch.atomistic import NeighborListOptions, System
+
+from .data import CombinedDataLoader, Dataset
+
+
+logger = logging.getLogger(__name__)
+
+# time in seconds to wait for the other processes to exit once the training is done
+_JOIN_TIMEOUT = 60
+
+
+def is_distributed() -> bool:
+    """Whether the current process is part of a distributed training.
+
+    :returns: :py:obj:`True` if a :py:mod:`torch.distributed` process group is
+        initialized
+    """
+    return torch.distributed.is_available() and torch.distributed.is_initialized()
+
+
+def get_rank() -> int:
+    """Rank of the current process in the distributed training.
+
+    :returns: the rank, or ``0`` if the training is not distributed
+    """
+    if is_distributed():
+        return torch.distributed.get_rank()
+    else:
+        return 0
+
+
+def get_world_size() -> int:
+    """Number of processes of the distributed training.
+
+    :returns: the number of processes, or ``1`` if the training is not distributed
+    """
+    if is_distributed():
+        return torch.distributed.get_world_size()
+    else:
+        return 1
+
+
+def run_distributed(
+    function: Callable[[], None],
+    num_processes: int,
+    worker_function: Optional[Callable[[], None]] = None,
+) -> None:
+    """Run ``function`` in ``num_processes`` CPU processes training together.
+
+    The current process becomes the process with rank ``0`` and calls ``function``.
+    The other processes are started from scratch (with the ``forkserver`` method if
+    available, and ``spawn`` otherwise) and call ``worker_function``. Forking the
+    current process is avoided, since the state of its thread pools is not safe to
+    copy. All processes join a :py:mod:`torch.distributed` process group using the
+    ``gloo`` backend before calling their function, and the threads of the machine are
+    split between them.
+
+    ``worker_function`` is pickled and sent to the other processes, which get their own
+    copy of everything it refers to (like the trainer and the datasets). Systems and
+    :py:class:`metatensor.torch.TensorMap` are converted to tensors for this. Models
+    can not always be pickled, so ``worker_function`` should create its own model, and
+    the processes should start from the same parameters with
+    :py:func:`broadcast_parameters`.
+
+    Only the changes made by the process with rank ``0`` (like the training of the
+    model) are visible after this function returns. Log messages of the other processes
+    are only shown for warnings and errors. If one of the other processes fails, the
+    remaining ones are stopped, such that the current process does not wait for them
+    forever.
+
+    :param function: function to run in the current process, typically calling the
+        ``train`` method of a trainer
+    :param num_processes: total number of processes, including the current one
+    :param worker_function: function to run in the other processes. It must be
+        picklable, and defaults to ``function``.
+    """
+    if num_processes < 1:
+        raise ValueError("`num_processes` must be positive.")
+    if num_processes == 1:
+        function()
+        return
+    if worker_function is None:
+        worker_function = function
+
+    init_method = f"tcp://127.0.0.1:{_free_port()}"
+    num_threads = torch.get_num_threads()
+    threads_per_process = max(1, num_threads // num_processes)
+
+    # the function is sent as bytes, since sharing the memory of every tensor of the
+    # datasets would need more file descriptors than can be sent to the processes
+    pickled_function = _dumps(worker_function)
+
+    # the other processes are started from a clean process instead of forking the
+    # current one, which might have running threads
+    if "forkserver" in torch.multiprocessing.get_all_start_methods():
+        start_method = "forkserver"
+    else:
+        start_method = "spawn"
+    context = torch.multiprocessing.get_context(start_method)
+    processes = [
+        context.Process(  # type: ignore
+            target=_worker,
+            args=(
+                pickled_function,
+                init_method,
+                rank,
+                num_processes,
+                threads_per_process,
+            ),
+        )
+        for rank in range(1, num_processes)
+    ]
+    for process in processes:
+        process.start()
+
+    finished = threading.Event()
+    monitor = threading.Thread(
+        target=_monitor_workers, args=(processes, finished), daemon=True
+    )
+    monitor.start()
+
+    logger.info(
+        f"Training with {num_processes} processes and {threads_per_process} threads "
+        "per process"
+    )
+    torch.set_num_threads(threads_per_process)
+    try:
+        torch.distributed.init_process_group(
+            "gloo", init_method=init_method, rank=0, world_size=num_processes
+        )
+        function()
+        # wait for all processes to finish before leaving the process group
+        torch.distributed.barrier()
+    except Exception:
+        finished.set()
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        finished.set()
+        monitor.join()
+        if is_distributed():
+            torch.distributed.destroy_process_group()
+        torch.set_num_threads(num_threads)
+
+    for process in processes:
+        process.join(timeout=_JOIN_TIMEOUT)
+        if process.is_alive():
+            logger.warning(
+                f"Distributed training process {process.pid} did not exit, stopping it"
+            )
+            process.terminate()
+            process.join()
+    failed = [process.exitcode for process in processes if process.exitcode != 0]
+    if len(failed) > 0:
+        raise RuntimeError(f"{len(failed)} distributed training processes failed.")
+
+
+def _monitor_workers(
+    processes: List[multiprocessing.process.BaseProcess], finished: threading.Event
+) -> None:
+    # Once a process failed, the collective operations of the others can wait forever.
+    # All processes are stopped, which makes the collective operations of the current
+    # process fail instead.
+    while not finished.wait(timeout=1.0):
+        if any(process.exitcode not in (None, 0) for process in processes):
+            logger.error("A distributed training process failed, stopping the others")
+            for process in processes:
+                process.terminate()
+            return
+
+
+def _worker(
+    pickled_function: bytes,
+    init_method: str,
+    rank: int,
+    world_size: int,
+    num_threads: int,
+) -> None:
+    # only the first process reports the progress of the training
+    logging.disable(logging.INFO)
+    torch.set_num_threads(num_threads)
+    try:
+        function = pickle.loads(pickled_function)
+        torch.distributed.init_process_group(
+            "gloo", init_method=init_method, rank=rank, world_size=world_size
+        )
+        function()
+        torch.distributed.barrier()
+    except Exception:
+        logger.exception(f"Distributed training process {rank} failed")
+        os._exit(1)
+    # the process group is not destroyed, since this can hang once the other processes
+    # left it. The process exits right away instead.
+    os._exit(0)
+
+
+def _dumps(obj) -> bytes:
+    # metatensor objects can not all be pickled, they are converted to tensors instead
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.DEFAULT_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[torch.ScriptObject] = _reduce_script_object
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+
+def _reduce_script_object(obj):
+    name = obj._type().qualified_name()
+    if name.endswith(".System"):
+        neighbor_lists = [
+            (options, obj.get_neighbor_list(options))
+            for options in obj.known_neighbor_lists()
+        ]
+        data = [(key, obj.get_data(key)) for key in obj.known_data()]
+        return _rebuild_system, (
+            obj.types,
+            obj.positions,
+            obj.cell,
+            neighbor_lists,
+            data,
+        )
+    elif name.endswith(".NeighborListOptions"):
+        return _rebuild_neighbor_list_options, (obj.cutoff, obj.full_list)
+    elif name.endswith(".TensorMap"):
+        return _rebuild_tensor_map, (obj.keys, obj.blocks())
+    elif name.endswith(".TensorBlock"):
+        gradients = [
+            (parameter, obj.gradient(parameter)) for parameter in obj.gradients_list()
+        ]
+        return _rebuild_tensor_block, (
+            obj.values,
+            obj.samples,
+            obj.components,
+            obj.properties,
+            gradients,
+        )
+    else:
+        return obj.__reduce_ex__(pickle.DEFAULT_PROTOCOL)
+
+
+def _rebuild_system(
+    types: torch.Tensor,
+    positions: torch.Tensor,
+    cell: torch.Tensor,
+    neighbor_lists: List[Tuple[NeighborListOptions, TensorBlock]],
+    data: List[Tuple[str, TensorMap]],
+) -> System:
+    system = System(types=types, positions=positions, cell=cell)
+    for options, neighbor_list in neighbor_lists:
+        system.add_neighbor_list(options, neighbor_list)
+    for name, tensor_map in data:
+        system.add_data(name, tensor_map)
+    return system
+
+
+def _rebuild_neighbor_list_options(cutoff: float, full_list: bool):
+    return NeighborListOptions(cutoff=cutoff, full_list=full_list)
+
+
+def _rebuild_tensor_map(keys: Labels, blocks: List[TensorBlock]) -> TensorMap:
+    return TensorMap(keys=keys, blocks=blocks)
+
+
+def _rebuild_tensor_block(
+    values: torch.Tensor,
+    samples: Labels,
+    components: List[Labels],
+    properties: Labels,
+    gradients: List[Tuple[str, TensorBlock]],
+) -> TensorBlock:
+    block = TensorBlock(
+        values=values, samples=samples, components=components, properties=properties
+    )
+    for parameter, gradient in gradients:
+        block.add_gradient(parameter=parameter, gradient=gradient)
+    return block
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def shard_dataset(
+    dataset: Union[Dataset, torch.utils.data.Subset], pad: bool = True
+) -> torch.utils.data.Subset:
+    """Select the part of ``dataset`` used by the current process.
+
+    Every ``world_size``-th sample, starting from the rank of the current process, is
+    selected, such that the shards of all processes cover the dataset exactly once. If
+    ``pad`` is :py:obj:`True`, the first samples of the dataset are added again at its
+    end such that all shards have the same size, as done by
+    :py:class:`torch.utils.data.distributed.DistributedSampler`.
+
+    :param dataset: dataset to shard
+    :param pad: whether to pad the shards to the same size
+    :returns: the shard of the current process
+    :raises ValueError: if the dataset has fewer samples than there are processes
+    """
+    world_size = get_world_size()
+    if len(dataset) < world_size:
+        raise ValueError(
+            f"A dataset with {len(dataset)} samples can not be split between "
+            f"{world_size} processes."
+        )
+
+    indices = list(range(len(dataset)))
+    if pad:
+        indices += indices[: -len(indices) % world_size]
+    # the datasets of this package behave like torch datasets, without inheriting
+    # from them
+    base_dataset = cast(torch.utils.data.Dataset, dataset)
+    return torch.utils.data.Subset(base_dataset, indices[get_rank() :: world_size])
+
+
+def iterate_in_lockstep(
+    dataloader: Union[CombinedDataLoader, torch.utils.data.DataLoader]
+) -> Iterator:
+    """Iterate over the same number of batches in all processes.
+
+    The gradients are averaged over all processes after every training step, so all of
+    them need to do the same number of steps. Every process iterates over the largest
+    number of batches of ``dataloader`` among all processes. Processes with fewer
+    batches start again from the beginning of ``dataloader`` once they ran out of
+    batches, such that no batch is dropped. If the training is not distributed, this
+    iterates over ``dataloader`` as usual.
+
+    :param dataloader: dataloader of the current process
+    :returns: an iterator over the batches
+    """
+    if not is_distributed():
+        return iter(dataloader)
+
+    n_batches = torch.tensor(len(dataloader))
+    torch.distributed.all_reduce(n_batches, op=torch.distributed.ReduceOp.MAX)
+    return _iterate_batches(dataloader, int(n_batches.item()))
+
+
+def _iterate_batches(
+    dataloader: Union[CombinedDataLoader, torch.utils.data.DataLoader], n_batches: int
+) -> Iterator:
+    iterator = iter(dataloader)
+    for _ in range(n_batches):
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            iterator = iter(dataloader)
+            batch = next(iterator)
+        yield batch
+
+    if isinstance(dataloader, CombinedDataLoader):
+        # the epoch might not be finished, start the next one from scratch
+        dataloader.reset()
+
+
+def broadcast_parameters(model: torch.nn.Module) -> None:
+    """Copy the parameters and buffers of ``model`` from the process with rank ``0`` to
+    all other processes.
+
+    All processes must have a model with the same architecture. This does nothing if the
+    training is not distributed.
+
+    :param model: model whose parameters and buffers are broadcasted
+    """
+    if not is_distributed():
+        return
+
+    for tensor in model.state_dict().values():
+        torch.distributed.broadcast(tensor, src=0)
+
+
+def average_gradients(model: torch.nn.Module) -> None:
+    """Average the gradients of the parameters of ``model`` over all processes.
+
+    Parameters without gradients are treated as if their gradient was zero, since they
+    might have a gradient in other processes.
+
+    :param model: model whose gradients are averaged
+    """
+    if not is_distributed():
+        return
+
+    gradients: List[torch.Tensor] = []
+    for parameter in model.parameters():
+        if not parameter.requires_grad:
+            continue
+        if parameter.grad is None:
+            parameter.grad = torch.zeros_like(parameter)
+        gradients.append(parameter.grad)
+
+    # a single communication for all gradients
+    all_gradients = torch.cat([gradient.reshape(-1) for gradient in gradients])
+    torch.distributed.all_reduce(all_gradients)
+    all_gradients /= get_world_size()
+
+    offset = 0
+    for gradient in gradients:
+        size = gradient.numel()
+        gradient.copy_(all_gradients[offset : offset + size].view_as(gradient))
+        offset += size
+
+
+def sum_over_processes(value: float) -> float:
+    """Sum a number over all processes.
+
+    :param value: value of the current process
+    :returns: the sum of the values of all processes, or ``value`` if the training is
+        not distributed
+    """
+    if not is_distributed():
+        return value
+
+    tensor = torch.tensor(value, dtype=torch.float64)
+    torch.distributed.all_reduce(tensor)
+    return tensor.item()
@@ -1,5 +1,6 @@
 import warnings
-from typing import Dict, List, Union
+from functools import lru_cache
+from typing import Dict, List, Tuple, Union
 
 import torch
 from metatensor.torch import Labels, TensorBlock, TensorMap
@@ -13,7 +14,7 @@ from metatensor.torch.atomistic import (
 
 from .data import TargetInfoDict
 from .export import is_exported
-from .output_gradient import compute_gradient
+from .output_gradient import compute_gradients
 
 
 # Ignore metatensor-torch warning due to the fact that positions/cell
@@ -67,71 +68,30 @@ def evaluate_model(
             if "strain" in targets[target_name].gradients:
                 energy_targets_that_require_strain_gradients.append(target_name)
 
+    # Neighbor lists of the training data are trusted, and checking their consistency
+    # at every training step is expensive:
+    check_consistency = not is_training
+
     if len(energy_targets_that_require_strain_gradients) > 0:
         if not all([not torch.all(system.cell == 0) for system in systems]):
             raise ValueError(
                 "One or more systems does not have a cell, "
                 "but strain gradients were requested."
             )
-        strains = [
-            torch.eye(
-                3,
-                requires_grad=True,
-                dtype=system.cell.dtype,
-                device=system.cell.device,
-            )
-            for system in systems
-        ]
         # Create new "displaced" systems:
-        new_systems = []
-        for system, strain in zip(systems, strains):
-            new_system = System(
-                positions=system.positions @ strain,
-                cell=system.cell @ strain,
-                types=system.types,
-            )
-            for nl_options in system.known_neighbor_lists():
-                nl = system.get_neighbor_list(nl_options)
-                register_autograd_neighbors(
-                    new_system,
-                    TensorBlock(
-                        values=nl.values.detach(),
-                        samples=nl.samples,
-                        components=nl.components,
-                        properties=nl.properties,
-                    ),
-                    check_consistency=True,
-                )
-                new_system.add_neighbor_list(nl_options, nl)
-            new_systems.append(new_system)
-        systems = new_systems
+        systems, strains = _strain_systems(systems, check_consistency)
     else:
         if len(energy_targets_that_require_position_gradients) > 0:
             if not is_exported(model):
-                new_systems = []
-                for system in systems:
-                    new_system = System(
-                        positions=system.positions.detach()
-                        .clone()
-                        .requires_grad_(True),
-                        cell=system.cell,
-                        types=system.types,
+                systems = [
+                    _new_system(
+                        system,
+                        system.positions.detach().clone().requires_grad_(True),
+                        system.cell,
+                        check_consistency,
                     )
-                    for nl_options in system.known_neighbor_lists():
-                        nl = system.get_neighbor_list(nl_options)
-                        register_autograd_neighbors(
-                            new_system,
-                            TensorBlock(
-                                values=nl.values.detach(),
-                                samples=nl.samples,
-                                components=nl.components,
-                                properties=nl.properties,
-                            ),
-                            check_consistency=True,
-                        )
-                        new_system.add_neighbor_list(nl_options, nl)
-                    new_systems.append(new_system)
-                systems = new_systems
+                    for system in systems
+                ]
             else:
                 for system in systems:
                     system.positions.requires_grad_(True)
@@ -140,70 +100,52 @@ def evaluate_model(
                         register_autograd_neighbors(
                             system,
                             nl,
-                            check_consistency=True,
+                            check_consistency=check_consistency,
                         )
 
     # Based on the keys of the targets, get the outputs of the model:
     model_outputs = _get_model_outputs(model, systems, targets)
 
-    for energy_target in energy_targets:
-        # If the energy target requires gradients, compute them:
-        target_requires_pos_gradients = (
-            energy_target in energy_targets_that_require_position_gradients
-        )
-        target_requires_disp_gradients = (
-            energy_target in energy_targets_that_require_strain_gradients
+    # Compute the gradients of all energy targets that require them at once, with
+    # respect to the positions and, if needed by any of the targets, the strains:
+    energy_targets_that_require_gradients = [
+        energy_target
+        for energy_target in energy_targets
+        if energy_target in energy_targets_that_require_position_gradients
+        or energy_target in energy_targets_that_require_strain_gradients
+    ]
+    if len(energy_targets_that_require_gradients) > 0:
+        inputs = [system.positions for system in systems]
+        if len(energy_targets_that_require_strain_gradients) > 0:
+            inputs.append(strains)
+        all_gradients = compute_gradients(
+            [
+                model_outputs[energy_target].block().values
+                for energy_target in energy_targets_that_require_gradients
+            ],
+            inputs,
+            is_training=is_training,
         )
-        if target_requires_pos_gradients and target_requires_disp_gradients:
-            gradients = compute_gradient(
-                model_outputs[energy_target].block().values,
-                [system.positions for system in systems] + strains,
-                is_training=is_training,
-            )
-            old_energy_tensor_map = model_outputs[energy_target]
-            new_block = old_energy_tensor_map.block().copy()
-            new_block.add_gradient(
-                "positions", _position_gradients_to_block(gradients[: len(systems)])
-            )
-            new_block.add_gradient(
-                "strain",
-                _strain_gradients_to_block(gradients[len(systems) :]),
-            )
-            new_energy_tensor_map = TensorMap(
-                keys=old_energy_tensor_map.keys,
-                blocks=[new_block],
-            )
-            model_outputs[energy_target] = new_energy_tensor_map
-        elif target_requires_pos_gradients:
-            gradients = compute_gradient(
-                model_outputs[energy_target].block().values,
-                [system.positions for system in systems],
-                is_training=is_training,
-            )
-            old_energy_tensor_map = model_outputs[energy_target]
-            new_block = old_energy_tensor_map.block().copy()
-            new_block.add_gradient("positions", _position_gradients_to_block(gradients))
-            new_energy_tensor_map = TensorMap(
-                keys=old_energy_tensor_map.keys,
-                blocks=[new_block],
-            )
-            model_outputs[energy_target] = new_energy_tensor_map
-        elif target_requires_disp_gradients:
-            gradients = compute_gradient(
-                model_outputs[energy_target].block().values,
-                strains,
-                is_training=is_training,
-            )
+
+        for energy_target, gradients in zip(
+            energy_targets_that_require_gradients, all_gradients
+        ):
             old_energy_tensor_map = model_outputs[energy_target]
             new_block = old_energy_tensor_map.block().copy()
-            new_block.add_gradient("strain", _strain_gradients_to_block(gradients))
+            if energy_target in energy_targets_that_require_position_gradients:
+                new_block.add_gradient(
+                    "positions",
+                    _position_gradients_to_block(gradients[: len(systems)]),
+                )
+            if energy_target in energy_targets_that_require_strain_gradients:
+                new_block.add_gradient(
+                    "strain", _strain_gradients_to_block(gradients[len(systems)])
+                )
             new_energy_tensor_map = TensorMap(
                 keys=old_energy_tensor_map.keys,
                 blocks=[new_block],
             )
             model_outputs[energy_target] = new_energy_tensor_map
-        else:
-            pass
 
     return model_outputs
 
@@ -216,69 +158,127 @@ def _position_gradients_to_block(gradients_list):
     gradients = torch.concatenate(gradients_list, dim=0).unsqueeze(-1)
     # unsqueeze for the property dimension
 
-    samples = Labels(
-        names=["sample", "atom"],
-        values=torch.stack(
-            [
-                torch.concatenate(
-                    [
-                        torch.tensor([i] * len(system))
-                        for i, system in enumerate(gradients_list)
-                    ]
-                ),
-                torch.concatenate(
-                    [torch.arange(len(system)) for system in gradients_list]
-                ),
-            ],
-            dim=1,
+    return TensorBlock(
+        values=gradients,
+        samples=_position_gradients_samples(
+            tuple(len(system) for system in gradients_list), gradients.device
         ),
+        components=list(_xyz_components(("xyz",), gradients.device)),
+        properties=_energy_properties(gradients.device),
     )
 
-    components = [
-        Labels(
-            names=["xyz"],
-            values=torch.tensor([[0], [1], [2]]),
-        )
-    ]
+
+def _strain_gradients_to_block(strain_gradients):
+    """Convert the strain gradients of all systems (with shape ``(n_systems, 3, 3)``)
+    to a `TensorBlock` which can act as a gradient block to an energy block."""
+
+    gradients = strain_gradients.unsqueeze(-1)
+    # unsqueeze for the property dimension
 
     return TensorBlock(
         values=gradients,
-        samples=samples.to(gradients.device),
-        components=[c.to(gradients.device) for c in components],
-        properties=Labels("energy", torch.tensor([[0]])).to(gradients.device),
+        samples=_strain_gradients_samples(len(strain_gradients), gradients.device),
+        components=list(_xyz_components(("xyz_1", "xyz_2"), gradients.device)),
+        properties=_energy_properties(gradients.device),
     )
 
 
-def _strain_gradients_to_block(gradients_list):
-    """Convert a list of strain gradients to a `TensorBlock`
-    which can act as a gradient block to an energy block."""
+# The metadata of the gradient blocks only depends on the number of atoms in the
+# systems of a batch, and is cached to avoid creating the same labels at every step.
 
-    gradients = torch.stack(gradients_list, dim=0).unsqueeze(-1)
-    # unsqueeze for the property dimension
 
-    samples = Labels(
-        names=["sample"], values=torch.arange(len(gradients_list)).unsqueeze(-1)
+@lru_cache(maxsize=256)
+def _position_gradients_samples(n_atoms: Tuple[int, ...], device: torch.device):
+    n_atoms_tensor = torch.tensor(n_atoms, device=device)
+    sample = torch.repeat_interleave(
+        torch.arange(len(n_atoms), device=device), n_atoms_tensor
     )
+    first_atom = torch.cumsum(n_atoms_tensor, dim=0) - n_atoms_tensor
+    atom = torch.arange(len(sample), device=device) - first_atom[sample]
+    return Labels(names=["sample", "atom"], values=torch.stack([sample, atom], dim=1))
 
-    components = [
-        Labels(
-            names=["xyz_1"],
-            values=torch.tensor([[0], [1], [2]]),
-        ),
-        Labels(
-            names=["xyz_2"],
-            values=torch.tensor([[0], [1], [2]]),
-        ),
-    ]
 
-    return TensorBlock(
-        values=gradients,
-        samples=samples.to(gradients.device),
-        components=[c.to(gradients.device) for c in components],
-        properties=Labels("energy", torch.tensor([[0]])).to(gradients.device),
+@lru_cache(maxsize=256)
+def _strain_gradients_samples(n_systems: int, device: torch.device):
+    return Labels(
+        names=["sample"],
+        values=torch.arange(n_systems, device=device).unsqueeze(-1),
     )
 
 
+@lru_cache(maxsize=None)
+def _xyz_components(names: Tuple[str, ...], device: torch.device):
+    return tuple(
+        Labels(names=[name], values=torch.tensor([[0], [1], [2]], device=device))
+        for name in names
+    )
+
+
+@lru_cache(maxsize=None)
+def _energy_properties(device: torch.device):
+    return Labels("energy", torch.tensor([[0]], device=device))
+
+
+def _strain_systems(
+    systems: List[System], check_consistency: bool
+) -> Tuple[List[System], torch.Tensor]:
+    """Apply one identity strain per system to the positions and cells of ``systems``.
+
+    The strains of all systems are stored in a single tensor, and applied to all
+    positions and cells at once.
+
+    :returns: The strained systems, and the strains with shape ``(n_systems, 3, 3)``.
+    """
+    cells = torch.stack([system.cell for system in systems])
+    strains = (
+        torch.eye(3, dtype=cells.dtype, device=cells.device)
+        .repeat(len(systems), 1, 1)
+        .requires_grad_(True)
+    )
+    cells = cells @ strains
+
+    n_atoms = [len(system) for system in systems]
+    system_index = torch.repeat_interleave(
+        torch.arange(len(systems), device=cells.device),
+        torch.tensor(n_atoms, device=cells.device),
+    )
+    positions = torch.concatenate([system.positions for system in systems])
+    positions = (positions.unsqueeze(1) @ strains[system_index]).squeeze(1)
+
+    new_systems = [
+        _new_system(system, system_positions, cell, check_consistency)
+        for system, system_positions, cell in zip(
+            systems, torch.split(positions, n_atoms), cells
+        )
+    ]
+    return new_systems, strains
+
+
+def _new_system(
+    system: System,
+    positions: torch.Tensor,
+    cell: torch.Tensor,
+    check_consistency: bool,
+) -> System:
+    """Create a copy of ``system`` with new positions and cell, and the neighbor lists
+    of ``system`` registered for the gradients with respect to them."""
+    new_system = System(positions=positions, cell=cell, types=system.types)
+    for nl_options in system.known_neighbor_lists():
+        nl = system.get_neighbor_list(nl_options)
+        register_autograd_neighbors(
+            new_system,
+            TensorBlock(
+                values=nl.values.detach(),
+                samples=nl.samples,
+                components=nl.components,
+                properties=nl.properties,
+            ),
+            check_consistency=check_consistency,
+        )
+        new_system.add_neighbor_list(nl_options, nl)
+    return new_system
+
+
 def _get_outputs(
     model: Union[torch.nn.Module, torch.jit._script.RecursiveScriptModule]
 ):
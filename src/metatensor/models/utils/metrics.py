@@ -1,7 +1,11 @@
 from typing import Dict, List, Tuple
 
+import torch
+import torch.distributed
 from metatensor.torch import TensorMap
 
+from .distributed import get_world_size
+
 
 class RMSEAccumulator:
     """Accumulates the RMSE between predictions and targets for an arbitrary
@@ -47,16 +51,38 @@ class RMSEAccumulator:
                     + prediction_gradient.values.numel(),
                 )
 
-    def finalize(self, not_per_atom: List[str]) -> Dict[str, float]:
+    def finalize(
+        self, not_per_atom: List[str], is_distributed: bool = False
+    ) -> Dict[str, float]:
         """Finalizes the accumulator and return the RMSE for each key.
 
         All keys will be returned as "{key} RMSE (per atom)" in the output dictionary,
         unless ``key`` contains one or more of the strings in ``not_per_atom``,
         in which case "{key} RMSE" will be returned.
+
+        If ``is_distributed`` is :py:obj:`True`, the errors accumulated by all
+        processes of a distributed training are combined. All processes then need to
+        call this function, but their accumulators can contain different keys.
         """
 
+        information = self.information
+        if is_distributed:
+            # the keys of all processes, some of them might not have seen all targets
+            all_keys: List[List[str]] = [[] for _ in range(get_world_size())]
+            torch.distributed.all_gather_object(all_keys, list(information.keys()))
+            keys = sorted(set(key for process_keys in all_keys for key in process_keys))
+
+            values = torch.tensor(
+                [information.get(key, (0.0, 0)) for key in keys], dtype=torch.float64
+            ).reshape(-1, 2)
+            torch.distributed.all_reduce(values)
+            information = {
+                key: (value[0], int(value[1]))
+                for key, value in zip(keys, values.tolist())
+            }
+
         finalized_info = {}
-        for key, value in self.information.items():
+        for key, value in information.items():
             if any([s in key for s in not_per_atom]):
                 out_key = f"{key} RMSE"
             else:
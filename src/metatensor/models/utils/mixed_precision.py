@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import torch
+
+
+MIXED_PRECISION_DTYPES = {
+    "bfloat16": torch.bfloat16,
+    "float16": torch.float16,
+}
+
+
+def get_mixed_precision_dtype(
+    mixed_precision: Optional[str], device: torch.device
+) -> Optional[torch.dtype]:
+    """
+    Get the dtype used for mixed-precision training from its name.
+
+    :param mixed_precision: name of the dtype, one of the keys of
+        :py:data:`MIXED_PRECISION_DTYPES`, or :py:obj:`None` to train in full precision.
+    :param device: device used for training
+    :returns: the dtype, or :py:obj:`None` if mixed precision is not used
+    """
+    if mixed_precision is None:
+        return None
+    if mixed_precision not in MIXED_PRECISION_DTYPES:
+        raise ValueError(
+            f"Unknown mixed precision dtype {mixed_precision!r}. Possible values are "
+            f"{', '.join(MIXED_PRECISION_DTYPES)}."
+        )
+    dtype = MIXED_PRECISION_DTYPES[mixed_precision]
+    if dtype == torch.float16 and device.type != "cuda":
+        raise ValueError(
+            "float16 mixed precision is only supported on CUDA devices, use "
+            "bfloat16 instead."
+        )
+    return dtype
+
+
+@contextmanager
+def autocast_linear_layers(
+    model: torch.nn.Module, dtype: Optional[torch.dtype]
+) -> Iterator[None]:
+    """
+    Evaluate the linear layers of ``model`` in lower precision.
+
+    Inside of this context, all ``torch.nn.Linear`` layers of ``model`` are evaluated
+    with :py:class:`torch.autocast` to ``dtype``, and their outputs are converted back
+    to the dtype of their inputs. The parameters of the model stay in their original
+    dtype, and everything outside of the linear layers (like the SOAP features, or the
+    gradients with respect to positions and strain) is computed in full precision.
+
+    :py:class:`torch.autocast` only lowers the precision of ``float32`` tensors, so the
+    model must be trained in ``float32``.
+
+    .. code-block:: python
+
+        with autocast_linear_layers(model, torch.bfloat16):
+            predictions = evaluate_model(model, systems, targets, is_training=True)
+
+    :param model: model whose linear layers are evaluated in lower precision
+    :param dtype: lower precision dtype. If :py:obj:`None`, the model is not changed.
+    :raises ValueError: if the linear layers of ``model`` are not in ``float32``
+    """
+    if dtype is None:
+        yield
+        return
+
+    linear_layers = [
+        module for module in model.modules() if isinstance(module, torch.nn.Linear)
+    ]
+    for layer in linear_layers:
+        if layer.weight.dtype != torch.float32:
+            raise ValueError(
+                "Mixed precision requires a model in float32, but the model uses "
+                f"{layer.weight.dtype}. Set `base_precision` to 32 to use mixed "
+                "precision."
+            )
+
+    # autocast contexts entered by the pre-hooks and not yet exited by the hooks
+    active_contexts: List[torch.autocast] = []
+
+    def enter_autocast(layer: torch.nn.Module, inputs: Tuple[torch.Tensor, ...]):
+        context = torch.autocast(device_type=layer.weight.device.type, dtype=dtype)
+        context.__enter__()
+        active_contexts.append(context)
+
+    def exit_autocast(
+        layer: torch.nn.Module,
+        inputs: Tuple[torch.Tensor, ...],
+        output: torch.Tensor,
+    ) -> torch.Tensor:
+        active_contexts.pop().__exit__(None, None, None)
+        return output.to(inputs[0].dtype)
+
+    handles = []
+    for layer in linear_layers:
+        handles.append(layer.register_forward_pre_hook(enter_autocast))
+        handles.append(layer.register_forward_hook(exit_autocast))
+    try:
+        yield
+    finally:
+        for handle in handles:
+            handle.remove()
+        # a layer which raised an error did not exit its autocast context
+        while len(active_contexts) > 0:
+            active_contexts.pop().__exit__(None, None, None)
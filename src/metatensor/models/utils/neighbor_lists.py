@@ -1,8 +1,16 @@
-from typing import List
+import hashlib
+import math
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
+import ase
 import ase.neighborlist
 import numpy as np
 import torch
+import torch.multiprocessing
 from metatensor.torch import Labels, TensorBlock
 from metatensor.torch.atomistic import (
     NeighborListOptions,
@@ -10,33 +18,411 @@ from metatensor.torch.atomistic import (
     register_autograd_neighbors,
 )
 
+from .data.dataset import Dataset
 from .data.system_to_ase import system_to_ase
 
 
+NEIGHBOR_LIST_BACKENDS = ("ase", "torch")
+"""Engines to compute neighbor lists.
+
+``"ase"`` uses :py:func:`ase.neighborlist.neighbor_list` on the CPU. ``"torch"`` uses
+a linked-cell algorithm working directly on the positions and cells of the systems, on
+the device where the systems are stored.
+
+The ``"ase"`` backend is used by the training and the evaluation from the command line.
+The ``"torch"`` backend is only available from Python, through the ``backend`` argument
+of the functions of this module.
+"""
+
+# largest number of bins along each direction of a system in the torch backend
+_MAX_BINS_PER_DIMENSION = 1024
+
+# directory of the on-disk neighbor list cache, `None` if caching is disabled
+_CACHE_DIRECTORY: Optional[Path] = None
+
+
+def set_neighbor_list_cache(directory: Optional[Union[str, Path]]) -> None:
+    """Set the directory used to cache neighbor lists on disk.
+
+    Once set, :py:func:`get_system_with_neighbor_lists` stores every computed neighbor
+    list inside ``directory`` and reuses it whenever the same neighbor list of the same
+    system is requested again, also in later runs (training, evaluation, restarts).
+    Entries are addressed by a hash of the positions, cell and types of the system
+    together with the cutoff and the ``full_list`` flag of the
+    :py:class:`metatensor.torch.atomistic.NeighborListOptions`. Changing a system
+    therefore never gives outdated neighbor lists.
+
+    :param directory: Directory to store the cache in. It is created if it does not
+        exist. ``None`` disables the cache.
+    """
+    global _CACHE_DIRECTORY
+    if directory is None:
+        _CACHE_DIRECTORY = None
+    else:
+        _CACHE_DIRECTORY = Path(directory)
+        _CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+
+
 def get_system_with_neighbor_lists(
-    system: System, neighbor_lists: List[NeighborListOptions]
+    system: System, neighbor_lists: List[NeighborListOptions], backend: str = "ase"
 ) -> System:
     """Attaches neighbor lists to a `System` object.
 
+    If a cache directory is set with :py:func:`set_neighbor_list_cache`, neighbor lists
+    are read from the cache if possible and newly computed ones are added to it.
+
     :param system: The system for which to calculate neighbor lists.
     :param neighbor_lists: A list of `NeighborListOptions` objects,
         each of which specifies the parameters for a neighbor list.
+    :param backend: The engine used to compute the neighbor lists. One of
+        :py:data:`NEIGHBOR_LIST_BACKENDS`.
 
     :return: The `System` object with the neighbor lists added.
     """
-    # Convert the system to an ASE atoms object
-    atoms = system_to_ase(system)
+    return get_systems_with_neighbor_lists([system], neighbor_lists, backend)[0]
+
+
+def get_systems_with_neighbor_lists(
+    systems: List[System],
+    neighbor_lists: List[NeighborListOptions],
+    backend: str = "ase",
+    num_workers: int = 1,
+) -> List[System]:
+    """Attaches neighbor lists to several `System` objects.
+
+    Same as :py:func:`get_system_with_neighbor_lists`, but the ``"torch"`` backend
+    computes the neighbor lists of all systems at once and the ``"ase"`` backend can
+    distribute the systems over several processes.
+
+    :param systems: The systems for which to calculate neighbor lists.
+    :param neighbor_lists: A list of `NeighborListOptions` objects,
+        each of which specifies the parameters for a neighbor list.
+    :param backend: The engine used to compute the neighbor lists. One of
+        :py:data:`NEIGHBOR_LIST_BACKENDS`.
+    :param num_workers: Number of processes used to compute the neighbor lists with
+        the ``"ase"`` backend. The systems are split into chunks which are handed out
+        to the processes, and the results are sent back through shared memory.
+
+    :return: The `System` objects with the neighbor lists added.
+    """
+    if backend not in NEIGHBOR_LIST_BACKENDS:
+        raise ValueError(
+            f"Unknown neighbor list backend {backend!r}. Possible backends are "
+            f"{', '.join(NEIGHBOR_LIST_BACKENDS)}."
+        )
+
+    system_hashes: Dict[int, str] = {}
 
-    # Compute the neighbor lists
     for options in neighbor_lists:
-        if options not in system.known_neighbor_lists():
-            neighbor_list = _compute_single_neighbor_list(atoms, options).to(
-                device=system.device, dtype=system.dtype
+        missing = []
+        for i_system, system in enumerate(systems):
+            if options in system.known_neighbor_lists():
+                continue
+
+            neighbor_list = None
+            if _CACHE_DIRECTORY is not None:
+                if i_system not in system_hashes:
+                    system_hashes[i_system] = _system_hash(system)
+                path = _cache_path(_CACHE_DIRECTORY, system_hashes[i_system], options)
+                neighbor_list = _load_neighbor_list(path)
+
+            if neighbor_list is None:
+                missing.append(i_system)
+            else:
+                _add_neighbor_list(system, options, neighbor_list)
+
+        if len(missing) == 0:
+            continue
+
+        missing_systems = [systems[i_system] for i_system in missing]
+        if backend == "ase":
+            computed = _compute_neighbor_lists_ase(
+                missing_systems, options, num_workers
             )
-            register_autograd_neighbors(system, neighbor_list)
-            system.add_neighbor_list(options, neighbor_list)
+        else:
+            computed = _compute_neighbor_lists_torch(missing_systems, options)
+
+        for i_system, neighbor_list in zip(missing, computed):
+            if _CACHE_DIRECTORY is not None:
+                path = _cache_path(_CACHE_DIRECTORY, system_hashes[i_system], options)
+                _save_neighbor_list(path, neighbor_list)
+            _add_neighbor_list(systems[i_system], options, neighbor_list)
+
+    return systems
+
 
-    return system
+def get_datasets_with_neighbor_lists(
+    datasets: List[Union[Dataset, torch.utils.data.Subset]],
+    neighbor_lists: List[NeighborListOptions],
+    backend: str = "ase",
+    num_workers: int = 1,
+) -> List[Union[Dataset, torch.utils.data.Subset]]:
+    """Attaches neighbor lists to all systems of several datasets.
+
+    The neighbor lists of all systems of all datasets are computed together using
+    :py:func:`get_systems_with_neighbor_lists`, which allows to use many processes
+    efficiently.
+
+    .. note::
+
+        The neighbor lists are attached to the systems stored inside the datasets.
+        Datasets creating new systems on every access, like
+        :py:class:`metatensor.models.utils.data.disk_dataset.DiskDataset`, do not keep
+        them. For such datasets this is only useful to fill the on-disk cache (see
+        :py:func:`set_neighbor_list_cache`).
+
+    :param datasets: The datasets for which to calculate neighbor lists.
+    :param neighbor_lists: A list of `NeighborListOptions` objects,
+        each of which specifies the parameters for a neighbor list.
+    :param backend: The engine used to compute the neighbor lists. One of
+        :py:data:`NEIGHBOR_LIST_BACKENDS`.
+    :param num_workers: Number of processes used to compute the neighbor lists.
+
+    :return: The datasets with the neighbor lists added to their systems.
+    """
+    systems = [
+        dataset[i]["system"] for dataset in datasets for i in range(len(dataset))
+    ]
+
+    if backend == "torch":
+        # limit the memory used by a single search of the torch backend
+        chunk_size = 1000
+    else:
+        chunk_size = max(len(systems), 1)
+
+    for start in range(0, len(systems), chunk_size):
+        get_systems_with_neighbor_lists(
+            systems[start : start + chunk_size],
+            neighbor_lists,
+            backend=backend,
+            num_workers=num_workers,
+        )
+
+    return datasets
+
+
+class VerletNeighborLists:
+    """Neighbor lists of consecutive frames of a trajectory, using a Verlet skin.
+
+    Instead of computing new neighbor lists for every frame, candidate pairs are
+    searched once with a cutoff increased by ``skin``. For the following frames, the
+    neighbor lists are obtained by selecting the candidate pairs within the cutoff. The
+    candidate pairs are only searched again when an atom moved by more than half of
+    the ``skin`` since the last search, or if the cell, the number or the types of the
+    atoms changed.
+
+    Frames have to be given in the order of the trajectory:
+
+    .. code-block:: python
+
+        verlet = VerletNeighborLists(model.requested_neighbor_lists(), skin=1.0)
+        for system in trajectory:
+            system = verlet.get_system_with_neighbor_lists(system)
+
+    Neighbor lists obtained in this way are not stored in the on-disk cache (see
+    :py:func:`set_neighbor_list_cache`).
+
+    :param neighbor_lists: A list of `NeighborListOptions` objects,
+        each of which specifies the parameters for a neighbor list.
+    :param skin: Additional distance used to search candidate pairs. Larger values
+        require less searches, but give more candidate pairs.
+    :param backend: The engine used to search candidate pairs. One of
+        :py:data:`NEIGHBOR_LIST_BACKENDS`.
+    """
+
+    def __init__(
+        self,
+        neighbor_lists: List[NeighborListOptions],
+        skin: float,
+        backend: str = "ase",
+    ):
+        if skin < 0:
+            raise ValueError("`skin` must be positive.")
+        if backend not in NEIGHBOR_LIST_BACKENDS:
+            raise ValueError(
+                f"Unknown neighbor list backend {backend!r}. Possible backends are "
+                f"{', '.join(NEIGHBOR_LIST_BACKENDS)}."
+            )
+
+        self.neighbor_lists = neighbor_lists
+        self.skin = skin
+        self.backend = backend
+        # number of searches of candidate pairs
+        self.n_searches = 0
+
+        # positions, cell and types at the last search
+        self._reference: Optional[Tuple[torch.Tensor, ...]] = None
+        # samples of the candidate pairs of each neighbor list
+        self._candidates: List[torch.Tensor] = []
+
+    def get_system_with_neighbor_lists(self, system: System) -> System:
+        """Attaches neighbor lists to the next frame of the trajectory.
+
+        :param system: The system for which to calculate neighbor lists.
+
+        :return: The `System` object with the neighbor lists added.
+        """
+        missing = [
+            options
+            for options in self.neighbor_lists
+            if options not in system.known_neighbor_lists()
+        ]
+        if len(missing) == 0:
+            return system
+
+        if self._needs_search(system):
+            self._search(system)
+
+        positions = system.positions.detach()
+        cell = system.cell.detach()
+        for options, candidates in zip(self.neighbor_lists, self._candidates):
+            if options not in missing:
+                continue
+
+            candidates = candidates.to(device=positions.device)
+            indices = candidates.to(dtype=torch.long)
+            distances = (
+                positions[indices[:, 1]]
+                - positions[indices[:, 0]]
+                + candidates[:, 2:].to(dtype=cell.dtype) @ cell
+            )
+            selected = torch.linalg.norm(distances, dim=1) < options.cutoff
+            _add_neighbor_list(
+                system,
+                options,
+                _neighbor_list_block(candidates[selected], distances[selected]),
+            )
+
+        return system
+
+    def _needs_search(self, system: System) -> bool:
+        if self._reference is None:
+            return True
+
+        positions, cell, types = self._reference
+        if (
+            positions.device != system.device
+            or not torch.equal(types, system.types)
+            or not torch.equal(cell, system.cell.detach())
+        ):
+            return True
+
+        displacements = torch.linalg.norm(system.positions.detach() - positions, dim=1)
+        return bool(torch.any(displacements > self.skin / 2))
+
+    def _search(self, system: System) -> None:
+        self._candidates = []
+        for options in self.neighbor_lists:
+            extended_options = NeighborListOptions(
+                cutoff=options.cutoff + self.skin, full_list=options.full_list
+            )
+            if self.backend == "ase":
+                (candidates,) = _compute_neighbor_lists_ase(
+                    [system], extended_options, num_workers=1
+                )
+            else:
+                (candidates,) = _compute_neighbor_lists_torch(
+                    [system], extended_options
+                )
+            self._candidates.append(candidates.samples.values.to(device=system.device))
+
+        self._reference = (
+            system.positions.detach().clone(),
+            system.cell.detach().clone(),
+            system.types.clone(),
+        )
+        self.n_searches += 1
+
+
+def _add_neighbor_list(
+    system: System, options: NeighborListOptions, neighbor_list: TensorBlock
+) -> None:
+    neighbor_list = neighbor_list.to(device=system.device, dtype=system.dtype)
+    register_autograd_neighbors(system, neighbor_list)
+    system.add_neighbor_list(options, neighbor_list)
+
+
+def _compute_neighbor_lists_ase(
+    systems: List[System], options: NeighborListOptions, num_workers: int
+) -> List[TensorBlock]:
+    if num_workers <= 1 or len(systems) < 2:
+        return [
+            _compute_single_neighbor_list(system_to_ase(system), options)
+            for system in systems
+        ]
+
+    # neither systems nor options can be sent to other processes, we send the
+    # underlying arrays instead
+    arrays = [
+        (
+            system.positions.detach().cpu().numpy(),
+            system.types.detach().cpu().numpy(),
+            system.cell.detach().cpu().numpy(),
+        )
+        for system in systems
+    ]
+
+    # a few chunks per worker balance the load without too much communication
+    chunk_size = math.ceil(len(arrays) / (4 * num_workers))
+    chunks = [
+        (arrays[start : start + chunk_size], options.cutoff, options.full_list)
+        for start in range(0, len(arrays), chunk_size)
+    ]
+
+    # the workers are started from a clean process instead of forking the current one,
+    # which might have running threads
+    if "forkserver" in torch.multiprocessing.get_all_start_methods():
+        start_method = "forkserver"
+    else:
+        start_method = "spawn"
+    context = torch.multiprocessing.get_context(start_method)
+
+    neighbor_lists = []
+    with context.Pool(
+        min(num_workers, len(chunks)), initializer=_initialize_worker
+    ) as pool:
+        for samples, distances, n_pairs in pool.imap(_compute_chunk, chunks):
+            for system_samples, system_distances in zip(
+                torch.split(samples, n_pairs), torch.split(distances, n_pairs)
+            ):
+                neighbor_lists.append(
+                    _neighbor_list_block(system_samples, system_distances)
+                )
+
+    return neighbor_lists
+
+
+def _initialize_worker() -> None:
+    # every worker computes the neighbor lists of one system at a time
+    torch.set_num_threads(1)
+
+
+def _compute_chunk(
+    chunk: Tuple[List[Tuple[np.ndarray, np.ndarray, np.ndarray]], float, bool]
+) -> Tuple[torch.Tensor, torch.Tensor, List[int]]:
+    # Computes the neighbor lists of a chunk of systems in a worker process. The
+    # results of all systems are concatenated, such that only two tensors have to be
+    # moved to shared memory. The parent process maps them instead of receiving a copy
+    # of the data.
+    arrays, cutoff, full_list = chunk
+    options = NeighborListOptions(cutoff=cutoff, full_list=full_list)
+
+    samples = []
+    distances = []
+    for positions, types, cell in arrays:
+        atoms = ase.Atoms(
+            numbers=types, positions=positions, cell=cell, pbc=cell.any(axis=1)
+        )
+        neighbor_list = _compute_single_neighbor_list(atoms, options)
+        samples.append(neighbor_list.samples.values)
+        distances.append(neighbor_list.values)
+
+    n_pairs = [len(system_samples) for system_samples in samples]
+    return (
+        torch.cat(samples).share_memory_(),
+        torch.cat(distances).share_memory_(),
+        n_pairs,
+    )
 
 
 def _compute_single_neighbor_list(
@@ -51,28 +437,7 @@ def _compute_single_neighbor_list(
         cutoff=options.cutoff,
     )
 
-    selected = []
-    for pair_i, (i, j, S) in enumerate(zip(nl_i, nl_j, nl_S)):
-        # we want a half neighbor list, so drop all duplicated neighbors
-        if j < i:
-            continue
-        elif i == j:
-            if S[0] == 0 and S[1] == 0 and S[2] == 0:
-                # only create pairs with the same atom twice if the pair spans more
-                # than one unit cell
-                continue
-            elif S[0] + S[1] + S[2] < 0 or (
-                (S[0] + S[1] + S[2] == 0) and (S[2] < 0 or (S[2] == 0 and S[1] < 0))
-            ):
-                # When creating pairs between an atom and one of its periodic
-                # images, the code generate multiple redundant pairs (e.g. with
-                # shifts 0 1 1 and 0 -1 -1); and we want to only keep one of these.
-                # We keep the pair in the positive half plane of shifts.
-                continue
-
-        selected.append(pair_i)
-
-    selected = np.array(selected, dtype=np.int32)
+    selected = np.flatnonzero(_half_list_mask(nl_i, nl_j, nl_S))
     n_pairs = len(selected)
 
     if options.full_list:
@@ -95,7 +460,290 @@ def _compute_single_neighbor_list(
 
         distances[n_pairs:] = -nl_D[selected]
 
-    distances = torch.from_numpy(distances)
+    return _neighbor_list_block(torch.from_numpy(samples), torch.from_numpy(distances))
+
+
+def _compute_neighbor_lists_torch(
+    systems: List[System], options: NeighborListOptions
+) -> List[TensorBlock]:
+    # Computes the neighbor lists of several systems at once with a linked-cell
+    # algorithm. All atoms and the periodic images required to find their neighbors
+    # are sorted into cubic bins with the size of the cutoff, such that the neighbors
+    # of an atom are inside of the 27 bins surrounding it. The bins of all systems are
+    # stored one after the other, which allows to search all pairs of all systems with
+    # a single set of tensor operations.
+    device = systems[0].positions.device
+    dtype = systems[0].positions.dtype
+    cutoff = options.cutoff
+
+    n_atoms = torch.tensor([len(system) for system in systems], device=device)
+    atoms_offsets = torch.cumsum(n_atoms, dim=0) - n_atoms
+
+    parts: Dict[str, List[torch.Tensor]] = {
+        name: []
+        for name in [
+            "positions",
+            "wrapped_positions",
+            "cells",
+            "wrap_offsets",
+            "image_positions",
+            "image_atoms",
+            "image_shifts",
+            "image_bins",
+            "atom_bins",
+            "n_bins",
+            "bins_offsets",
+        ]
+    }
+    bins_offset = 0
+    for system, atoms_offset in zip(systems, atoms_offsets):
+        system_positions = system.positions.detach()
+        cell = system.cell.detach()
+        periodic = torch.any(cell != 0, dim=1)
+        complete_cell = _complete_cell(cell)
+
+        # wrap all atoms inside the unit cell along the periodic directions
+        fractional = system_positions @ torch.linalg.inv(complete_cell)
+        wrap_offset = torch.where(
+            periodic, torch.floor(fractional), torch.zeros_like(fractional)
+        )
+        wrapped = system_positions - wrap_offset @ complete_cell
+
+        # number of periodic images necessary in each direction, based on the distance
+        # between opposite faces of the unit cell
+        heights = 1.0 / torch.linalg.norm(torch.linalg.inv(complete_cell), dim=0)
+        n_images = torch.where(
+            periodic,
+            torch.ceil(cutoff / heights).to(torch.int64),
+            torch.zeros(3, dtype=torch.int64, device=device),
+        )
+        shifts = torch.cartesian_prod(
+            *[torch.arange(-n, n + 1, device=device) for n in n_images.tolist()]
+        )
+
+        images = wrapped.unsqueeze(0) + (shifts.to(dtype) @ complete_cell)[:, None]
+        images = images.reshape(-1, 3)
+        atoms = torch.arange(len(system), device=device).repeat(len(shifts))
+        atoms_shifts = shifts.repeat_interleave(len(system), dim=0)
+
+        # only keep images which can be neighbors of atoms inside the cell
+        if len(system) > 0:
+            lower = wrapped.min(dim=0).values - cutoff
+            upper = wrapped.max(dim=0).values + cutoff
+        else:
+            lower = torch.zeros(3, dtype=dtype, device=device)
+            upper = lower
+        inside = torch.all((images >= lower) & (images <= upper), dim=1)
+        images = images[inside]
+
+        # bins are at least as large as the cutoff. Their number is limited for sparse
+        # systems, where most bins would be empty anyway.
+        system_n_bins = torch.clamp(
+            torch.floor((upper - lower) / cutoff).to(torch.int64),
+            min=1,
+            max=_MAX_BINS_PER_DIMENSION,
+        )
+        bin_size = torch.clamp((upper - lower) / system_n_bins, min=cutoff)
+
+        parts["image_positions"].append(images)
+        parts["image_atoms"].append(atoms[inside] + atoms_offset)
+        parts["image_shifts"].append(atoms_shifts[inside])
+        parts["image_bins"].append(
+            _linear_bins(_bins(images, lower, bin_size, system_n_bins), system_n_bins)
+            + bins_offset
+        )
+        parts["atom_bins"].append(_bins(wrapped, lower, bin_size, system_n_bins))
+        parts["n_bins"].append(system_n_bins.expand(len(system), 3))
+        parts["bins_offsets"].append(
+            torch.full((len(system),), bins_offset, device=device)
+        )
+        bins_offset += int(torch.prod(system_n_bins))
+
+        parts["positions"].append(system_positions)
+        parts["wrapped_positions"].append(wrapped)
+        parts["cells"].append(cell.expand(len(system), 3, 3))
+        parts["wrap_offsets"].append(wrap_offset.to(torch.int64))
+
+    image_positions = torch.cat(parts["image_positions"])
+    image_atoms = torch.cat(parts["image_atoms"])
+    image_shifts = torch.cat(parts["image_shifts"])
+    image_bins = torch.cat(parts["image_bins"])
+
+    atom_bins = torch.cat(parts["atom_bins"])
+    n_bins = torch.cat(parts["n_bins"])
+    bins_offsets = torch.cat(parts["bins_offsets"])
+    positions = torch.cat(parts["positions"])
+    wrapped_positions = torch.cat(parts["wrapped_positions"])
+    cells = torch.cat(parts["cells"])
+    wrap_offsets = torch.cat(parts["wrap_offsets"])
+
+    # sort the images by bin. Only the occupied bins are stored, such that the memory
+    # does not depend on the volume of the systems.
+    order = torch.argsort(image_bins, stable=True)
+    occupied_bins, bin_counts = torch.unique(image_bins, return_counts=True)
+    bin_starts = torch.cumsum(bin_counts, dim=0) - bin_counts
+
+    # find the 27 bins around every atom, among the occupied bins
+    neighbor_offsets = torch.cartesian_prod(*(3 * [torch.arange(-1, 2, device=device)]))
+    neighbor_bins = atom_bins.unsqueeze(1) + neighbor_offsets
+    valid = torch.all(
+        (neighbor_bins >= 0) & (neighbor_bins < n_bins.unsqueeze(1)), dim=2
+    )
+    neighbor_bins = _linear_bins(
+        neighbor_bins, n_bins.unsqueeze(1)
+    ) + bins_offsets.unsqueeze(1)
+    neighbor_bins = torch.where(valid, neighbor_bins, 0).reshape(-1)
+    neighbor_index = torch.clamp(
+        torch.searchsorted(occupied_bins, neighbor_bins), max=len(occupied_bins) - 1
+    )
+    valid = valid.reshape(-1) & (occupied_bins[neighbor_index] == neighbor_bins)
+    candidates_counts = torch.where(valid, bin_counts[neighbor_index], 0)
+
+    # all candidate pairs between atoms and the images in the surrounding bins
+    n_candidates = int(candidates_counts.sum())
+    candidates_starts = torch.cumsum(candidates_counts, dim=0) - candidates_counts
+    within_bin = torch.arange(n_candidates, device=device) - torch.repeat_interleave(
+        candidates_starts, candidates_counts
+    )
+    pair_images = order[
+        torch.repeat_interleave(bin_starts[neighbor_index], candidates_counts)
+        + within_bin
+    ]
+    pair_atoms = torch.repeat_interleave(
+        torch.arange(len(positions), device=device).repeat_interleave(27),
+        candidates_counts,
+    )
+
+    distances = image_positions[pair_images] - wrapped_positions[pair_atoms]
+    selected = torch.sum(distances**2, dim=1) < cutoff**2
+    selected &= ~(
+        (image_atoms[pair_images] == pair_atoms)
+        & torch.all(image_shifts[pair_images] == 0, dim=1)
+    )
+
+    nl_i = pair_atoms[selected]
+    nl_j = image_atoms[pair_images[selected]]
+    nl_S = image_shifts[pair_images[selected]]
+
+    # shifts for the positions before wrapping them inside the cell
+    nl_S = nl_S - wrap_offsets[nl_j] + wrap_offsets[nl_i]
+
+    selected = _half_list_mask(nl_i, nl_j, nl_S)
+    nl_i = nl_i[selected]
+    nl_j = nl_j[selected]
+    nl_S = nl_S[selected]
+
+    # sort the pairs to make the output independent of the order in the bins
+    order = torch.arange(len(nl_i), device=device)
+    for key in [nl_S[:, 2], nl_S[:, 1], nl_S[:, 0], nl_j, nl_i]:
+        order = order[torch.argsort(key[order], stable=True)]
+    nl_i = nl_i[order]
+    nl_j = nl_j[order]
+    nl_S = nl_S[order]
+
+    distances = (
+        positions[nl_j]
+        - positions[nl_i]
+        + torch.einsum("pa,pab->pb", nl_S.to(dtype), cells[nl_i])
+    )
+
+    system_index = torch.repeat_interleave(
+        torch.arange(len(systems), device=device), n_atoms
+    )[nl_i]
+    n_pairs = torch.bincount(system_index, minlength=len(systems)).tolist()
+
+    neighbor_lists = []
+    for i, j, S, D, offset in zip(
+        torch.split(nl_i, n_pairs),
+        torch.split(nl_j, n_pairs),
+        torch.split(nl_S, n_pairs),
+        torch.split(distances, n_pairs),
+        atoms_offsets,
+    ):
+        samples = torch.hstack([(i - offset)[:, None], (j - offset)[:, None], S])
+        if options.full_list:
+            reversed_samples = torch.hstack(
+                [(j - offset)[:, None], (i - offset)[:, None], -S]
+            )
+            samples = torch.vstack([samples, reversed_samples])
+            D = torch.vstack([D, -D])
+
+        neighbor_lists.append(_neighbor_list_block(samples.to(torch.int32), D))
+
+    return neighbor_lists
+
+
+def _complete_cell(cell: torch.Tensor) -> torch.Tensor:
+    # Replaces the zero vectors of a cell (non-periodic directions) by orthogonal unit
+    # vectors, such that the cell can be inverted.
+    periodic = torch.any(cell != 0, dim=1)
+    n_periodic = int(periodic.sum())
+
+    if n_periodic == 3:
+        return cell
+    elif n_periodic == 0:
+        return torch.eye(3, dtype=cell.dtype, device=cell.device)
+
+    complete_cell = cell.clone()
+    missing = torch.nonzero(~periodic).reshape(-1).tolist()
+    if n_periodic == 2:
+        a, b = cell[periodic]
+        normal = torch.linalg.cross(a, b)
+        complete_cell[missing[0]] = normal / torch.linalg.norm(normal)
+    else:
+        a = cell[periodic][0]
+        # any vector not parallel to `a` works to build the two missing vectors
+        other = torch.zeros_like(a)
+        other[torch.argmin(torch.abs(a))] = 1.0
+        b = torch.linalg.cross(a, other)
+        c = torch.linalg.cross(a, b)
+        complete_cell[missing[0]] = b / torch.linalg.norm(b)
+        complete_cell[missing[1]] = c / torch.linalg.norm(c)
+
+    return complete_cell
+
+
+def _bins(
+    positions: torch.Tensor,
+    lower: torch.Tensor,
+    size: torch.Tensor,
+    n_bins: torch.Tensor,
+) -> torch.Tensor:
+    bins = torch.floor((positions - lower) / size).to(torch.int64)
+    return torch.minimum(torch.clamp(bins, min=0), n_bins - 1)
+
+
+def _linear_bins(bins: torch.Tensor, n_bins: torch.Tensor) -> torch.Tensor:
+    bins_xy = bins[..., 0] * n_bins[..., 1] + bins[..., 1]
+    return bins_xy * n_bins[..., 2] + bins[..., 2]
+
+
+def _half_list_mask(nl_i, nl_j, nl_S):
+    # Selects the pairs of a half neighbor list from the pairs of a full neighbor list.
+    # Works both with numpy arrays and torch tensors.
+
+    # we want a half neighbor list, so drop all duplicated neighbors
+    selected = nl_j >= nl_i
+
+    # only create pairs with the same atom twice if the pair spans more than one unit
+    # cell
+    self_pairs = nl_i == nl_j
+    selected &= ~(self_pairs & (nl_S == 0).all(axis=1))
+
+    # When creating pairs between an atom and one of its periodic images, the code
+    # generate multiple redundant pairs (e.g. with shifts 0 1 1 and 0 -1 -1); and we
+    # want to only keep one of these. We keep the pair in the positive half plane of
+    # shifts.
+    shifts_sum = nl_S.sum(axis=1)
+    negative_half_plane = (shifts_sum < 0) | (
+        (shifts_sum == 0) & ((nl_S[:, 2] < 0) | ((nl_S[:, 2] == 0) & (nl_S[:, 1] < 0)))
+    )
+    selected &= ~(self_pairs & negative_half_plane)
+
+    return selected
+
+
+def _neighbor_list_block(samples: torch.Tensor, distances: torch.Tensor) -> TensorBlock:
     return TensorBlock(
         values=distances.reshape(-1, 3, 1),
         samples=Labels(
@@ -106,8 +754,58 @@ def _compute_single_neighbor_list(
                 "cell_shift_b",
                 "cell_shift_c",
             ],
-            values=torch.from_numpy(samples),
+            values=samples,
         ),
-        components=[Labels.range("xyz", 3)],
-        properties=Labels.range("distance", 1),
+        components=[Labels.range("xyz", 3).to(distances.device)],
+        properties=Labels.range("distance", 1).to(distances.device),
     )
+
+
+def _system_hash(system: System) -> str:
+    system_hash = hashlib.sha256()
+    for tensor in [system.positions, system.cell, system.types]:
+        array = tensor.detach().cpu().numpy()
+        system_hash.update(f"{array.dtype.str}{array.shape}".encode())
+        system_hash.update(np.ascontiguousarray(array).tobytes())
+    return system_hash.hexdigest()
+
+
+def _cache_path(
+    directory: Path, system_hash: str, options: NeighborListOptions
+) -> Path:
+    key = f"{system_hash}-{options.cutoff!r}-{options.full_list}"
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    # split the entries over sub-directories to keep directories small
+    return directory / digest[:2] / f"{digest[2:]}.npz"
+
+
+def _load_neighbor_list(path: Path) -> Optional[TensorBlock]:
+    try:
+        with np.load(path) as data:
+            return _neighbor_list_block(
+                torch.from_numpy(data["samples"]), torch.from_numpy(data["distances"])
+            )
+    except FileNotFoundError:
+        return None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        # broken entry, it will be overwritten with a newly computed neighbor list
+        return None
+
+
+def _save_neighbor_list(path: Path, neighbor_list: TensorBlock) -> None:
+    path.parent.mkdir(exist_ok=True)
+
+    # write to a temporary file first to never expose partially written entries to
+    # other processes using the same cache
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            np.savez(
+                file,
+                samples=neighbor_list.samples.values.cpu().numpy().astype(np.int32),
+                distances=neighbor_list.values.reshape(-1, 3).cpu().numpy(),
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -7,6 +7,7 @@ from omegaconf import Container, DictConfig, ListConfig, OmegaConf
 from omegaconf.basecontainer import BaseContainer
 
 from .. import RANDOM_SEED
+from .data.disk_dataset import DISK_DATASET_SUFFIX
 from .devices import pick_devices
 
 
@@ -86,6 +87,10 @@ BASE_OPTIONS = OmegaConf.create(
         "device": "${default_device:}",
         "base_precision": "${default_precision:}",
         "seed": "${default_random_seed:}",
+        "num_processes": 1,
+        "neighbor_list_cache": None,
+        "eval_batch_size": 1,
+        "eval_max_atoms_per_batch": None,
     }
 )
 
@@ -147,20 +152,26 @@ def expand_dataset_config(conf: Union[str, DictConfig, ListConfig]) -> ListConfi
     - Handles special cases, such as the mandatory nature of the "energy" section for MD
       simulations and the mutual exclusivity of 'stress' and 'virial' sections.
       Additionally the gradient sections for "forces" are enables by default.
+    - Preprocessed datasets (with the ``.mtmd`` suffix) contain their targets, so their
+      ``targets`` section is left empty.
 
     :param conf: The dataset configuration, either as a file path string or a DictConfig
         object.
     :raises ValueError: If both ``virial`` and ``stress`` sections are enabled in the
         "energy" target, as this is not permissible for training.
+    :raises ValueError: If a ``targets`` section is given for a preprocessed dataset.
     :returns: List of datasets configurations. If ``conf`` was a :class:`str` or a
         :class:`omegaconf.DictConfig` the list contains only a single element.
     """
     # Expand str -> DictConfig
     if isinstance(conf, str):
         read_from = conf
-        conf = OmegaConf.create(
-            {"systems": read_from, "targets": {"energy": read_from}}
-        )
+        if Path(read_from).suffix == DISK_DATASET_SUFFIX:
+            conf = OmegaConf.create({"systems": read_from, "targets": {}})
+        else:
+            conf = OmegaConf.create(
+                {"systems": read_from, "targets": {"energy": read_from}}
+            )
 
     # Expand DictConfig -> ListConfig
     if isinstance(conf, DictConfig):
@@ -176,6 +187,15 @@ def expand_dataset_config(conf: Union[str, DictConfig, ListConfig]) -> ListConfi
                 CONF_SYSTEMS, conf_element["systems"]
             )
 
+            if conf_element["systems"]["file_format"] == DISK_DATASET_SUFFIX:
+                if len(conf_element.get("targets", {})) > 0:
+                    raise ValueError(
+                        "Targets are read from the preprocessed dataset "
+                        f"{conf_element['systems']['read_from']!r}. Remove the "
+                        "`targets` section of this dataset."
+                    )
+                conf_element["targets"] = {}
+
         if hasattr(conf_element, "targets"):
             for target_key, target in conf_element["targets"].items():
                 if type(target) is str:
@@ -1,3 +1,4 @@
+import warnings
 from typing import List, Optional
 
 import torch
@@ -29,3 +30,66 @@ def compute_gradient(
         )
     else:
         return gradient
+
+
+def compute_gradients(
+    targets: List[torch.Tensor], inputs: List[torch.Tensor], is_training: bool
+) -> List[List[torch.Tensor]]:
+    """
+    Calculates the gradients of several target tensors with respect to the same list of
+    input tensors, with a single (batched) backward pass.
+
+    As in :py:func:`compute_gradient`, the gradient of each target is calculated with
+    respect to the sum of its values. The batched backward pass relies on
+    :py:func:`torch.vmap`. If one of the operations of the model has no batching rule,
+    the gradients are instead calculated with one backward pass per target.
+
+    :returns: For each target, the list of its gradients with respect to ``inputs``.
+    """
+    if len(targets) == 1:
+        return [list(compute_gradient(targets[0], inputs, is_training))]
+
+    # The gradients of all targets are obtained at once by differentiating the stacked
+    # sums of the targets with one basis vector per target as `grad_outputs`
+    summed_targets = torch.stack([target.sum() for target in targets])
+    grad_outputs: List[torch.Tensor] = [
+        torch.eye(
+            len(targets), dtype=summed_targets.dtype, device=summed_targets.device
+        )
+    ]
+    try:
+        with warnings.catch_warnings():
+            # vmap warns before falling back to a slow loop for operations without a
+            # batching rule, in which case separate backward passes are faster
+            warnings.filterwarnings("error", message=".*batching rule")
+            # the graph is kept in case the batched backward pass fails half-way
+            gradients = torch.autograd.grad(
+                outputs=[summed_targets],
+                inputs=inputs,
+                grad_outputs=grad_outputs,
+                retain_graph=True,
+                create_graph=is_training,
+                is_grads_batched=True,
+            )
+    except (RuntimeError, UserWarning):
+        return _compute_gradients_separately(targets, inputs, is_training)
+
+    return [[gradient[i] for gradient in gradients] for i in range(len(targets))]
+
+
+def _compute_gradients_separately(
+    targets: List[torch.Tensor], inputs: List[torch.Tensor], is_training: bool
+) -> List[List[torch.Tensor]]:
+    all_gradients: List[List[torch.Tensor]] = []
+    for i, target in enumerate(targets):
+        # the graph is shared between the targets, and only freed after the last one
+        is_last = i == len(targets) - 1
+        gradients = torch.autograd.grad(
+            outputs=[target],
+            inputs=inputs,
+            grad_outputs=[torch.ones_like(target)],
+            retain_graph=is_training or not is_last,
+            create_graph=is_training,
+        )
+        all_gradients.append(list(gradients))
+    return all_gradients
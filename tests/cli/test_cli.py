@@ -26,7 +26,7 @@ def test_wrong_module():
         subprocess.check_call(["metatensor-models", "foo"])
 
 
-@pytest.mark.parametrize("module", tuple(["eval", "export", "train"]))
+@pytest.mark.parametrize("module", tuple(["eval", "export", "preprocess", "train"]))
 def test_available_modules(module):
     """Test available modules."""
     subprocess.check_call(["metatensor-models", module, "--help"])
@@ -103,7 +103,21 @@ def get_completion_suggestions(partial_word: str) -> List[str]:
 
 @pytest.mark.parametrize(
     "partial_word, expected_completion",
-    [(" ", ["--debug", "--help", "--version", "-h", "eval", "export", "train"])],
+    [
+        (
+            " ",
+            [
+                "--debug",
+                "--help",
+                "--version",
+                "-h",
+                "eval",
+                "export",
+                "preprocess",
+                "train",
+            ],
+        )
+    ],
 )
 def test_subcommand_completion(partial_word, expected_completion):
     """Test that expected subcommand completion matches."""
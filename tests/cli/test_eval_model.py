@@ -4,11 +4,14 @@ import subprocess
 from pathlib import Path
 
 import ase.io
+import metatensor.torch
+import numpy as np
 import pytest
 import torch
+from metatensor.torch import Labels, TensorBlock, TensorMap
 from omegaconf import OmegaConf
 
-from metatensor.models.cli.eval import eval_model
+from metatensor.models.cli.eval import _PredictionsAccumulator, eval_model
 from metatensor.models.experimental.soap_bpnn import __model__
 from metatensor.models.utils.data import DatasetInfo, TargetInfo
 
@@ -134,3 +137,104 @@ def test_eval_no_targets(monkeypatch, tmp_path, model, options):
     )
 
     assert Path("output.xyz").is_file()
+
+
+@pytest.mark.parametrize("batching", [{"batch_size": 7}, {"max_atoms_per_batch": 50}])
+def test_eval_batched(monkeypatch, tmp_path, model, options, batching):
+    """Batched evaluation gives the same predictions, in the same order."""
+    monkeypatch.chdir(tmp_path)
+
+    shutil.copy(RESOURCES_PATH / "qm9_reduced_100.xyz", "qm9_reduced_100.xyz")
+
+    eval_model(model=model, options=options, output="single.xyz")
+    eval_model(model=model, options=options, output="batched.xyz", **batching)
+
+    frames = ase.io.read("single.xyz", ":")
+    frames_batched = ase.io.read("batched.xyz", ":")
+    assert len(frames) == len(frames_batched)
+    for atoms, atoms_batched in zip(frames, frames_batched):
+        assert atoms.info["energy"] == pytest.approx(atoms_batched.info["energy"])
+
+
+def _energies(n_systems, n_atoms):
+    """Energy TensorMap for a batch of systems with position gradients."""
+    block = TensorBlock(
+        values=torch.rand(n_systems, 1),
+        samples=Labels.range("system", n_systems),
+        components=[],
+        properties=Labels.range("energy", 1),
+    )
+    block.add_gradient(
+        "positions",
+        TensorBlock(
+            values=torch.rand(n_systems * n_atoms, 3, 1),
+            samples=Labels(
+                ["sample", "system", "atom"],
+                torch.tensor(
+                    [[i, i, j] for i in range(n_systems) for j in range(n_atoms)]
+                ),
+            ),
+            components=[Labels.range("xyz", 3)],
+            properties=Labels.range("energy", 1),
+        ),
+    )
+    return TensorMap(Labels.single(), [block])
+
+
+def test_predictions_accumulator():
+    """The accumulated predictions are the same as joining the shifted batches."""
+    batches = [_energies(4, 3), _energies(2, 5), _energies(3, 2)]
+
+    accumulator = _PredictionsAccumulator()
+    for batch in batches:
+        accumulator.update({"energy": batch}, len(batch.block().samples))
+    predictions = accumulator.finalize()["energy"]
+
+    shifted_batches = []
+    n_systems = 0
+    for batch in batches:
+        block = batch.block()
+        shifted_block = TensorBlock(
+            values=block.values,
+            samples=Labels(["system"], block.samples.values + n_systems),
+            components=block.components,
+            properties=block.properties,
+        )
+        shifted_block.add_gradient("positions", block.gradient("positions"))
+        shifted_batches.append(TensorMap(batch.keys, [shifted_block]))
+        n_systems += len(block.samples)
+    expected = metatensor.torch.join(shifted_batches, axis="samples")
+
+    assert metatensor.torch.equal(predictions, expected)
+
+
+def test_eval_npz(monkeypatch, tmp_path, model, options):
+    """Predictions written to npz files are the same as in xyz files."""
+    monkeypatch.chdir(tmp_path)
+
+    shutil.copy(RESOURCES_PATH / "qm9_reduced_100.xyz", "qm9_reduced_100.xyz")
+
+    eval_model(model=model, options=options, output="foo.xyz", batch_size=7)
+    eval_model(model=model, options=options, output="foo.npz", batch_size=7)
+
+    frames = ase.io.read("foo.xyz", ":")
+    arrays = np.load("foo.npz")
+    assert len(arrays["atoms_offsets"]) == len(frames) + 1
+    np.testing.assert_allclose(
+        arrays["energy"], [frame.info["energy"] for frame in frames]
+    )
+
+
+def test_eval_trajectory(monkeypatch, tmp_path, model, options):
+    """Evaluation in trajectory mode gives the same predictions."""
+    monkeypatch.chdir(tmp_path)
+
+    shutil.copy(RESOURCES_PATH / "qm9_reduced_100.xyz", "qm9_reduced_100.xyz")
+
+    eval_model(model=model, options=options, output="single.xyz")
+    eval_model(model=model, options=options, output="traj.xyz", trajectory_skin=0.5)
+
+    frames = ase.io.read("single.xyz", ":")
+    frames_trajectory = ase.io.read("traj.xyz", ":")
+    for atoms, atoms_trajectory in zip(frames, frames_trajectory):
+        assert atoms.info["energy"] == pytest.approx(atoms_trajectory.info["energy"])
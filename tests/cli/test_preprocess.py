@@ -0,0 +1,45 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from omegaconf import OmegaConf
+
+from metatensor.models.cli.preprocess import preprocess
+from metatensor.models.utils.data.disk_dataset import DiskDataset
+
+from . import EVAL_OPTIONS_PATH, RESOURCES_PATH
+
+
+def test_preprocess_cli(monkeypatch, tmp_path):
+    """Test succesful run of the preprocess script via the CLI"""
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(RESOURCES_PATH / "qm9_reduced_100.xyz", "qm9_reduced_100.xyz")
+
+    command = ["metatensor-models", "preprocess", str(EVAL_OPTIONS_PATH)]
+    subprocess.check_call(command)
+
+    assert Path("dataset.mtmd").is_file()
+
+
+@pytest.mark.parametrize("n_datasets", [1, 2])
+def test_preprocess(monkeypatch, tmp_path, n_datasets):
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(RESOURCES_PATH / "qm9_reduced_100.xyz", "qm9_reduced_100.xyz")
+
+    options = OmegaConf.load(EVAL_OPTIONS_PATH)
+    if n_datasets > 1:
+        options = OmegaConf.create(n_datasets * [options])
+
+    preprocess(options, output="qm9.mtmd")
+
+    if n_datasets == 1:
+        filenames = ["qm9.mtmd"]
+    else:
+        filenames = [f"qm9_{i}.mtmd" for i in range(n_datasets)]
+
+    for filename in filenames:
+        dataset = DiskDataset(filename)
+        assert len(dataset) == 100
+        assert list(dataset.target_info.keys()) == ["energy"]
+        assert dataset.target_info["energy"].gradients == set()
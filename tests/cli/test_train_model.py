@@ -438,6 +438,13 @@ def test_unsupported_dtype(options):
         train_model(options)
 
 
+def test_error_mixed_precision_base_precision(options):
+    options["architecture"]["training"] = {"mixed_precision": "bfloat16"}
+    match = r"requires a model in float32, but `base_precision` is 64. Set"
+    with pytest.raises(ValueError, match=match):
+        train_model(options)
+
+
 def test_architecture_error(options, monkeypatch, tmp_path):
     """Test an error raise if there is problem wth the architecture."""
     monkeypatch.chdir(tmp_path)
@@ -447,3 +454,32 @@ def test_architecture_error(options, monkeypatch, tmp_path):
 
     with pytest.raises(ArchitectureError, match="originates from an architecture"):
         train_model(options)
+
+
+def test_train_distributed(options, monkeypatch, tmp_path):
+    """Test training with several processes."""
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(DATASET_PATH_QM9, "qm9_reduced_100.xyz")
+
+    options["num_processes"] = 2
+    options["device"] = "cpu"
+    train_model(options)
+
+    assert Path("model.pt").is_file()
+
+
+def test_error_num_processes(options):
+    options["num_processes"] = 0
+    with pytest.raises(ValueError, match="`num_processes` should be a positive number"):
+        train_model(options)
+
+
+def test_error_num_processes_too_large(options, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(DATASET_PATH_QM9, "qm9_reduced_100.xyz")
+
+    options["num_processes"] = 1000
+    options["device"] = "cpu"
+    match = r"`num_processes` \(1000\) is larger than the number of samples"
+    with pytest.raises(ValueError, match=match):
+        train_model(options)
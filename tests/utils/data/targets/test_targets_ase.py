@@ -65,6 +65,29 @@ def test_read_forces_ase(monkeypatch, tmp_path):
         torch.testing.assert_close(result.values, expected)
 
 
+def test_read_forces_ase_different_sizes(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    filename = "systems.xyz"
+
+    systems = ase_systems()
+    systems[1] += ase.Atoms("O", positions=[[1.0, 0.0, 0.0]])
+    systems[1].arrays["forces"][2] = [1.0, 2.0, 3.0]
+    ase.io.write(filename, systems)
+
+    results = read_forces_ase(filename=filename, key="forces")
+
+    assert len(results) == 2
+    for i_system, (result, atoms) in enumerate(zip(results, systems)):
+        expected = -torch.tensor(atoms.get_array("forces"), dtype=torch.float32)
+        torch.testing.assert_close(result.values, expected.reshape(-1, 3, 1))
+
+        expected_samples = torch.tensor([[0, i_system, a] for a in range(len(atoms))])
+        torch.testing.assert_close(
+            result.samples.values, expected_samples.to(result.samples.values.dtype)
+        )
+
+
 def test_read_stress_ase(monkeypatch, tmp_path):
     monkeypatch.chdir(tmp_path)
 
@@ -0,0 +1,129 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from omegaconf import OmegaConf
+
+from metatensor.models.utils.data import (
+    AtomCountBatchSampler,
+    CombinedDataLoader,
+    Dataset,
+    collate_fn,
+    get_num_atoms,
+    read_systems,
+    read_targets,
+)
+from metatensor.models.utils.data.disk_dataset import DiskDataset, write_disk_dataset
+
+
+RESOURCES_PATH = Path(__file__).parents[2] / "resources"
+
+
+def _dataset():
+    # QM9 and carbon systems, with between 3 and 29 atoms and 64 atoms respectively
+    systems = read_systems(RESOURCES_PATH / "qm9_reduced_100.xyz")
+    systems += read_systems(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    return Dataset({"system": systems})
+
+
+@pytest.mark.parametrize("shuffle", [True, False])
+@pytest.mark.parametrize("bucket_size", [1, 16, 1000])
+def test_batches(shuffle, bucket_size):
+    dataset = _dataset()
+    num_atoms = get_num_atoms(dataset)
+
+    sampler = AtomCountBatchSampler(
+        dataset, max_atoms=100, shuffle=shuffle, bucket_size=bucket_size, seed=0
+    )
+
+    for _ in range(2):
+        n_batches = len(sampler)
+        batches = list(sampler)
+        assert len(batches) == n_batches
+
+        # every system is part of exactly one batch
+        assert sorted(i for batch in batches for i in batch) == list(range(120))
+
+        for batch in batches:
+            assert np.sum(num_atoms[batch]) <= 100
+
+
+def test_bucketing():
+    """Sorting systems by size gives fewer batches than packing them in order."""
+    dataset = _dataset()
+
+    unsorted = AtomCountBatchSampler(dataset, max_atoms=100, bucket_size=1)
+    sorted_buckets = AtomCountBatchSampler(dataset, max_atoms=100, bucket_size=1000)
+
+    assert len(sorted_buckets) < len(unsorted)
+
+
+def test_reshuffle_every_epoch():
+    sampler = AtomCountBatchSampler(_dataset(), max_atoms=100, shuffle=True, seed=0)
+    assert list(sampler) != list(sampler)
+
+
+def test_too_large_systems(caplog):
+    dataset = _dataset()
+    sampler = AtomCountBatchSampler(dataset, max_atoms=30)
+
+    assert "20 systems contain more than 30 atoms" in caplog.text
+    large_batches = [batch for batch in sampler if len(batch) == 1 and batch[0] >= 100]
+    assert len(large_batches) == 20
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="`max_atoms` must be positive"):
+        AtomCountBatchSampler(_dataset(), max_atoms=0)
+
+    with pytest.raises(ValueError, match="`bucket_size` must be positive"):
+        AtomCountBatchSampler(_dataset(), max_atoms=10, bucket_size=0)
+
+
+def test_num_atoms(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    filename = str(RESOURCES_PATH / "qm9_reduced_100.xyz")
+    systems = read_systems(filename, dtype=torch.float64)
+    expected = np.array([len(system) for system in systems])
+
+    conf = {
+        "energy": {
+            "quantity": "energy",
+            "read_from": filename,
+            "file_format": ".xyz",
+            "key": "U0",
+            "unit": "eV",
+            "forces": False,
+            "stress": False,
+            "virial": False,
+        }
+    }
+    targets, target_info = read_targets(OmegaConf.create(conf), dtype=torch.float64)
+    write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+
+    for dataset in [
+        Dataset({"system": systems, **targets}),
+        DiskDataset("dataset.mtmd"),
+    ]:
+        np.testing.assert_equal(get_num_atoms(dataset), expected)
+
+        subset = torch.utils.data.Subset(dataset, [5, 2, 80])
+        np.testing.assert_equal(get_num_atoms(subset), expected[[5, 2, 80]])
+
+
+def test_dataloader():
+    dataset = _dataset()
+    sampler = AtomCountBatchSampler(dataset, max_atoms=100, shuffle=True, seed=0)
+    dataloader = torch.utils.data.DataLoader(
+        dataset, batch_sampler=sampler, collate_fn=collate_fn
+    )
+    combined_dataloader = CombinedDataLoader([dataloader], shuffle=True)
+
+    for _ in range(3):
+        n_systems = 0
+        for systems, _ in combined_dataloader:
+            assert sum(len(system) for system in systems) <= 100
+            n_systems += len(systems)
+        assert n_systems == 120
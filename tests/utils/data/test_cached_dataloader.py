@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import metatensor.torch
+import torch
+from omegaconf import OmegaConf
+from torch.utils.data import DataLoader
+
+from metatensor.models.utils.data import (
+    CachedDataLoader,
+    CombinedDataLoader,
+    Dataset,
+    collate_fn,
+    read_systems,
+    read_targets,
+)
+
+
+RESOURCES_PATH = Path(__file__).parents[2] / "resources"
+
+
+def _dataloader():
+    systems = read_systems(RESOURCES_PATH / "qm9_reduced_100.xyz")
+    conf = {
+        "mtm::U0": {
+            "quantity": "energy",
+            "read_from": RESOURCES_PATH / "qm9_reduced_100.xyz",
+            "file_format": ".xyz",
+            "key": "U0",
+            "unit": "eV",
+            "forces": False,
+            "stress": False,
+            "virial": False,
+        }
+    }
+    targets, _ = read_targets(OmegaConf.create(conf))
+    dataset = Dataset({"system": systems, "mtm::U0": targets["mtm::U0"]})
+    return DataLoader(dataset, batch_size=10, shuffle=False, collate_fn=collate_fn)
+
+
+def test_same_batches():
+    """The cached batches are the same as the ones of the dataloader, every epoch."""
+    dataloader = _dataloader()
+    cached_dataloader = CachedDataLoader(dataloader)
+
+    assert len(cached_dataloader) == len(dataloader)
+
+    for _ in range(2):
+        n_batches = 0
+        for (systems, targets), (cached_systems, cached_targets) in zip(
+            dataloader, cached_dataloader
+        ):
+            assert len(systems) == len(cached_systems)
+            for system, cached_system in zip(systems, cached_systems):
+                assert torch.equal(system.positions, cached_system.positions)
+            assert metatensor.torch.equal(targets["mtm::U0"], cached_targets["mtm::U0"])
+            n_batches += 1
+        assert n_batches == len(dataloader)
+
+
+def test_batches_are_reused():
+    """Batches are only collated once."""
+    cached_dataloader = CachedDataLoader(_dataloader())
+
+    first_epoch = list(cached_dataloader)
+    second_epoch = list(cached_dataloader)
+    for first_batch, second_batch in zip(first_epoch, second_epoch):
+        assert first_batch is second_batch
+
+
+def test_device():
+    cached_dataloader = CachedDataLoader(_dataloader(), device=torch.device("cpu"))
+
+    for systems, targets in cached_dataloader:
+        assert all(system.device.type == "cpu" for system in systems)
+        assert targets["mtm::U0"].device.type == "cpu"
+
+
+def test_combined():
+    """Cached dataloaders can be combined like other dataloaders."""
+    combined_dataloader = CombinedDataLoader(
+        [CachedDataLoader(_dataloader()), CachedDataLoader(_dataloader())],
+        shuffle=False,
+    )
+
+    assert len(combined_dataloader) == 20
+    assert len(list(combined_dataloader)) == 20
@@ -1,6 +1,7 @@
 from pathlib import Path
 
 import numpy as np
+import pytest
 from omegaconf import OmegaConf
 from torch.utils.data import DataLoader
 
@@ -159,3 +160,115 @@ def test_with_shuffling():
     ]
     assert set(qm9_samples) == set(range(100))
     assert set(alchemical_samples) == set(range(10))
+
+
+def test_batches_are_loaded_lazily():
+    """Tests that batches are only collated when they are requested."""
+
+    systems = read_systems(RESOURCES_PATH / "qm9_reduced_100.xyz")
+    dataset = Dataset({"system": systems})
+
+    n_collated = 0
+
+    def counting_collate_fn(batch):
+        nonlocal n_collated
+        n_collated += 1
+        return collate_fn(batch)
+
+    dataloaders = [
+        DataLoader(dataset, batch_size=10, collate_fn=counting_collate_fn),
+        DataLoader(dataset, batch_size=20, collate_fn=counting_collate_fn),
+    ]
+    combined_dataloader = CombinedDataLoader(dataloaders, shuffle=True)
+    assert n_collated == 0
+
+    for i_batch, _ in enumerate(combined_dataloader):
+        assert n_collated == i_batch + 1
+
+    # all batches are loaded again in the next epoch
+    assert len(list(combined_dataloader)) == 15
+    assert n_collated == 30
+
+
+def _dataloaders():
+    # two dataloaders which can be told apart by the size of their batches
+    systems = read_systems(RESOURCES_PATH / "qm9_reduced_100.xyz")
+    return [
+        DataLoader(Dataset({"system": systems}), batch_size=10, collate_fn=collate_fn),
+        DataLoader(
+            Dataset({"system": systems[:10]}), batch_size=2, collate_fn=collate_fn
+        ),
+    ]
+
+
+def _batch_sizes(combined_dataloader):
+    return [len(systems) for systems, _ in combined_dataloader]
+
+
+def test_reshuffle_every_epoch():
+    combined_dataloader = CombinedDataLoader(_dataloaders(), shuffle=True, seed=1)
+
+    first_epoch = _batch_sizes(combined_dataloader)
+    second_epoch = _batch_sizes(combined_dataloader)
+
+    assert sorted(first_epoch) == sorted(second_epoch)
+    assert first_epoch != second_epoch
+
+    # the order is reproducible with the same seed
+    combined_dataloader = CombinedDataLoader(_dataloaders(), shuffle=True, seed=1)
+    assert _batch_sizes(combined_dataloader) == first_epoch
+
+
+def test_weights():
+    combined_dataloader = CombinedDataLoader(
+        _dataloaders(), shuffle=True, weights=[0.0, 1.0], steps_per_epoch=12
+    )
+
+    assert len(combined_dataloader) == 12
+    # the second dataloader only has 5 batches, it is repeated
+    assert _batch_sizes(combined_dataloader) == 12 * [2]
+    assert _batch_sizes(combined_dataloader) == 12 * [2]
+
+
+def test_temperature():
+    combined_dataloader = CombinedDataLoader(
+        _dataloaders(), shuffle=True, temperature=1.0, seed=0
+    )
+    np.testing.assert_allclose(combined_dataloader.probabilities, [10 / 15, 5 / 15])
+    assert len(combined_dataloader) == 15
+
+    combined_dataloader = CombinedDataLoader(
+        _dataloaders(), shuffle=True, temperature=1e6, steps_per_epoch=1000, seed=0
+    )
+    np.testing.assert_allclose(combined_dataloader.probabilities, [0.5, 0.5], rtol=1e-5)
+
+    batch_sizes = _batch_sizes(combined_dataloader)
+    assert len(batch_sizes) == 1000
+    assert 400 < batch_sizes.count(10) < 600
+
+
+def test_steps_per_epoch():
+    """Without weights, batches are drawn proportionally to the number of batches."""
+    combined_dataloader = CombinedDataLoader(
+        _dataloaders(), shuffle=False, steps_per_epoch=30, seed=0
+    )
+    np.testing.assert_allclose(combined_dataloader.probabilities, [10 / 15, 5 / 15])
+
+    batch_sizes = _batch_sizes(combined_dataloader)
+    assert len(batch_sizes) == 30
+    # without shuffling the batches of each dataloader come one after the other
+    assert batch_sizes == sorted(batch_sizes, reverse=True)
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="Only one of `weights` and `temperature`"):
+        CombinedDataLoader(_dataloaders(), shuffle=True, weights=[1, 1], temperature=1)
+
+    with pytest.raises(ValueError, match="Got 3 weights for 2 dataloaders"):
+        CombinedDataLoader(_dataloaders(), shuffle=True, weights=[1, 1, 1])
+
+    with pytest.raises(ValueError, match="Weights must be positive"):
+        CombinedDataLoader(_dataloaders(), shuffle=True, weights=[-1, 1])
+
+    with pytest.raises(ValueError, match="`temperature` must be positive"):
+        CombinedDataLoader(_dataloaders(), shuffle=True, temperature=0)
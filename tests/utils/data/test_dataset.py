@@ -1,7 +1,9 @@
 from pathlib import Path
 
+import metatensor.torch
 import pytest
 import torch
+from metatensor.torch import Labels, TensorBlock, TensorMap
 from omegaconf import OmegaConf
 
 from metatensor.models.utils.data import (
@@ -16,6 +18,7 @@ from metatensor.models.utils.data import (
     read_systems,
     read_targets,
 )
+from metatensor.models.utils.data.dataset import _join_tensor_maps
 
 
 RESOURCES_PATH = Path(__file__).parents[2] / "resources"
@@ -507,3 +510,69 @@ def test_collate_fn():
     assert isinstance(batch[0], tuple)
     assert len(batch[0]) == 3
     assert isinstance(batch[1], dict)
+
+
+def _ethanol_targets():
+    filename = str(RESOURCES_PATH / "ethanol_reduced_100.xyz")
+    conf = {
+        "energy": {
+            "quantity": "energy",
+            "read_from": filename,
+            "file_format": ".xyz",
+            "key": "energy",
+            "unit": "eV",
+            "forces": {"read_from": filename, "file_format": ".xyz", "key": "forces"},
+            "stress": False,
+            "virial": False,
+        }
+    }
+    targets, _ = read_targets(OmegaConf.create(conf))
+    return targets["energy"]
+
+
+def _carbon_targets():
+    filename = str(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    conf = {
+        "energy": {
+            "quantity": "energy",
+            "read_from": filename,
+            "file_format": ".xyz",
+            "key": "energy",
+            "unit": "eV",
+            "forces": {"read_from": filename, "file_format": ".xyz", "key": "force"},
+            "stress": {"read_from": filename, "file_format": ".xyz", "key": "stress"},
+            "virial": False,
+        }
+    }
+    targets, _ = read_targets(OmegaConf.create(conf))
+    return targets["energy"]
+
+
+def _per_atom_targets():
+    tensor_maps = []
+    for n_atoms in [2, 5, 3]:
+        block = TensorBlock(
+            values=torch.rand(n_atoms, 1),
+            samples=Labels(
+                ["system", "atom"],
+                torch.tensor([[0, i] for i in range(n_atoms)]),
+            ),
+            components=[],
+            properties=Labels.range("charge", 1),
+        )
+        tensor_maps.append(TensorMap(Labels.single(), [block]))
+    return tensor_maps
+
+
+@pytest.mark.parametrize(
+    "get_targets", [_ethanol_targets, _carbon_targets, _per_atom_targets]
+)
+@pytest.mark.parametrize("batch_size", [1, 2, 7])
+def test_join_tensor_maps(get_targets, batch_size):
+    """Tests that joining TensorMaps gives the same results as `metatensor.join`."""
+    tensor_maps = get_targets()[:batch_size]
+
+    joined = _join_tensor_maps(tensor_maps)
+    expected = metatensor.torch.join(tensor_maps, axis="samples")
+
+    assert metatensor.torch.equal(joined, expected)
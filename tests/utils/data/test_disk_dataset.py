@@ -0,0 +1,229 @@
+from pathlib import Path
+
+import pytest
+import torch
+from metatensor.torch import Labels, TensorBlock, TensorMap
+from omegaconf import OmegaConf
+
+from metatensor.models.utils.data import (
+    Dataset,
+    TargetInfo,
+    TargetInfoDict,
+    collate_fn,
+    read_systems,
+    read_targets,
+)
+from metatensor.models.utils.data.disk_dataset import DiskDataset, write_disk_dataset
+
+
+RESOURCES_PATH = Path(__file__).parents[2] / "resources"
+
+
+def _read_ethanol(dtype=torch.float64):
+    filename = str(RESOURCES_PATH / "ethanol_reduced_100.xyz")
+    systems = read_systems(filename, dtype=dtype)
+
+    conf = {
+        "energy": {
+            "quantity": "energy",
+            "read_from": filename,
+            "file_format": ".xyz",
+            "key": "energy",
+            "unit": "eV",
+            "forces": {"read_from": filename, "file_format": ".xyz", "key": "forces"},
+            "stress": False,
+            "virial": False,
+        }
+    }
+    targets, target_info = read_targets(OmegaConf.create(conf), dtype=dtype)
+
+    return systems, targets, target_info
+
+
+def _assert_tensor_map_equal(actual: TensorMap, expected: TensorMap):
+    assert actual.keys == expected.keys
+    actual_block = actual.block()
+    expected_block = expected.block()
+
+    torch.testing.assert_close(actual_block.values, expected_block.values)
+    assert actual_block.samples == expected_block.samples
+    assert actual_block.properties == expected_block.properties
+    assert actual_block.gradients_list() == expected_block.gradients_list()
+
+    for parameter, expected_gradient in expected_block.gradients():
+        actual_gradient = actual_block.gradient(parameter)
+        torch.testing.assert_close(actual_gradient.values, expected_gradient.values)
+        assert actual_gradient.samples == expected_gradient.samples
+        assert actual_gradient.components == expected_gradient.components
+        assert actual_gradient.properties == expected_gradient.properties
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_roundtrip(monkeypatch, tmp_path, dtype):
+    monkeypatch.chdir(tmp_path)
+
+    systems, targets, target_info = _read_ethanol()
+    write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+
+    dataset = DiskDataset("dataset.mtmd", dtype=dtype)
+    expected_dataset = Dataset({"system": systems, **targets})
+
+    assert len(dataset) == len(expected_dataset)
+    assert dataset.target_info == target_info
+
+    for sample, expected_sample in zip(dataset, expected_dataset):
+        assert sample.keys() == expected_sample.keys()
+
+        system = sample["system"]
+        expected_system = expected_sample["system"]
+        assert system.positions.dtype == dtype
+        torch.testing.assert_close(
+            system.positions, expected_system.positions.to(dtype)
+        )
+        torch.testing.assert_close(system.cell, expected_system.cell.to(dtype))
+        torch.testing.assert_close(system.types, expected_system.types)
+
+        expected_energy = expected_sample["energy"].to(dtype=dtype)
+        _assert_tensor_map_equal(sample["energy"], expected_energy)
+
+
+def test_strain_gradients(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    filename = str(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    systems = read_systems(filename, dtype=torch.float64)
+    conf = {
+        "energy": {
+            "quantity": "energy",
+            "read_from": filename,
+            "file_format": ".xyz",
+            "key": "energy",
+            "unit": "eV",
+            "forces": {"read_from": filename, "file_format": ".xyz", "key": "force"},
+            "stress": {"read_from": filename, "file_format": ".xyz", "key": "stress"},
+            "virial": False,
+        }
+    }
+    targets, target_info = read_targets(OmegaConf.create(conf), dtype=torch.float64)
+
+    write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+    dataset = DiskDataset("dataset.mtmd", dtype=torch.float64)
+
+    for i, sample in enumerate(dataset):
+        _assert_tensor_map_equal(sample["energy"], targets["energy"][i])
+
+
+def _per_atom_targets(systems):
+    properties = Labels(["charge", "order"], torch.tensor([[0, 1], [0, 2]]))
+    return [
+        TensorMap(
+            keys=Labels(["_"], torch.tensor([[0]])),
+            blocks=[
+                TensorBlock(
+                    values=torch.rand(len(system), 2, dtype=torch.float64),
+                    samples=Labels(
+                        ["system", "atom"],
+                        torch.tensor([[i, j] for j in range(len(system))]),
+                    ),
+                    components=[],
+                    properties=properties,
+                )
+            ],
+        )
+        for i, system in enumerate(systems)
+    ]
+
+
+def test_per_atom_targets(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    systems, _, _ = _read_ethanol()
+    targets = {"charges": _per_atom_targets(systems)}
+    target_info = TargetInfoDict(charges=TargetInfo(quantity="charge", per_atom=True))
+
+    write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+    dataset = DiskDataset("dataset.mtmd", dtype=torch.float64)
+
+    assert dataset.target_info == target_info
+    for i, sample in enumerate(dataset):
+        _assert_tensor_map_equal(sample["charges"], targets["charges"][i])
+
+
+def test_per_atom_gradients_error(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    systems, _, _ = _read_ethanol()
+    targets = {"charges": _per_atom_targets(systems)}
+    target_info = TargetInfoDict(
+        charges=TargetInfo(quantity="charge", per_atom=True, gradients={"positions"})
+    )
+
+    with pytest.raises(ValueError, match="per-atom target with gradients"):
+        write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+
+
+def test_wrong_samples_error(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    systems, _, _ = _read_ethanol()
+    targets = {"charges": _per_atom_targets(systems)}
+    target_info = TargetInfoDict(charges=TargetInfo(quantity="charge"))
+
+    with pytest.raises(ValueError, match="were expected for a per-structure target"):
+        write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+
+
+def test_collate(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    systems, targets, target_info = _read_ethanol()
+    write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+    dataset = DiskDataset("dataset.mtmd")
+
+    dataloader = torch.utils.data.DataLoader(
+        dataset, batch_size=10, collate_fn=collate_fn
+    )
+    for systems, targets in dataloader:
+        assert len(systems) == 10
+        assert targets["energy"].block().values.shape == (10, 1)
+
+
+def test_subset(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    systems, targets, target_info = _read_ethanol()
+    write_disk_dataset("dataset.mtmd", systems, targets, target_info)
+    dataset = DiskDataset("dataset.mtmd")
+
+    subset = torch.utils.data.Subset(dataset, [3, 5])
+    assert len(subset) == 2
+    assert subset[1]["energy"].block().samples == Labels(
+        ["system"], torch.tensor([[5]])
+    )
+    assert dataset[-1]["energy"].block().samples == Labels(
+        ["system"], torch.tensor([[len(dataset) - 1]])
+    )
+
+    with pytest.raises(IndexError, match="out of range"):
+        dataset[len(dataset)]
+
+
+def test_no_targets(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    systems, _, _ = _read_ethanol()
+    write_disk_dataset("dataset.mtmd", systems, {}, TargetInfoDict())
+    dataset = DiskDataset("dataset.mtmd")
+
+    assert len(dataset.target_info) == 0
+    assert list(dataset[0].keys()) == ["system"]
+
+
+def test_not_a_dataset(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    with open("dataset.mtmd", "w") as file:
+        file.write("foo")
+
+    with pytest.raises(ValueError, match="is not a preprocessed dataset"):
+        DiskDataset("dataset.mtmd")
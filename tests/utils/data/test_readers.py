@@ -13,6 +13,7 @@ from targets.test_targets_ase import ase_system, ase_systems
 
 from metatensor.models.utils.data.dataset import TargetInfo, TargetInfoDict
 from metatensor.models.utils.data.readers import (
+    cache,
     read_energy,
     read_forces,
     read_stress,
@@ -45,6 +46,53 @@ def test_read_systems(fileformat, monkeypatch, tmp_path):
         )
 
 
+def test_read_file_once(monkeypatch, tmp_path):
+    """Systems and all targets of a file are parsed by ase only once."""
+    monkeypatch.chdir(tmp_path)
+
+    filename = "systems.xyz"
+    ase.io.write(filename, ase_systems())
+
+    n_calls = 0
+    ase_read = ase.io.read
+
+    def counting_read(*args, **kwargs):
+        nonlocal n_calls
+        n_calls += 1
+        return ase_read(*args, **kwargs)
+
+    monkeypatch.setattr(cache.ase.io, "read", counting_read)
+    cache.clear_cache()
+
+    energy_section = {
+        "quantity": "energy",
+        "read_from": filename,
+        "file_format": ".xyz",
+        "key": "true_energy",
+        "unit": "eV",
+        "forces": {"read_from": filename, "file_format": ".xyz", "key": "forces"},
+        "stress": STRESS_VIRIAL_DICT,
+        "virial": False,
+    }
+
+    read_systems(filename)
+    read_targets(OmegaConf.create({"energy": energy_section}))
+    assert n_calls == 1
+
+    # changing the file invalidates the cache
+    systems = ase_systems()
+    systems[0].info["true_energy"] = 1.0
+    ase.io.write(filename, systems)
+
+    results = read_energy(filename, target_value="true_energy")
+    assert n_calls == 2
+    assert results[0].values == torch.tensor([[1.0]])
+
+    cache.clear_cache()
+    read_systems(filename)
+    assert n_calls == 3
+
+
 def test_read_systems_unknown_fileformat():
     with pytest.raises(ValueError, match="fileformat '.bar' is not supported"):
         read_systems("foo.bar")
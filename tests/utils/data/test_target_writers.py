@@ -1,12 +1,19 @@
+import os
 from typing import List
 
 import ase.io
+import numpy as np
 import pytest
 import torch
 from metatensor.torch import Labels, TensorBlock, TensorMap
 from metatensor.torch.atomistic import ModelCapabilities, ModelOutput, System
 
-from metatensor.models.utils.data.writers import write_predictions, write_xyz
+from metatensor.models.utils.data.writers import (
+    get_predictions_writer,
+    write_npz,
+    write_predictions,
+    write_xyz,
+)
 
 
 def systems_capabilities_predictions(cell: torch.tensor = None) -> List[System]:
@@ -128,3 +135,94 @@ def test_write_predictions(fileformat, cell, monkeypatch, tmp_path):
 def test_write_predictions_unknown_fileformat():
     with pytest.raises(ValueError, match="fileformat '.bar' is not supported"):
         write_predictions("foo.bar", systems=None, capabilities=None, predictions=None)
+
+
+@pytest.mark.parametrize("cell", (None, torch.eye(3)))
+def test_predictions_writer(cell, monkeypatch, tmp_path):
+    """Writing batch by batch gives the same file as writing all predictions."""
+    monkeypatch.chdir(tmp_path)
+
+    systems, capabilities, predictions = systems_capabilities_predictions(cell=cell)
+
+    write_predictions("expected.xyz", systems, capabilities, predictions)
+
+    writer = get_predictions_writer("batched.xyz", capabilities)
+    for _ in range(3):
+        writer.write(systems, predictions)
+    writer.finish()
+
+    expected_frames = ase.io.read("expected.xyz", index=":")
+    frames = ase.io.read("batched.xyz", index=":")
+    assert len(frames) == 3 * len(systems)
+    for i, frame in enumerate(frames):
+        expected = expected_frames[i % len(systems)]
+        assert frame.info["energy"] == expected.info["energy"]
+        assert (frame.arrays["forces"] == expected.arrays["forces"]).all()
+        if cell is not None:
+            assert (frame.info["stress"] == expected.info["stress"]).all()
+
+
+def test_predictions_writer_unknown_fileformat():
+    with pytest.raises(ValueError, match="fileformat '.bar' is not supported"):
+        get_predictions_writer("foo.bar", capabilities=None)
+
+
+@pytest.mark.parametrize("cell", (None, torch.eye(3)))
+def test_write_npz(cell, monkeypatch, tmp_path):
+    """The npz file contains the same predictions as the xyz file."""
+    monkeypatch.chdir(tmp_path)
+
+    systems, capabilities, predictions = systems_capabilities_predictions(cell=cell)
+
+    write_xyz("expected.xyz", systems, capabilities, predictions)
+    write_npz("test_output.npz", systems, capabilities, predictions)
+
+    frames = ase.io.read("expected.xyz", index=":")
+    arrays = np.load("test_output.npz")
+
+    np.testing.assert_equal(arrays["atoms_offsets"], [0, 2, 4])
+    np.testing.assert_allclose(
+        arrays["positions"], np.concatenate([f.positions for f in frames])
+    )
+    np.testing.assert_equal(arrays["types"], [1, 1, 1, 1])
+    np.testing.assert_allclose(
+        arrays["energy"], [frame.info["energy"] for frame in frames]
+    )
+    np.testing.assert_allclose(
+        arrays["forces"], np.concatenate([f.arrays["forces"] for f in frames])
+    )
+    if cell is not None:
+        np.testing.assert_allclose(
+            arrays["stress"], np.stack([f.info["stress"] for f in frames])
+        )
+        np.testing.assert_allclose(
+            arrays["virial"], np.stack([f.info["virial"] for f in frames])
+        )
+
+
+def test_npz_writer(monkeypatch, tmp_path):
+    """Writing batch by batch gives the same arrays as writing all predictions."""
+    monkeypatch.chdir(tmp_path)
+
+    systems, capabilities, predictions = systems_capabilities_predictions()
+
+    write_predictions("expected.npz", systems, capabilities, predictions)
+
+    writer = get_predictions_writer("batched.npz", capabilities)
+    for i in range(3):
+        writer.write(systems, predictions)
+        # the arrays written so far can be read before the file is finished
+        partial = np.load(os.path.join(writer.directory, "energy.npy"))
+        assert partial.shape == ((i + 1) * len(systems),)
+    writer.finish()
+
+    # the temporary files are removed
+    assert sorted(os.listdir(".")) == ["batched.npz", "expected.npz"]
+
+    expected = np.load("expected.npz")
+    arrays = np.load("batched.npz")
+    np.testing.assert_equal(arrays["atoms_offsets"], [0, 2, 4, 6, 8, 10, 12])
+    for name in ["positions", "types", "cells", "energy", "forces"]:
+        np.testing.assert_equal(
+            arrays[name], np.concatenate(3 * [expected[name]], axis=0)
+        )
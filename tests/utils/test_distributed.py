@@ -0,0 +1,210 @@
+from functools import partial
+
+import metatensor.torch
+import pytest
+import torch
+from metatensor.torch import Labels, TensorBlock, TensorMap
+from metatensor.torch.atomistic import NeighborListOptions
+
+from metatensor.models.utils.data import CombinedDataLoader, Dataset
+from metatensor.models.utils.data.readers.systems import read_systems_ase
+from metatensor.models.utils.distributed import (
+    average_gradients,
+    broadcast_parameters,
+    get_rank,
+    get_world_size,
+    is_distributed,
+    iterate_in_lockstep,
+    run_distributed,
+    shard_dataset,
+    sum_over_processes,
+)
+from metatensor.models.utils.metrics import RMSEAccumulator
+from metatensor.models.utils.neighbor_lists import get_system_with_neighbor_lists
+
+from . import RESOURCES_PATH
+
+
+def test_not_distributed():
+    """Without process group, all functions act on the current process only."""
+    assert not is_distributed()
+    assert get_rank() == 0
+    assert get_world_size() == 1
+    assert sum_over_processes(1.5) == 1.5
+
+    dataset = list(range(10))
+    assert list(shard_dataset(dataset)) == dataset
+
+    model = torch.nn.Linear(2, 1)
+    model(torch.ones(1, 2)).sum().backward()
+    gradients = [parameter.grad.clone() for parameter in model.parameters()]
+    average_gradients(model)
+    for parameter, gradient in zip(model.parameters(), gradients):
+        assert torch.equal(parameter.grad, gradient)
+
+
+def test_run_distributed_single_process():
+    calls = []
+    run_distributed(lambda: calls.append(is_distributed()), num_processes=1)
+    assert calls == [False]
+
+
+def _distributed_checks(tmp_path):
+    rank = get_rank()
+    world_size = get_world_size()
+
+    # sharding
+    dataset = list(range(10))
+    shard = list(shard_dataset(dataset))
+    assert shard == dataset[rank::world_size]
+
+    # shards are padded with the first samples to the same size
+    dataset = list(range(11))
+    assert list(shard_dataset(dataset)) == (dataset + [0])[rank::world_size]
+    assert list(shard_dataset(dataset, pad=False)) == dataset[rank::world_size]
+
+    # gradients are averaged, also for parameters without gradients
+    model = torch.nn.Sequential(torch.nn.Linear(2, 1), torch.nn.Linear(2, 1))
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.fill_(1.0)
+    if rank == 0:
+        model[0](torch.full((1, 2), 3.0)).sum().backward()
+    else:
+        model[1](torch.full((1, 2), 5.0)).sum().backward()
+    average_gradients(model)
+    torch.testing.assert_close(model[0].weight.grad, torch.full((1, 2), 1.5))
+    torch.testing.assert_close(model[1].weight.grad, torch.full((1, 2), 2.5))
+
+    # all processes do the same number of steps
+    dataloader = CombinedDataLoader(
+        [torch.utils.data.DataLoader(list(range(4 + rank)), batch_size=1)],
+        shuffle=False,
+    )
+    for _ in range(2):
+        batches = [int(batch) for batch in iterate_in_lockstep(dataloader)]
+        # the process with fewer batches starts again from its first batch
+        expected = [0, 1, 2, 3, 0] if rank == 0 else [0, 1, 2, 3, 4]
+        assert batches == expected
+
+    # the errors are combined even if some targets were not seen by all processes
+    accumulator = RMSEAccumulator()
+    accumulator.information = {"energy": (4.0, 2)}
+    if rank == 1:
+        accumulator.information["dipole"] = (9.0, 1)
+    assert accumulator.finalize(not_per_atom=[], is_distributed=True) == {
+        "energy RMSE (per atom)": 2.0**0.5,
+        "dipole RMSE (per atom)": 3.0,
+    }
+
+    total = sum_over_processes(float(rank + 1))
+    (tmp_path / f"rank_{rank}.txt").write_text(f"{world_size} {total}")
+
+
+def test_shard_dataset_too_small():
+    with pytest.raises(ValueError, match="can not be split between 2 processes"):
+        run_distributed(partial(shard_dataset, [0]), num_processes=2)
+
+
+def _fail_in_worker():
+    if get_rank() == 1:
+        raise ValueError("failure in a worker")
+    # wait for the other process, which fails
+    torch.distributed.barrier()
+
+
+def test_run_distributed_worker_error():
+    with pytest.raises(RuntimeError):
+        run_distributed(_fail_in_worker, num_processes=2)
+    assert not is_distributed()
+
+
+def test_run_distributed(tmp_path):
+    run_distributed(partial(_distributed_checks, tmp_path), num_processes=2)
+
+    assert not is_distributed()
+    assert (tmp_path / "rank_0.txt").read_text() == "2 3.0"
+    assert (tmp_path / "rank_1.txt").read_text() == "2 3.0"
+
+
+def _get_dataset():
+    systems = read_systems_ase(RESOURCES_PATH / "qm9_reduced_100.xyz")[:3]
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+    systems = [get_system_with_neighbor_lists(system, [options]) for system in systems]
+    systems = [system.to(torch.float32) for system in systems]
+
+    block = TensorBlock(
+        values=torch.tensor([[1.0]], dtype=torch.float32),
+        samples=Labels.single(),
+        components=[],
+        properties=Labels("energy", torch.tensor([[0]])),
+    )
+    block.add_gradient(
+        "positions",
+        TensorBlock(
+            values=torch.ones(1, 3, 1, dtype=torch.float32),
+            samples=Labels(["sample", "atom"], torch.tensor([[0, 0]])),
+            components=[Labels.range("xyz", 3)],
+            properties=block.properties,
+        ),
+    )
+    energy = TensorMap(keys=Labels.single(), blocks=[block])
+    return Dataset({"system": systems, "energy": [energy] * len(systems)})
+
+
+def _check_dataset(dataset, tmp_path):
+    reference = _get_dataset()
+    assert len(dataset) == len(reference)
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+    for sample, expected in zip(dataset, reference):
+        system = sample["system"]
+        assert system.positions.dtype == torch.float32
+        torch.testing.assert_close(system.positions, expected["system"].positions)
+        torch.testing.assert_close(system.cell, expected["system"].cell)
+        assert torch.equal(system.types, expected["system"].types)
+        assert metatensor.torch.equal_block(
+            system.get_neighbor_list(options),
+            expected["system"].get_neighbor_list(options),
+        )
+        assert metatensor.torch.equal(sample["energy"], expected["energy"])
+
+    (tmp_path / f"rank_{get_rank()}.txt").write_text("ok")
+
+
+def test_run_distributed_dataset(tmp_path):
+    """Systems and tensor maps can be sent to the other processes."""
+    dataset = _get_dataset()
+    run_distributed(
+        partial(_check_dataset, dataset, tmp_path),
+        num_processes=2,
+        worker_function=partial(_check_dataset, dataset, tmp_path),
+    )
+
+    assert (tmp_path / "rank_0.txt").read_text() == "ok"
+    assert (tmp_path / "rank_1.txt").read_text() == "ok"
+
+
+def _check_broadcast(tmp_path):
+    torch.manual_seed(get_rank())
+    model = torch.nn.Linear(2, 1)
+    broadcast_parameters(model)
+
+    torch.manual_seed(0)
+    expected = torch.nn.Linear(2, 1)
+    torch.testing.assert_close(model.weight, expected.weight)
+    torch.testing.assert_close(model.bias, expected.bias)
+
+    (tmp_path / f"rank_{get_rank()}.txt").write_text("ok")
+
+
+def test_broadcast_parameters(tmp_path):
+    model = torch.nn.Linear(2, 1)
+    parameters = [parameter.clone() for parameter in model.parameters()]
+    broadcast_parameters(model)
+    for parameter, expected in zip(model.parameters(), parameters):
+        assert torch.equal(parameter, expected)
+
+    run_distributed(partial(_check_broadcast, tmp_path), num_processes=2)
+
+    assert (tmp_path / "rank_0.txt").read_text() == "ok"
+    assert (tmp_path / "rank_1.txt").read_text() == "ok"
@@ -1,10 +1,16 @@
 import pytest
 import torch
+from metatensor.torch import Labels
 from metatensor.torch.atomistic import ModelCapabilities
 
 from metatensor.models.experimental.soap_bpnn import __model__
 from metatensor.models.utils.data import DatasetInfo, TargetInfo, read_systems
-from metatensor.models.utils.evaluate_model import evaluate_model
+from metatensor.models.utils.evaluate_model import (
+    _position_gradients_samples,
+    _position_gradients_to_block,
+    _strain_gradients_to_block,
+    evaluate_model,
+)
 from metatensor.models.utils.export import export
 from metatensor.models.utils.neighbor_lists import get_system_with_neighbor_lists
 
@@ -63,3 +69,114 @@ def test_evaluate_model(training, exported):
     else:
         assert not outputs["energy"].block().gradient("positions").values.requires_grad
         assert not outputs["energy"].block().gradient("strain").values.requires_grad
+
+
+def test_evaluate_model_batched_strain():
+    """The gradients of a batch are the same as the ones of the individual systems."""
+
+    systems = read_systems(
+        RESOURCES_PATH / "alchemical_reduced_10.xyz", dtype=torch.get_default_dtype()
+    )[:3]
+
+    atomic_types = set(
+        torch.unique(torch.concatenate([system.types for system in systems]))
+    )
+
+    targets = {
+        "energy": TargetInfo(quantity="energy", gradients=["positions", "strain"])
+    }
+
+    dataset_info = DatasetInfo(
+        length_unit="angstrom", atomic_types=atomic_types, targets=targets
+    )
+    model = __model__(model_hypers=MODEL_HYPERS, dataset_info=dataset_info)
+
+    outputs = evaluate_model(model, systems, targets, is_training=False)
+    block = outputs["energy"].block()
+
+    # the original systems are not modified
+    assert not any(system.positions.requires_grad for system in systems)
+
+    positions_gradients = block.gradient("positions").values
+    strain_gradients = block.gradient("strain").values
+    assert strain_gradients.shape == (len(systems), 3, 3, 1)
+
+    atoms_offset = 0
+    for i_system, system in enumerate(systems):
+        single_outputs = evaluate_model(model, [system], targets, is_training=False)
+        single_block = single_outputs["energy"].block()
+        torch.testing.assert_close(
+            single_block.gradient("strain").values[0], strain_gradients[i_system]
+        )
+        torch.testing.assert_close(
+            single_block.gradient("positions").values,
+            positions_gradients[atoms_offset : atoms_offset + len(system)],
+        )
+        atoms_offset += len(system)
+
+
+def test_evaluate_model_multiple_energies():
+    """The gradients of several energies, computed together, are the same as the ones
+    computed for each energy alone."""
+
+    systems = read_systems(
+        RESOURCES_PATH / "alchemical_reduced_10.xyz", dtype=torch.get_default_dtype()
+    )[:2]
+
+    atomic_types = set(
+        torch.unique(torch.concatenate([system.types for system in systems]))
+    )
+
+    targets = {
+        "energy": TargetInfo(quantity="energy", gradients=["positions", "strain"]),
+        "mtm::energy": TargetInfo(quantity="energy", gradients=["positions"]),
+        "mtm::free_energy": TargetInfo(quantity="energy", gradients=["strain"]),
+    }
+
+    dataset_info = DatasetInfo(
+        length_unit="angstrom", atomic_types=atomic_types, targets=targets
+    )
+    model = __model__(model_hypers=MODEL_HYPERS, dataset_info=dataset_info)
+
+    outputs = evaluate_model(model, systems, targets, is_training=False)
+
+    for target_name, target_info in targets.items():
+        single_outputs = evaluate_model(
+            model, systems, {target_name: target_info}, is_training=False
+        )
+        block = outputs[target_name].block()
+        single_block = single_outputs[target_name].block()
+
+        assert block.gradients_list() == single_block.gradients_list()
+        for gradient_name in target_info.gradients:
+            torch.testing.assert_close(
+                block.gradient(gradient_name).values,
+                single_block.gradient(gradient_name).values,
+            )
+
+
+def test_gradients_to_block():
+    """The metadata of the gradient blocks refers to the systems and their atoms, and
+    is reused for batches with the same number of atoms."""
+    gradients = [torch.rand(2, 3), torch.rand(3, 3), torch.rand(1, 3)]
+    block = _position_gradients_to_block(gradients)
+
+    expected_samples = Labels(
+        names=["sample", "atom"],
+        values=torch.tensor([[0, 0], [0, 1], [1, 0], [1, 1], [1, 2], [2, 0]]),
+    )
+    assert block.samples == expected_samples
+    assert block.components == [Labels.range("xyz", 3)]
+    assert block.properties == Labels("energy", torch.tensor([[0]]))
+    torch.testing.assert_close(block.values, torch.cat(gradients).unsqueeze(-1))
+
+    hits = _position_gradients_samples.cache_info().hits
+    other_block = _position_gradients_to_block([torch.rand(2, 3), *gradients[1:]])
+    assert other_block.samples == expected_samples
+    assert _position_gradients_samples.cache_info().hits == hits + 1
+
+    strain_gradients = torch.rand(3, 3, 3)
+    block = _strain_gradients_to_block(strain_gradients)
+    assert block.samples == Labels.range("sample", 3)
+    assert block.components == [Labels.range("xyz_1", 3), Labels.range("xyz_2", 3)]
+    torch.testing.assert_close(block.values, strain_gradients.unsqueeze(-1))
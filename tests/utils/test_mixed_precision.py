@@ -0,0 +1,86 @@
+import pytest
+import torch
+
+from metatensor.models.utils.mixed_precision import (
+    autocast_linear_layers,
+    get_mixed_precision_dtype,
+)
+
+
+def _model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Linear(4, 8), torch.nn.SiLU(), torch.nn.Linear(8, 1)
+    )
+
+
+def test_get_mixed_precision_dtype():
+    cpu = torch.device("cpu")
+    assert get_mixed_precision_dtype(None, cpu) is None
+    assert get_mixed_precision_dtype("bfloat16", cpu) == torch.bfloat16
+    assert get_mixed_precision_dtype("float16", torch.device("cuda")) == torch.float16
+
+
+def test_get_mixed_precision_dtype_errors():
+    cpu = torch.device("cpu")
+    with pytest.raises(ValueError, match="Unknown mixed precision dtype 'float8'"):
+        get_mixed_precision_dtype("float8", cpu)
+    with pytest.raises(ValueError, match="only supported on CUDA devices"):
+        get_mixed_precision_dtype("float16", cpu)
+
+
+def test_autocast_linear_layers():
+    """Linear layers run in bfloat16, but inputs, outputs and weights stay in float32"""
+    model = _model()
+    inputs = torch.rand(10, 4, requires_grad=True)
+    expected = model(inputs)
+
+    with autocast_linear_layers(model, torch.bfloat16):
+        outputs = model(inputs)
+        assert model[0](inputs).dtype == torch.float32
+
+    assert outputs.dtype == torch.float32
+    torch.testing.assert_close(outputs, expected, rtol=5e-2, atol=5e-2)
+    assert not torch.equal(outputs, expected)
+
+    outputs.sum().backward()
+    for parameter in model.parameters():
+        assert parameter.dtype == torch.float32
+        assert parameter.grad.dtype == torch.float32
+    assert inputs.grad.dtype == torch.float32
+
+    # the layers are restored after the context
+    assert len(model[0]._forward_pre_hooks) == 0
+    assert len(model[0]._forward_hooks) == 0
+    assert torch.equal(model(inputs), expected)
+
+
+def test_autocast_linear_layers_disabled():
+    model = _model()
+    inputs = torch.rand(10, 4)
+    expected = model(inputs)
+
+    with autocast_linear_layers(model, None):
+        assert len(model[0]._forward_hooks) == 0
+        assert torch.equal(model(inputs), expected)
+
+
+def test_autocast_linear_layers_float64():
+    """autocast does not lower the precision of float64 layers"""
+    model = _model().to(torch.float64)
+
+    message = "Mixed precision requires a model in float32, but the model uses"
+    with pytest.raises(ValueError, match=message):
+        with autocast_linear_layers(model, torch.bfloat16):
+            pass
+
+
+def test_autocast_linear_layers_error():
+    """autocast is disabled after a layer raised an error"""
+    model = _model()
+
+    with pytest.raises(RuntimeError):
+        with autocast_linear_layers(model, torch.bfloat16):
+            model(torch.rand(10, 3))
+
+    assert not torch.is_autocast_cpu_enabled()
@@ -1,15 +1,32 @@
+import time
 from pathlib import Path
 
-from metatensor.torch.atomistic import NeighborListOptions
+import ase
+import ase.neighborlist
+import metatensor.torch
+import numpy as np
+import pytest
+import torch
+from metatensor.torch.atomistic import NeighborListOptions, System
 
+from metatensor.models.utils import neighbor_lists
+from metatensor.models.utils.data import Dataset
 from metatensor.models.utils.data.readers.systems import read_systems_ase
-from metatensor.models.utils.neighbor_lists import get_system_with_neighbor_lists
+from metatensor.models.utils.data.system_to_ase import system_to_ase
+from metatensor.models.utils.neighbor_lists import (
+    VerletNeighborLists,
+    get_datasets_with_neighbor_lists,
+    get_system_with_neighbor_lists,
+    get_systems_with_neighbor_lists,
+    set_neighbor_list_cache,
+)
 
 
 RESOURCES_PATH = Path(__file__).parents[1] / "resources"
 
 
-def test_attach_neighbor_lists():
+@pytest.mark.parametrize("backend", ["ase", "torch"])
+def test_attach_neighbor_lists(backend):
     filename = RESOURCES_PATH / "qm9_reduced_100.xyz"
     systems = read_systems_ase(filename)
 
@@ -19,7 +36,9 @@ def test_attach_neighbor_lists():
         NeighborListOptions(cutoff=6.0, full_list=True),
     ]
 
-    new_system = get_system_with_neighbor_lists(systems[0], requested_neighbor_lists)
+    new_system = get_system_with_neighbor_lists(
+        systems[0], requested_neighbor_lists, backend=backend
+    )
 
     assert requested_neighbor_lists[0] in new_system.known_neighbor_lists()
     assert requested_neighbor_lists[1] in new_system.known_neighbor_lists()
@@ -38,3 +57,362 @@ def test_attach_neighbor_lists():
             "cell_shift_c",
         ]
         assert len(nl.values.shape) == 3
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    set_neighbor_list_cache(tmp_path / "cache")
+    yield tmp_path / "cache"
+    set_neighbor_list_cache(None)
+
+
+def test_neighbor_list_cache(cache_dir, monkeypatch):
+    filename = RESOURCES_PATH / "carbon_reduced_20.xyz"
+    systems = read_systems_ase(filename)
+
+    requested_neighbor_lists = [
+        NeighborListOptions(cutoff=4.0, full_list=True),
+        NeighborListOptions(cutoff=4.0, full_list=False),
+    ]
+
+    expected = [
+        get_system_with_neighbor_lists(system, requested_neighbor_lists)
+        for system in systems
+    ]
+    assert len(list(cache_dir.glob("*/*.npz"))) == 2 * len(systems)
+
+    # all neighbor lists must now be read from the cache
+    def raise_error(*args, **kwargs):
+        raise AssertionError("neighbor list was not read from the cache")
+
+    monkeypatch.setattr(neighbor_lists, "_compute_single_neighbor_list", raise_error)
+
+    for system, expected_system in zip(read_systems_ase(filename), expected):
+        system = get_system_with_neighbor_lists(system, requested_neighbor_lists)
+        for options in requested_neighbor_lists:
+            assert metatensor.torch.equal_block(
+                system.get_neighbor_list(options),
+                expected_system.get_neighbor_list(options),
+            )
+
+
+def test_neighbor_list_cache_changed_system(cache_dir):
+    filename = RESOURCES_PATH / "carbon_reduced_20.xyz"
+    system = read_systems_ase(filename)[0]
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+
+    get_system_with_neighbor_lists(system, [options])
+
+    system = read_systems_ase(filename)[0]
+    system.positions[0] += 0.5
+    get_system_with_neighbor_lists(system, [options])
+
+    assert len(list(cache_dir.glob("*/*.npz"))) == 2
+
+
+def test_neighbor_list_cache_broken_entry(cache_dir):
+    filename = RESOURCES_PATH / "carbon_reduced_20.xyz"
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+
+    expected = get_system_with_neighbor_lists(read_systems_ase(filename)[0], [options])
+
+    (path,) = cache_dir.glob("*/*.npz")
+    path.write_bytes(b"not a neighbor list")
+
+    system = get_system_with_neighbor_lists(read_systems_ase(filename)[0], [options])
+    assert metatensor.torch.equal_block(
+        system.get_neighbor_list(options), expected.get_neighbor_list(options)
+    )
+
+
+def _reference_selection(atoms, cutoff):
+    # pair selection of a half neighbor list written as a loop over all pairs
+    nl_i, nl_j, nl_S = ase.neighborlist.neighbor_list("ijS", atoms, cutoff=cutoff)
+
+    selected = []
+    for pair_i, (i, j, S) in enumerate(zip(nl_i, nl_j, nl_S)):
+        if j < i:
+            continue
+        elif i == j:
+            if S[0] == 0 and S[1] == 0 and S[2] == 0:
+                continue
+            elif S[0] + S[1] + S[2] < 0 or (
+                (S[0] + S[1] + S[2] == 0) and (S[2] < 0 or (S[2] == 0 and S[1] < 0))
+            ):
+                continue
+
+        selected.append(pair_i)
+
+    return np.hstack([nl_i[:, None], nl_j[:, None], nl_S])[selected]
+
+
+@pytest.mark.parametrize("full_list", [True, False])
+@pytest.mark.parametrize("cutoff", [2.0, 5.0, 9.0])
+def test_pair_selection(full_list, cutoff):
+    """Test the selected pairs for cutoffs smaller and larger than the cell."""
+    systems = read_systems_ase(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    options = NeighborListOptions(cutoff=cutoff, full_list=full_list)
+
+    for system in systems[:3]:
+        atoms = system_to_ase(system)
+        neighbor_list = neighbor_lists._compute_single_neighbor_list(atoms, options)
+
+        expected = _reference_selection(atoms, cutoff)
+        if full_list:
+            reversed_pairs = np.hstack(
+                [expected[:, 1:2], expected[:, 0:1], -expected[:, 2:]]
+            )
+            expected = np.vstack([expected, reversed_pairs])
+
+        np.testing.assert_equal(neighbor_list.samples.values.numpy(), expected)
+
+
+@pytest.mark.parametrize("n_repeat", [2, 4, 6])
+def test_neighbor_list_performance(n_repeat, record_property):
+    """Benchmark the neighbor list construction of periodic silicon cells.
+
+    The number of pairs per second is stored as a property of the test and can be
+    inspected for example with ``pytest --junit-xml``.
+    """
+    # diamond structure of silicon, repeated `n_repeat` times in every direction
+    basis = np.array(
+        [
+            [0.0, 0.0, 0.0],
+            [0.0, 0.5, 0.5],
+            [0.5, 0.0, 0.5],
+            [0.5, 0.5, 0.0],
+            [0.25, 0.25, 0.25],
+            [0.25, 0.75, 0.75],
+            [0.75, 0.25, 0.75],
+            [0.75, 0.75, 0.25],
+        ]
+    )
+    translations = np.stack(
+        np.meshgrid(*(3 * [np.arange(n_repeat)]), indexing="ij"), axis=-1
+    ).reshape(-1, 1, 3)
+    positions = 5.43 * (basis + translations).reshape(-1, 3)
+    atoms = ase.Atoms(
+        numbers=np.full(len(positions), 14),
+        positions=positions,
+        cell=3 * [5.43 * n_repeat],
+        pbc=True,
+    )
+    options = NeighborListOptions(cutoff=6.0, full_list=True)
+
+    start = time.perf_counter()
+    neighbor_list = neighbor_lists._compute_single_neighbor_list(atoms, options)
+    elapsed = time.perf_counter() - start
+
+    n_pairs = len(neighbor_list.samples)
+    assert n_pairs > 0
+
+    record_property("n_atoms", len(atoms))
+    record_property("pairs_per_second", n_pairs / elapsed)
+
+
+def _sorted_pairs(neighbor_list):
+    samples = neighbor_list.samples.values.numpy()
+    order = np.lexsort(samples.T[::-1])
+    return samples[order], neighbor_list.values.numpy()[order]
+
+
+def _random_systems(cell):
+    generator = torch.Generator().manual_seed(0)
+    systems = []
+    for n_atoms in [0, 1, 15, 40]:
+        # some atoms are placed outside of the unit cell
+        positions = 10 * torch.rand(n_atoms, 3, generator=generator) - 2
+        systems.append(
+            System(
+                types=torch.full((n_atoms,), 6, dtype=torch.int32),
+                positions=positions.to(torch.float64),
+                cell=cell,
+            )
+        )
+    return systems
+
+
+TRICLINIC_CELL = torch.tensor(
+    [[4.0, 0.0, 0.0], [1.5, 3.8, 0.0], [0.7, -0.9, 4.3]], dtype=torch.float64
+)
+
+
+@pytest.mark.parametrize(
+    "cell",
+    [
+        TRICLINIC_CELL,
+        TRICLINIC_CELL * torch.tensor([[1.0], [1.0], [0.0]], dtype=torch.float64),
+        TRICLINIC_CELL * torch.tensor([[0.0], [1.0], [0.0]], dtype=torch.float64),
+        torch.zeros(3, 3, dtype=torch.float64),
+    ],
+    ids=["periodic", "slab", "wire", "non-periodic"],
+)
+@pytest.mark.parametrize("full_list", [True, False])
+@pytest.mark.parametrize("cutoff", [2.5, 6.0])
+def test_torch_backend(cell, full_list, cutoff):
+    """Test that both backends find the same pairs and distances."""
+    systems = _random_systems(cell)
+    systems += read_systems_ase(
+        RESOURCES_PATH / "carbon_reduced_20.xyz", dtype=torch.float64
+    )[:3]
+    options = NeighborListOptions(cutoff=cutoff, full_list=full_list)
+
+    systems = get_systems_with_neighbor_lists(systems, [options], backend="torch")
+
+    for system in systems:
+        actual = system.get_neighbor_list(options)
+        expected = neighbor_lists._compute_single_neighbor_list(
+            system_to_ase(system), options
+        )
+
+        assert actual.samples.names == expected.samples.names
+        assert actual.components == expected.components
+        assert actual.properties == expected.properties
+
+        actual_samples, actual_distances = _sorted_pairs(actual)
+        expected_samples, expected_distances = _sorted_pairs(expected)
+        np.testing.assert_equal(actual_samples, expected_samples)
+        np.testing.assert_allclose(actual_distances, expected_distances)
+
+
+def test_torch_backend_sparse():
+    """Test systems spanning a much larger volume than the cutoff."""
+    generator = torch.Generator().manual_seed(0)
+    # two clusters of atoms, 5 km apart
+    positions = torch.vstack(
+        [
+            5 * torch.rand(10, 3, generator=generator),
+            5 * torch.rand(10, 3, generator=generator) + 5.0e3,
+        ]
+    )
+    system = System(
+        types=torch.full((20,), 6, dtype=torch.int32),
+        positions=positions.to(torch.float64),
+        cell=torch.zeros(3, 3, dtype=torch.float64),
+    )
+    options = NeighborListOptions(cutoff=3.0, full_list=False)
+
+    system = get_system_with_neighbor_lists(system, [options], backend="torch")
+
+    actual_samples, actual_distances = _sorted_pairs(system.get_neighbor_list(options))
+    expected_samples, expected_distances = _sorted_pairs(
+        neighbor_lists._compute_single_neighbor_list(system_to_ase(system), options)
+    )
+    np.testing.assert_equal(actual_samples, expected_samples)
+    np.testing.assert_allclose(actual_distances, expected_distances)
+
+
+def test_torch_backend_float32():
+    systems = read_systems_ase(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    options = NeighborListOptions(cutoff=4.0, full_list=False)
+
+    system = get_system_with_neighbor_lists(systems[0], [options], backend="torch")
+    neighbor_list = system.get_neighbor_list(options)
+
+    assert neighbor_list.values.dtype == torch.float32
+    assert neighbor_list.samples.values.dtype == torch.int32
+
+
+def test_unknown_backend():
+    systems = read_systems_ase(RESOURCES_PATH / "qm9_reduced_100.xyz")
+    options = NeighborListOptions(cutoff=4.0, full_list=False)
+
+    match = "Unknown neighbor list backend 'foo'"
+    with pytest.raises(ValueError, match=match):
+        get_system_with_neighbor_lists(systems[0], [options], backend="foo")
+
+
+@pytest.mark.parametrize("backend", ["ase", "torch"])
+@pytest.mark.parametrize("num_workers", [1, 3])
+def test_datasets_with_neighbor_lists(backend, num_workers):
+    """Test that neighbor lists are attached to the systems of all datasets."""
+    systems = read_systems_ase(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    datasets = [
+        Dataset({"system": systems[:7]}),
+        torch.utils.data.Subset(Dataset({"system": systems[7:]}), [0, 4, 5, 12]),
+    ]
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+
+    datasets = get_datasets_with_neighbor_lists(
+        datasets, [options], backend=backend, num_workers=num_workers
+    )
+
+    for dataset in datasets:
+        for sample in dataset:
+            system = sample["system"]
+            expected = neighbor_lists._compute_single_neighbor_list(
+                system_to_ase(system), options
+            )
+            actual_samples, actual_distances = _sorted_pairs(
+                system.get_neighbor_list(options)
+            )
+            expected_samples, expected_distances = _sorted_pairs(expected)
+            np.testing.assert_equal(actual_samples, expected_samples)
+            np.testing.assert_allclose(actual_distances, expected_distances, atol=1e-5)
+
+    # systems which are not part of the datasets are untouched
+    assert options not in systems[8].known_neighbor_lists()
+
+
+def _trajectory(n_frames, step):
+    """Frames of a random walk of the atoms of a periodic carbon system."""
+    system = read_systems_ase(
+        RESOURCES_PATH / "carbon_reduced_20.xyz", dtype=torch.float64
+    )[0]
+    generator = torch.Generator().manual_seed(0)
+
+    frames = []
+    positions = system.positions
+    for _ in range(n_frames):
+        displacements = torch.randn(
+            positions.shape, generator=generator, dtype=torch.float64
+        )
+        positions = positions + step * displacements
+        frames.append(System(types=system.types, positions=positions, cell=system.cell))
+    return frames
+
+
+@pytest.mark.parametrize("backend", ["ase", "torch"])
+@pytest.mark.parametrize("full_list", [True, False])
+def test_verlet_neighbor_lists(backend, full_list):
+    """Neighbor lists from the Verlet skin are the same as new neighbor lists."""
+    options = NeighborListOptions(cutoff=4.0, full_list=full_list)
+    verlet = VerletNeighborLists([options], skin=1.0, backend=backend)
+
+    frames = _trajectory(n_frames=20, step=0.05)
+    for system in frames:
+        system = verlet.get_system_with_neighbor_lists(system)
+
+        expected = neighbor_lists._compute_single_neighbor_list(
+            system_to_ase(system), options
+        )
+        actual_samples, actual_distances = _sorted_pairs(
+            system.get_neighbor_list(options)
+        )
+        expected_samples, expected_distances = _sorted_pairs(expected)
+        np.testing.assert_equal(actual_samples, expected_samples)
+        np.testing.assert_allclose(actual_distances, expected_distances)
+
+    # the atoms moved far enough for a few, but not all searches
+    assert 1 < verlet.n_searches < len(frames)
+
+
+def test_verlet_neighbor_lists_changed_system():
+    """Candidate pairs are searched again for a different system."""
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+    verlet = VerletNeighborLists([options], skin=1.0)
+
+    systems = read_systems_ase(RESOURCES_PATH / "carbon_reduced_20.xyz")
+    verlet.get_system_with_neighbor_lists(systems[0])
+    verlet.get_system_with_neighbor_lists(systems[1])
+    assert verlet.n_searches == 2
+
+    # neighbor lists which are already known are not computed again
+    verlet.get_system_with_neighbor_lists(systems[0])
+    assert verlet.n_searches == 2
+
+
+def test_verlet_neighbor_lists_negative_skin():
+    options = NeighborListOptions(cutoff=4.0, full_list=True)
+    with pytest.raises(ValueError, match="`skin` must be positive"):
+        VerletNeighborLists([options], skin=-1.0)
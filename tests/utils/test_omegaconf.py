@@ -202,6 +202,25 @@ def test_expand_dataset_config_min():
     assert targets_conf["energy"]["virial"] is False
 
 
+@pytest.mark.parametrize("conf", ["dataset.mtmd", {"systems": "dataset.mtmd"}])
+def test_expand_dataset_config_disk_dataset(conf):
+    if isinstance(conf, dict):
+        conf = OmegaConf.create(conf)
+
+    conf_expanded = expand_dataset_config(conf)[0]
+
+    assert conf_expanded["systems"]["file_format"] == ".mtmd"
+    assert len(conf_expanded["targets"]) == 0
+
+
+def test_expand_dataset_config_disk_dataset_targets_error():
+    conf = {"systems": "dataset.mtmd", "targets": {"energy": "dataset.xyz"}}
+
+    match = "Targets are read from the preprocessed dataset 'dataset.mtmd'"
+    with pytest.raises(ValueError, match=match):
+        expand_dataset_config(OmegaConf.create(conf))
+
+
 def test_expand_dataset_config_error():
     file_name = "foo.xyz"
 
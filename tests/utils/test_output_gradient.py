@@ -1,3 +1,5 @@
+import warnings
+
 import metatensor.torch
 import pytest
 import torch
@@ -5,7 +7,7 @@ from metatensor.torch.atomistic import System
 
 from metatensor.models.experimental.soap_bpnn import __model__
 from metatensor.models.utils.data import DatasetInfo, TargetInfo, read_systems
-from metatensor.models.utils.output_gradient import compute_gradient
+from metatensor.models.utils.output_gradient import compute_gradient, compute_gradients
 
 from . import MODEL_HYPERS, RESOURCES_PATH
 
@@ -242,3 +244,106 @@ def test_both(is_training):
 
     for fv, jfv in zip(f_and_v, jitted_f_and_v):
         torch.testing.assert_close(fv, jfv)
+
+
+@pytest.mark.parametrize("is_training", [True, False])
+def test_compute_gradients(is_training):
+    """Gradients of several targets computed at once are the same as the ones computed
+    one target at a time"""
+
+    positions = torch.rand(5, 3, dtype=torch.float64, requires_grad=True)
+    strain = torch.eye(3, dtype=torch.float64, requires_grad=True)
+
+    def targets():
+        strained = positions @ strain
+        return [
+            (strained**2).sum(dim=1, keepdim=True),
+            torch.sin(strained).sum().reshape(1, 1),
+            (strained[:, :1] * strained[:, 1:2]),
+        ]
+
+    all_gradients = compute_gradients(targets(), [positions, strain], is_training)
+
+    assert len(all_gradients) == 3
+    for target, gradients in zip(targets(), all_gradients):
+        expected = compute_gradient(target, [positions, strain], is_training=True)
+        assert len(gradients) == 2
+        for gradient, expected_gradient in zip(gradients, expected):
+            torch.testing.assert_close(gradient, expected_gradient)
+            assert gradient.requires_grad == is_training
+
+
+@pytest.mark.parametrize("is_training", [True, False])
+def test_compute_gradients_model(is_training):
+    """Gradients of the energies of a model are computed without warnings, and are the
+    same as the ones computed one target at a time"""
+
+    dataset_info = DatasetInfo(
+        length_unit="angstrom",
+        atomic_types={1, 6, 7, 8},
+        targets={
+            "energy": TargetInfo(
+                quantity="energy", unit="eV", per_atom=False, gradients=["positions"]
+            ),
+            "energy_2": TargetInfo(
+                quantity="energy", unit="eV", per_atom=False, gradients=["positions"]
+            ),
+        },
+    )
+    model = __model__(model_hypers=MODEL_HYPERS, dataset_info=dataset_info)
+
+    systems = read_systems(RESOURCES_PATH / "qm9_reduced_100.xyz")[:5]
+    systems = [
+        System(
+            positions=system.positions.requires_grad_(True),
+            cell=system.cell,
+            types=system.types,
+        )
+        for system in systems
+    ]
+    positions = [system.positions for system in systems]
+
+    def targets():
+        output = model(
+            systems, {name: model.outputs[name] for name in ["energy", "energy_2"]}
+        )
+        return [output["energy"].block().values, output["energy_2"].block().values]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        all_gradients = compute_gradients(targets(), positions, is_training)
+
+    for target, gradients in zip(targets(), all_gradients):
+        expected = compute_gradient(target, positions, is_training=True)
+        for gradient, expected_gradient in zip(gradients, expected):
+            torch.testing.assert_close(gradient, expected_gradient)
+
+
+class _NumpySquare(torch.autograd.Function):
+    """Square of a tensor computed with numpy, which can not be used with vmap"""
+
+    @staticmethod
+    def forward(ctx, x):
+        ctx.save_for_backward(x)
+        return torch.from_numpy(x.detach().numpy() ** 2)
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        (x,) = ctx.saved_tensors
+        return torch.from_numpy(2 * x.detach().numpy() * grad_output.numpy())
+
+
+@pytest.mark.parametrize("is_training", [True, False])
+def test_compute_gradients_without_vmap(is_training):
+    """Gradients are computed one target at a time if the batched backward pass is not
+    supported by the operations of the targets"""
+
+    positions = torch.rand(5, 3, dtype=torch.float64, requires_grad=True)
+    squares = _NumpySquare.apply(positions)
+    targets = [squares.sum(dim=1, keepdim=True), (3 * squares).sum().reshape(1, 1)]
+
+    all_gradients = compute_gradients(targets, [positions], is_training)
+
+    assert len(all_gradients) == 2
+    torch.testing.assert_close(all_gradients[0][0], 2 * positions.detach())
+    torch.testing.assert_close(all_gradients[1][0], 6 * positions.detach())